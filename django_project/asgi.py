@@ -11,6 +11,8 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'repcurve.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_project.settings')
+# Serve the read-heavy endpoints with the async views (see settings.ROOT_URLCONF)
+os.environ.setdefault('REPCURVE_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
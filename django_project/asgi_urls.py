@@ -0,0 +1,13 @@
+"""
+URL configuration used under ASGI.
+
+The async read views come first and shadow their sync routes; everything
+else is django_project.urls unchanged.
+"""
+from django.urls import path, include
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/', include('workouts.async_urls')),
+    *sync_urlpatterns,
+]
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,6 +48,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its total covers every other middleware
+    'workouts.instrumentation.RequestTimingMiddleware',
+    # Before the others, so it compresses the response they finished
+    'workouts.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -55,7 +62,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'django_project.urls'
+# asgi.py sets REPCURVE_ASYNC_VIEWS, routing calendar, workout-log reads and
+# analytics to async views; WSGI and runserver keep the sync DRF views
+ASYNC_READ_VIEWS = os.environ.get('REPCURVE_ASYNC_VIEWS') == '1'
+ROOT_URLCONF = 'django_project.asgi_urls' if ASYNC_READ_VIEWS else 'django_project.urls'
 
 TEMPLATES = [
     {
@@ -81,10 +91,42 @@ WSGI_APPLICATION = 'django_project.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('REPCURVE_DB_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# REPCURVE_DB_PROFILE=production tunes SQLite for concurrent requests
+DATABASE_PROFILE = os.environ.get('REPCURVE_DB_PROFILE', 'development')
+if DATABASE_PROFILE not in ('development', 'production'):
+    raise ImproperlyConfigured(f'Unknown REPCURVE_DB_PROFILE {DATABASE_PROFILE!r}')
+
+SQLITE_PRAGMAS = [
+    # Readers keep reading while a writer commits, instead of waiting on it
+    'PRAGMA journal_mode = WAL',
+    # With WAL, only the last commits can be lost on power failure, never corrupted
+    'PRAGMA synchronous = NORMAL',
+    # Serve reads from a 256 MiB memory map and a 64 MiB page cache per connection
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA temp_store = MEMORY',
+]
+
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'OPTIONS': {
+            'init_command': '; '.join(SQLITE_PRAGMAS),
+            # Busy timeout: wait up to 20s for the write lock instead of failing
+            'timeout': 20,
+            # Take the write lock at BEGIN. A deferred transaction that reads and
+            # then writes cannot wait for the lock and fails with "database is locked".
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Keep connections (and their page cache) across requests. Async views
+        # run their queries in short-lived threads, so ASGI closes them per request.
+        'CONN_MAX_AGE': 0 if ASYNC_READ_VIEWS else 600,
+        'CONN_HEALTH_CHECKS': True,
+    })
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -129,18 +171,99 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Django REST Framework
 REST_FRAMEWORK = {
+    # Token first: API clients never carry a session, so it answers most requests
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        # Session first: requests without valid credentials get 403, with no Token challenge
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'workouts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'workouts.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'workouts.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Local memory caches are per process: with several worker processes, point
+# default at a shared backend (e.g. Redis) so calendar invalidations reach every
+# worker. Calendar months cached in local memory are kept for 60s at most.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'repcurve',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Seconds a serialized calendar month is kept in a shared cache when no write
+# invalidates it. Months are stored with the calendar's version stamps and
+# missed once one moves on, whichever process made the write.
+CALENDAR_CACHE_TIMEOUT = 24 * 60 * 60
+
+# REPCURVE_SHARED_CACHE=redis://host:6379/0 adds a Redis cache shared by
+# every worker process
+SHARED_CACHE_URL = os.environ.get('REPCURVE_SHARED_CACHE')
+if SHARED_CACHE_URL:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': SHARED_CACHE_URL,
+    }
+
+# Token -> user cache used by CachedTokenAuthentication. Without CACHE_ALIAS
+# each process keeps its own entries, and may accept a token revoked in
+# another process for up to TTL seconds; with it, only the shared cache is used.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 1024,
+    'TTL': 60,
+    'CACHE_ALIAS': 'shared' if SHARED_CACHE_URL else None,
+}
+
+# Production runs several processes, so logout and deactivation must reach all of them
+if DATABASE_PROFILE == 'production':
+    token_cache_alias = TOKEN_AUTH_CACHE['CACHE_ALIAS']
+    if token_cache_alias is None or CACHES[token_cache_alias]['BACKEND'] in (
+        'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache',
+    ):
+        raise ImproperlyConfigured(
+            'REPCURVE_DB_PROFILE=production needs a shared token cache: set REPCURVE_SHARED_CACHE'
+        )
+
+# Per-request SQL, serialization and render timings (workouts.instrumentation).
+# Histograms are per process, like the token cache statistics.
+REQUEST_TIMING = {
+    'SLOW_REQUEST_MS': 500,
+    'TOP_STATEMENTS': 5,
+    'SERVER_TIMING_HEADER': True,
+}
+
+# REPCURVE_BACKGROUND_JOBS=1 moves summary, record and estimate recomputation
+# off the write requests into the job queue; run `manage.py run_jobs` alongside
+# the server. Otherwise the jobs run inline once the write commits.
+BACKGROUND_JOBS = {
+    'ENABLED': os.environ.get('REPCURVE_BACKGROUND_JOBS') == '1',
+    'BATCH_DELAY_SECONDS': 2,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY_SECONDS': 30,
+    'LOCK_TIMEOUT_SECONDS': 600,
+}
+
+# Brotli (when installed) or gzip for text responses the client accepts
+# compressed; see workouts/compression.py
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'BROTLI_QUALITY': 4,
+}
+
 # API Documentation with drf-spectacular
 SPECTACULAR_SETTINGS = {
     'TITLE': 'RepCurve API',
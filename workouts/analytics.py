@@ -0,0 +1,64 @@
+from django.db.models import F, Max
+from django.db.models.functions import TruncWeek
+from .models import DailyExerciseSummary
+
+
+def same_day(field):
+    """Summaries are already one row per day, so a day period groups by the date as stored"""
+    return F(field)
+
+
+# period -> function of the date field name giving the expression to group by
+PERIOD_TRUNCATORS = {
+    'day': same_day,
+    'week': TruncWeek,
+}
+
+
+def _progress_rows(user, start_date, end_date, exercise_ids, period):
+    truncate = PERIOD_TRUNCATORS[period]
+
+    summaries = DailyExerciseSummary.objects.filter(user=user)
+    if start_date:
+        summaries = summaries.filter(date__gte=start_date)
+    if end_date:
+        summaries = summaries.filter(date__lte=end_date)
+    if exercise_ids:
+        summaries = summaries.filter(exercise_id__in=exercise_ids)
+
+    return (
+        summaries.annotate(period=truncate('date'))
+        .values('period', 'exercise_id', exercise_name=F('exercise__name'))
+        .annotate(estimated_1rm=Max('best_e1rm'))
+        .order_by('exercise_name', 'exercise_id', 'period')
+    )
+
+
+def _group_points(rows):
+    exercises = []
+    for row in rows:
+        if not exercises or exercises[-1]['exercise'] != row['exercise_id']:
+            exercises.append({
+                'exercise': row['exercise_id'],
+                'exercise_name': row['exercise_name'],
+                'points': [],
+            })
+        exercises[-1]['points'].append({
+            'date': row['period'],
+            'estimated_1rm': round(row['estimated_1rm'], 2),
+        })
+    return exercises
+
+
+def e1rm_progress(user, start_date=None, end_date=None, exercise_ids=None, period='day'):
+    """Max estimated 1RM per exercise and period, aggregated in the database.
+
+    Reads the daily summaries, so a multi-year history is a few hundred
+    rows instead of every set.
+    """
+    return _group_points(_progress_rows(user, start_date, end_date, exercise_ids, period))
+
+
+async def ae1rm_progress(user, start_date=None, end_date=None, exercise_ids=None, period='day'):
+    rows = _progress_rows(user, start_date, end_date, exercise_ids, period)
+    return _group_points([row async for row in rows])
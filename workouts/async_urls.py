@@ -0,0 +1,24 @@
+from django.urls import path
+from . import async_views
+from .views import WorkoutLogViewSet
+
+# Matched ahead of workouts.urls under ASGI (see django_project/asgi_urls.py).
+# Paths and names mirror the sync routes, so reverse() gives the same URLs
+# either way and request timings are grouped under the same endpoints.
+urlpatterns = [
+    path('calendar/', async_views.calendar_workouts, name='calendar-workouts'),
+    path('analytics/e1rm/', async_views.e1rm_progress_view, name='analytics-e1rm'),
+    path('analytics/training-load/', async_views.training_load_view, name='analytics-training-load'),
+    path('records/', async_views.personal_records, name='personal-records'),
+    path('export/<str:export_format>/', async_views.export_history, name='export-history'),
+    path('workout-logs/', async_views.reads_async(
+        async_views.workout_log_list,
+        WorkoutLogViewSet.as_view({'get': 'list', 'post': 'create'}),
+    ), name='workout-logs-list'),
+    path('workout-logs/<int:pk>/', async_views.reads_async(
+        async_views.workout_log_detail,
+        WorkoutLogViewSet.as_view({
+            'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+        }),
+    ), name='workout-logs-detail'),
+]
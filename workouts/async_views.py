@@ -0,0 +1,211 @@
+"""Async versions of the read-heavy endpoints, served under ASGI.
+
+DRF views are synchronous, so under ASGI every one of them runs in the
+single thread Django keeps for sync code. These views await the async ORM
+instead and reuse the fast serializers, pagination and renderer, so their
+responses are byte for byte those of the sync views. Writes stay on DRF.
+"""
+import copy
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from .analytics import ae1rm_progress
+from .authentication import token_cache
+from .calendar_cache import CALENDAR_RESOURCES, acalendar_range
+from .exports import ASYNC_STREAMERS, CONTENT_TYPES
+from .fast_serializers import Fieldset, WorkoutLogReader
+from .models import WorkoutLog
+from .pagination import WorkoutLogPagination
+from .records import board_records, record_board
+from .renderers import JSONRenderer
+from .training_load import TrainingHistory, training_load_report
+from .versions import acurrent_versions, aresource_etag
+from .views import (
+    add_validators, calendar_bounds, progress_params, training_load_bounds, WorkoutLogViewSet
+)
+
+
+renderer = JSONRenderer()
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(renderer.render(data), content_type=renderer.media_type, status=status_code)
+
+
+async def authenticate(request):
+    """The user of the session, else of a token resolved through the token cache.
+
+    Mirrors SessionAuthentication followed by CachedTokenAuthentication.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+    header = request.headers.get('Authorization', '').split()
+    if not header or header[0].lower() != 'token':
+        raise exceptions.NotAuthenticated()
+    if len(header) != 2:
+        raise exceptions.AuthenticationFailed('Invalid token header.')
+
+    key = header[1]
+    credentials = token_cache.get(key)
+    if credentials is None:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        credentials = (token.user, token)
+        token_cache.set(key, credentials)
+
+    user, _ = credentials
+    if not user.is_active:
+        raise exceptions.AuthenticationFailed('User inactive or deleted.')
+    return copy.copy(user)
+
+
+def async_api_view(view):
+    """Authenticate a GET and turn API exceptions into DRF-style error responses"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return render({'detail': f'Method "{request.method}" not allowed.'},
+                          status.HTTP_405_METHOD_NOT_ALLOWED)
+        try:
+            request.user = await authenticate(request)
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            status_code = exc.status_code
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                # As DRF answers when the first authenticator (the session) has no challenge header
+                status_code = status.HTTP_403_FORBIDDEN
+            return render({'detail': exc.detail}, status_code)
+    return csrf_exempt(wrapper)
+
+
+async def aconditional_response(request, resources, build_response, versions=None):
+    """conditional_response for async views; build_response is a coroutine function"""
+    etag = await aresource_etag(request, resources, versions)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = await build_response()
+    return add_validators(response, etag)
+
+
+def bad_request(exc):
+    return render({'error': str(exc)}, status.HTTP_400_BAD_REQUEST)
+
+
+@async_api_view
+async def calendar_workouts(request):
+    try:
+        first_day, last_day = calendar_bounds(request.GET)
+    except ValueError as exc:
+        return bad_request(exc)
+    compact = request.GET.get('compact') in ('1', 'true')
+
+    versions = await acurrent_versions(request.user.pk, CALENDAR_RESOURCES)
+
+    async def build_response():
+        return render(await acalendar_range(request.user.pk, first_day, last_day, compact, versions))
+
+    return await aconditional_response(request, CALENDAR_RESOURCES, build_response, versions)
+
+
+def workout_log_reader(request, columns=()):
+    return WorkoutLogReader(Fieldset.from_params(request.GET), columns)
+
+
+@async_api_view
+async def workout_log_list(request):
+    api_request = Request(request)
+    pagination = WorkoutLogPagination()
+    try:
+        reader = workout_log_reader(request, (pagination.ordering.lstrip('-'), 'id'))
+    except ValueError as exc:
+        return bad_request(exc)
+    rows = WorkoutLog.objects.filter(user=request.user).values(*reader.lookups)
+
+    async def build_response():
+        page = await pagination.apaginate_queryset(rows, api_request)
+        if page is None:
+            return render(await reader.adata([row async for row in rows]))
+        return render(pagination.get_paginated_response(await reader.adata(page)).data)
+
+    return await aconditional_response(request, WorkoutLogViewSet.etag_resources, build_response)
+
+
+@async_api_view
+async def workout_log_detail(request, pk):
+    try:
+        reader = workout_log_reader(request)
+    except ValueError as exc:
+        return bad_request(exc)
+    rows = WorkoutLog.objects.filter(user=request.user).values(*reader.lookups)
+
+    async def build_response():
+        try:
+            row = await rows.aget(pk=pk)
+        except WorkoutLog.DoesNotExist:
+            raise exceptions.NotFound('No WorkoutLog matches the given query.')
+        return render((await reader.adata([row]))[0])
+
+    return await aconditional_response(request, WorkoutLogViewSet.etag_resources, build_response)
+
+
+@async_api_view
+async def e1rm_progress_view(request):
+    try:
+        period, start_date, end_date, exercise_ids = progress_params(request.GET)
+    except ValueError as exc:
+        return bad_request(exc)
+    return render({
+        'period': period,
+        'start_date': start_date,
+        'end_date': end_date,
+        'exercises': await ae1rm_progress(request.user, start_date, end_date, exercise_ids, period),
+    })
+
+
+@async_api_view
+async def training_load_view(request):
+    try:
+        start_date, end_date = training_load_bounds(request.GET)
+    except ValueError as exc:
+        return bad_request(exc)
+    history = await TrainingHistory.afrom_database(request.user.pk, start_date, end_date)
+    return render(training_load_report(history, start_date, end_date))
+
+
+@async_api_view
+async def personal_records(request):
+    return render(record_board([record async for record in board_records(request.user)]))
+
+
+@async_api_view
+async def export_history(request, export_format):
+    if export_format not in ASYNC_STREAMERS:
+        return render({'error': 'Format must be csv or ndjson'}, status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(
+        ASYNC_STREAMERS[export_format](request.user), content_type=CONTENT_TYPES[export_format]
+    )
+    filename = f'repcurve-{request.user.username}-{timezone.now():%Y%m%d}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def reads_async(async_view, sync_view):
+    """Serve GET and HEAD with the async view and every other method with the DRF view"""
+    sync_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await sync_view(request, *args, **kwargs)
+    return csrf_exempt(view)
@@ -0,0 +1,138 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+DEFAULTS = {
+    # Entries kept in each process, least recently used evicted first
+    'MAX_SIZE': 1024,
+    # Seconds a resolved token is trusted before the database is asked again.
+    # Bounds how long another process can serve a token revoked elsewhere.
+    'TTL': 60,
+    # Django cache alias shared between processes, or None for process-local only
+    'CACHE_ALIAS': None,
+}
+
+
+class TokenCache:
+    """Token key -> (user, token) in a process-local LRU, or in a Django cache shared between processes.
+
+    With a shared cache the LRU is not used, so an invalidation in one
+    process reaches every other at once. Counts hits and misses that fell
+    through to the database.
+    """
+
+    def __init__(self, max_size, ttl, cache_alias=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @classmethod
+    def from_settings(cls):
+        options = {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+        return cls(options['MAX_SIZE'], options['TTL'], options['CACHE_ALIAS'])
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    @staticmethod
+    def cache_key(key):
+        # Keep raw tokens out of cache keys, which may be logged or listed
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        if self.shared is not None:
+            credentials = self.shared.get(self.cache_key(key))
+            with self._lock:
+                if credentials is None:
+                    self.misses += 1
+                else:
+                    self.shared_hits += 1
+            return credentials
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._entries.pop(key, None)
+            self.misses += 1
+        return None
+
+    def set(self, key, credentials):
+        if self.shared is not None:
+            self.shared.set(self.cache_key(key), credentials, self.ttl)
+        else:
+            self._remember(key, credentials, time.monotonic())
+
+    def _remember(self, key, credentials, now):
+        with self._lock:
+            self._entries[key] = (credentials, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if self.shared is not None and keys:
+            self.shared.delete_many([self.cache_key(key) for key in keys])
+
+    def clear(self):
+        """Empty this process's entries; shared entries expire on their own"""
+        with self._lock:
+            self._entries.clear()
+
+    def reset_stats(self):
+        self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else None,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+            }
+
+
+token_cache = TokenCache.from_settings()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the token and user query for known tokens.
+
+    Logout (deleting the token) and saving the user, which covers deactivation,
+    invalidate the entry through signals.
+    """
+
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials)
+
+        user, token = credentials
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        # Views may modify request.user; keep the cached instance untouched
+        return copy.copy(user), token
@@ -0,0 +1,304 @@
+"""Synthetic training data, the API benchmark runner and latency statistics"""
+import itertools
+import threading
+import time as clock
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from .e1rm import fill_e1rm, formula_for
+from .models import Exercise, ExerciseLog, ScheduledWorkout, SetLog, TemplateExercise, WorkoutLog, WorkoutTemplate
+from .programs import schedule_program
+from .records import rebuild_records
+from .summaries import rebuild_summaries
+from .sync import record_created
+from .versions import mark_changed
+
+
+BENCHMARK_EXERCISES = [('Back Squat', 'squat'), ('Bench Press', 'bench'), ('Deadlift', 'deadlift')]
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+def training_weekdays(sessions_per_week):
+    """Training days spread over the week, Monday first"""
+    return [index * 7 // sessions_per_week for index in range(sessions_per_week)]
+
+
+def benchmark_exercises():
+    return [
+        Exercise.objects.get_or_create(name=name, defaults={'category': category})[0]
+        for name, category in BENCHMARK_EXERCISES
+    ]
+
+
+def seed_user(username, years=1, sessions_per_week=3, sets_per_exercise=5, seed=0):
+    """Create a user with a program over the given years, logged up to today.
+
+    The program runs four more weeks into the future, left unlogged.
+    Returns (user, token key). An existing user is reused as it is, so
+    repeated runs measure the same data.
+    """
+    user, created = User.objects.get_or_create(username=username)
+    token, _ = Token.objects.get_or_create(user=user)
+    if not created:
+        return user, token.key
+
+    user.set_password(BENCHMARK_PASSWORD)
+    user.save(update_fields=['password'])
+    rng = np.random.default_rng(seed)
+    exercises = benchmark_exercises()
+    with transaction.atomic():
+        templates = []
+        for name, order in [('Heavy', 0), ('Volume', 1)]:
+            template = WorkoutTemplate.objects.create(user=user, name=name)
+            TemplateExercise.objects.bulk_create([
+                TemplateExercise(template=template, exercise=exercise, target_sets=sets_per_exercise,
+                                 target_reps=3 + 5 * order, order=index)
+                for index, exercise in enumerate(exercises)
+            ])
+            templates.append(template)
+
+        today = timezone.now().date()
+        weeks = round(years * 52)
+        schedule_program(user, templates, training_weekdays(sessions_per_week),
+                         today - timedelta(weeks=weeks), weeks + 4)
+        past = list(ScheduledWorkout.objects.filter(user=user, scheduled_date__lte=today).order_by('scheduled_date'))
+        ScheduledWorkout.objects.filter(pk__in=[workout.pk for workout in past]).update(is_completed=True)
+
+        workout_logs = WorkoutLog.objects.bulk_create([
+            WorkoutLog(user=user, scheduled_workout=workout, workout_name='Session',
+                       date=timezone.make_aware(datetime.combine(workout.scheduled_date, time(18))))
+            for workout in past
+        ])
+        exercise_logs = ExerciseLog.objects.bulk_create([
+            ExerciseLog(workout_log=workout_log, exercise=exercise, order=order)
+            for workout_log in workout_logs
+            for order, exercise in enumerate(exercises)
+        ])
+        set_logs = [
+            SetLog(exercise_log=exercise_log, set_number=number, reps=int(rng.integers(1, 11)),
+                   weight=Decimal(str(round(float(rng.uniform(60, 200)), 1))))
+            for exercise_log in exercise_logs
+            for number in range(1, sets_per_exercise + 1)
+        ]
+        fill_e1rm(set_logs, formula_for(user.pk))
+        SetLog.objects.bulk_create(set_logs)
+        record_created(user.pk, [*workout_logs, *exercise_logs, *set_logs])
+        mark_changed({('logs', user.pk), ('scheduled', user.pk)})
+
+    rebuild_summaries([user.pk])
+    rebuild_records([user.pk])
+    return user, token.key
+
+
+def latency_summary(seconds, elapsed):
+    """Requests per second and latency percentiles (ms) of one run"""
+    milliseconds = np.array(seconds) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {
+        'requests': len(milliseconds),
+        'rps': len(milliseconds) / elapsed if elapsed else None,
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'max_ms': round(float(milliseconds.max()), 2),
+    }
+
+
+class Account:
+    """A seeded user with the ids the detail and write endpoints need"""
+
+    def __init__(self, user, token):
+        self.user = user
+        self.headers = {'HTTP_AUTHORIZATION': f'Token {token}'}
+        self.workout_log = WorkoutLog.objects.filter(user=user).values_list('pk', flat=True).first()
+        self.templates = list(WorkoutTemplate.objects.filter(user=user).values_list('pk', flat=True))
+        upcoming = ScheduledWorkout.objects.filter(user=user, is_completed=False).order_by('scheduled_date')
+        self.scheduled = upcoming.values_list('pk', flat=True).first()
+
+
+class Endpoint:
+    """One benchmarked request.
+
+    build(account, index) does any untimed setup and returns (path, client
+    keyword arguments); statuses outside expect count as errors.
+    """
+
+    def __init__(self, name, method, build, expect=(200,)):
+        self.name = name
+        self.method = method
+        self.build = build
+        self.expect = expect
+
+
+def api_endpoints(exercises, admin):
+    """Every route in workouts/urls.py, reads and writes"""
+    today = timezone.now().date()
+    # Far-future weeks for program and shift calls, so they never touch the seeded schedule
+    future_weeks = itertools.count(520)
+
+    def get(name, path, params=None, expect=(200,)):
+        return Endpoint(name, 'get', lambda account, index: (path, {'data': params, **account.headers}), expect)
+
+    def post(name, path, payload, expect=(200, 201)):
+        def build(account, index):
+            return path(account) if callable(path) else path, {
+                'data': payload(account, index), 'content_type': 'application/json', **account.headers,
+            }
+        return Endpoint(name, 'post', build, expect)
+
+    def log_payload(index):
+        return {
+            'workout_name': 'Benchmark',
+            'date': timezone.now().isoformat(),
+            'exercise_logs': [
+                {'exercise': exercise.pk, 'order': order,
+                 'set_logs': [{'set_number': number, 'reps': 5, 'weight': str(100 + index % 20)}
+                              for number in range(1, 6)]}
+                for order, exercise in enumerate(exercises)
+            ],
+        }
+
+    def logout(account, index):
+        # Logging out deletes the token, so each call gets a throwaway user
+        user = User.objects.create(username=f'bench-logout-{uuid.uuid4().hex[:12]}')
+        token = Token.objects.create(user=user)
+        return reverse('logout'), {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+
+    def program(account, index):
+        start = today + timedelta(weeks=next(future_weeks) * 5)
+        return {'templates': account.templates, 'weekdays': [1, 3], 'start_date': start, 'weeks': 4}
+
+    def shift(account, index):
+        # Alternately push the seeded future block back a day and return it
+        upcoming = today + timedelta(days=1)
+        return {'start_date': upcoming, 'end_date': upcoming + timedelta(weeks=4), 'days': 1 - 2 * (index % 2)}
+
+    month = {'year': today.year, 'month': today.month}
+    return [
+        get('health', reverse('api_health')),
+        get('info', reverse('api_info')),
+        get('schema', reverse('schema')),
+        get('swagger-ui', reverse('swagger-ui')),
+        get('redoc', reverse('redoc')),
+        post('register', reverse('register'), lambda account, index: {
+            'username': f'bench-register-{uuid.uuid4().hex[:12]}', 'email': 'bench@example.com',
+            'password': BENCHMARK_PASSWORD, 'password_confirm': BENCHMARK_PASSWORD,
+        }),
+        post('login', reverse('login'), lambda account, index: {
+            'username': account.user.username, 'password': BENCHMARK_PASSWORD,
+        }),
+        Endpoint('logout', 'post', logout),
+        get('profile', reverse('profile')),
+        Endpoint('auth-cache-stats', 'get', lambda account, index: (reverse('auth-cache-stats'), admin.headers)),
+        Endpoint('request-stats', 'get', lambda account, index: (reverse('request-stats'), admin.headers)),
+        get('calendar', reverse('calendar-workouts'), month),
+        get('calendar-compact', reverse('calendar-workouts'), {**month, 'compact': '1'}),
+        get('calendar-quarter', reverse('calendar-workouts'), {
+            'start_date': today - timedelta(days=90), 'end_date': today,
+        }),
+        get('e1rm-progress', reverse('analytics-e1rm'), {'period': 'week'}),
+        get('training-load', reverse('analytics-training-load')),
+        get('personal-records', reverse('personal-records')),
+        get('leaderboard', reverse('leaderboard')),
+        get('leaderboard-rank', reverse('leaderboard-rank')),
+        get('bodyweight-list', reverse('bodyweight-list')),
+        get('export-csv', reverse('export-history', args=['csv'])),
+        get('export-ndjson', reverse('export-history', args=['ndjson'])),
+        get('sync', reverse('sync')),
+        get('exercise-list', reverse('exercise-list')),
+        get('exercise-detail', reverse('exercise-detail', args=[exercises[0].pk])),
+        get('template-list', reverse('workout-templates-list')),
+        Endpoint('template-detail', 'get', lambda account, index: (
+            reverse('workout-templates-detail', args=[account.templates[0]]), account.headers,
+        )),
+        post('template-create', reverse('workout-templates-list'), lambda account, index: {
+            'name': f'Benchmark {index}',
+        }),
+        get('scheduled-list', reverse('scheduled-workouts-list')),
+        Endpoint('scheduled-detail', 'get', lambda account, index: (
+            reverse('scheduled-workouts-detail', args=[account.scheduled]), account.headers,
+        )),
+        post('scheduled-program', reverse('scheduled-workouts-program'), program),
+        post('scheduled-shift', reverse('scheduled-workouts-shift'), shift, expect=(200, 409)),
+        post('scheduled-complete', lambda account: reverse('complete-workout', args=[account.scheduled]),
+             lambda account, index: {}),
+        get('workout-log-list', reverse('workout-logs-list')),
+        Endpoint('workout-log-detail', 'get', lambda account, index: (
+            reverse('workout-logs-detail', args=[account.workout_log]), account.headers,
+        )),
+        post('workout-log-create', reverse('workout-logs-list'), lambda account, index: log_payload(index)),
+        post('workout-log-batch', reverse('workout-logs-batch'),
+             lambda account, index: [log_payload(index + offset) for offset in range(5)]),
+    ]
+
+
+def run_endpoint(endpoint, accounts, requests, concurrency):
+    """Send requests to one endpoint from concurrent workers, each with its own client.
+
+    Returns latency percentiles, throughput, SQL queries and response sizes.
+    Queries are counted on the worker's own connection, including work run
+    after commit.
+    """
+    local = threading.local()
+
+    def call(index):
+        if not hasattr(local, 'client'):
+            local.client = Client(raise_request_exception=False)
+        path, kwargs = endpoint.build(accounts[index % len(accounts)], index)
+        with CaptureQueriesContext(connection) as queries:
+            started = clock.perf_counter()
+            response = getattr(local.client, endpoint.method)(path, **kwargs)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            elapsed = clock.perf_counter() - started
+        return response.status_code, elapsed, len(queries), len(body)
+
+    started = clock.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(call, range(requests)))
+    else:
+        results = [call(index) for index in range(requests)]
+    elapsed = clock.perf_counter() - started
+
+    statuses, timings, queries, sizes = zip(*results)
+    return {
+        **latency_summary(timings, elapsed),
+        'queries': int(np.median(queries)),
+        'max_queries': max(queries),
+        'bytes': int(np.median(sizes)),
+        'errors': sum(status not in endpoint.expect for status in statuses),
+        'statuses': {str(status): count for status, count in sorted(Counter(statuses).items())},
+    }
+
+
+def regressions(baseline, current, threshold=0.25, min_ms=5.0):
+    """Endpoints that got slower, chattier or heavier than in a saved run.
+
+    Latency counts when p95 grows by more than threshold and min_ms;
+    queries when the median count grows at all; payloads past threshold.
+    """
+    found = []
+    for name, now in current['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        if now['p95_ms'] > before['p95_ms'] * (1 + threshold) and now['p95_ms'] - before['p95_ms'] > min_ms:
+            found.append(f"{name}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+        if now['queries'] > before['queries']:
+            found.append(f"{name}: queries {before['queries']} -> {now['queries']}")
+        if now['bytes'] > before['bytes'] * (1 + threshold):
+            found.append(f"{name}: payload {before['bytes']} -> {now['bytes']} bytes")
+        if now['errors'] > before['errors']:
+            found.append(f"{name}: errors {before['errors']} -> {now['errors']}")
+    return found
@@ -0,0 +1,199 @@
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from .deferred import OnCommitBatch
+from .fast_serializers import ScheduledWorkoutReader
+from .models import ScheduledWorkout
+from .versions import acurrent_versions, current_versions
+
+
+# Serialized months live for a day unless a write invalidates them first
+TIMEOUT = getattr(settings, 'CALENDAR_CACHE_TIMEOUT', 24 * 60 * 60)
+
+# A per-process cache never sees the deletes of writes made by other
+# processes, so its months are kept no longer than cached tokens
+LOCAL_TIMEOUT = 60
+
+# Version stamps a cached month is stored with; it is a miss once any moved on
+CALENDAR_RESOURCES = ('scheduled', 'templates', 'exercises')
+
+# Ranges are capped so one request cannot serialize years of calendar
+MAX_RANGE_DAYS = 366
+
+GENERATION_KEY = 'calendar:generation'
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def months_between(first_day, last_day):
+    """First day of every month overlapping [first_day, last_day]"""
+    months, month = [], month_start(first_day)
+    while month <= last_day:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def generation():
+    """Cache namespace, moved on by catalog-wide changes such as exercise renames.
+
+    A missing counter (evicted or first use) starts from the clock, so it
+    never matches entries written under an earlier counter.
+    """
+    cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+    return cache.get(GENERATION_KEY)
+
+
+def cache_timeout():
+    if isinstance(caches['default'], LocMemCache):
+        return min(TIMEOUT, LOCAL_TIMEOUT)
+    return TIMEOUT
+
+
+def stamps(versions):
+    """The calendar's stamps from {resource: (version, updated_at)}"""
+    return tuple(versions.get(resource, (0, None))[0] for resource in CALENDAR_RESOURCES)
+
+
+def month_key(current_generation, user_id, month, compact):
+    mode = 'compact' if compact else 'full'
+    return f'calendar:{current_generation}:{user_id}:{month:%Y-%m}:{mode}'
+
+
+def _months_query(user_id, months, reader):
+    return ScheduledWorkout.objects.filter(
+        user_id=user_id,
+        scheduled_date__gte=months[0],
+        scheduled_date__lt=next_month(months[-1]),
+    ).values(*reader.lookups)
+
+
+def _serialize_months(rows, templates, months, reader):
+    by_month = {month: [] for month in months}
+    for row in rows:
+        by_month.get(month_start(row['scheduled_date']), []).append(row)
+    return {month: reader.assemble(month_rows, templates) for month, month_rows in by_month.items()}
+
+
+def build_months(user_id, months, compact):
+    """Serialize whole months with a single query over their span, plus two for their templates"""
+    reader = ScheduledWorkoutReader(columns=('scheduled_date',), compact=compact)
+    rows = list(_months_query(user_id, months, reader))
+    return _serialize_months(rows, reader.template_data(rows), months, reader)
+
+
+async def abuild_months(user_id, months, compact):
+    reader = ScheduledWorkoutReader(columns=('scheduled_date',), compact=compact)
+    rows = [row async for row in _months_query(user_id, months, reader)]
+    return _serialize_months(rows, await reader.atemplate_data(rows), months, reader)
+
+
+def _month_keys(user_id, months, compact):
+    current_generation = generation()
+    return {month: month_key(current_generation, user_id, month, compact) for month in months}
+
+
+def _assemble(months, found, first_day, last_day, compact):
+    """Trim cached months to [first_day, last_day], newest first"""
+    first, last = first_day.isoformat(), last_day.isoformat()
+
+    def in_range(workouts):
+        return [workout for workout in workouts if first <= workout['scheduled_date'] <= last]
+
+    if not compact:
+        return [workout for month in reversed(months) for workout in in_range(found[month])]
+
+    workouts = [workout for month in reversed(months) for workout in in_range(found[month]['workouts'])]
+    templates = {}
+    for month in months:
+        templates.update(found[month]['templates'])
+    used = {str(workout['template']) for workout in workouts}
+    return {
+        'workouts': workouts,
+        'templates': {pk: template for pk, template in templates.items() if pk in used},
+    }
+
+
+def _current(keys, cached, current_stamps):
+    """Cached months stored under the current stamps"""
+    found = {}
+    for month, key in keys.items():
+        entry = cached.get(key)
+        if entry is not None and entry[0] == current_stamps:
+            found[month] = entry[1]
+    return found
+
+
+def calendar_range(user_id, first_day, last_day, compact=False, versions=None):
+    """Scheduled workouts between two dates (inclusive), newest first.
+
+    Months come from the cache; all missing months are built together and
+    cached. Partial months at either end are trimmed after the lookup.
+    versions are the CALENDAR_RESOURCES stamps when the caller has read them.
+    """
+    if versions is None:
+        versions = current_versions(user_id, CALENDAR_RESOURCES)
+    current_stamps = stamps(versions)
+    months = months_between(first_day, last_day)
+    keys = _month_keys(user_id, months, compact)
+    found = _current(keys, cache.get_many(keys.values()), current_stamps)
+
+    missing = [month for month in months if month not in found]
+    if missing:
+        built = build_months(user_id, missing, compact)
+        cache.set_many(
+            {keys[month]: (current_stamps, data) for month, data in built.items()}, cache_timeout()
+        )
+        found.update(built)
+    return _assemble(months, found, first_day, last_day, compact)
+
+
+async def acalendar_range(user_id, first_day, last_day, compact=False, versions=None):
+    if versions is None:
+        versions = await acurrent_versions(user_id, CALENDAR_RESOURCES)
+    current_stamps = stamps(versions)
+    months = months_between(first_day, last_day)
+    keys = _month_keys(user_id, months, compact)
+    found = _current(keys, await cache.aget_many(keys.values()), current_stamps)
+
+    missing = [month for month in months if month not in found]
+    if missing:
+        built = await abuild_months(user_id, missing, compact)
+        await cache.aset_many(
+            {keys[month]: (current_stamps, data) for month, data in built.items()}, cache_timeout()
+        )
+        found.update(built)
+    return _assemble(months, found, first_day, last_day, compact)
+
+
+def forget_months(entries):
+    """Drop the cached (user_id, month) entries in both response modes"""
+    current_generation = generation()
+    cache.delete_many([
+        month_key(current_generation, user_id, month, compact)
+        for user_id, month in entries
+        for compact in (False, True)
+    ])
+
+
+def forget_all():
+    """Move to a new namespace, dropping every cached month at once"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        generation()
+
+
+# Queue (user_id, first day of month) entries to drop once the write commits,
+# so a request racing the transaction cannot cache the old month again
+pending_months = OnCommitBatch(forget_months)
+mark_months_stale = pending_months.add
@@ -0,0 +1,44 @@
+import threading
+
+from django.db import transaction
+
+
+class _Batch:
+    def __init__(self, handler, keys):
+        self.handler = handler
+        self.keys = set(keys)
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        self.handler(self.keys)
+
+
+class OnCommitBatch:
+    """Collect keys during a transaction and process each once after commit.
+
+    Keys added repeatedly inside one transaction (a nested create, a
+    cascading delete) reach the handler only once. Outside a transaction
+    the handler runs immediately. A rolled back transaction discards its
+    callback and with it the keys it collected.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self._local = threading.local()
+
+    def add(self, keys):
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None and self._is_pending(batch):
+            batch.keys.update(keys)
+            return
+
+        batch = self._local.batch = _Batch(self.handler, keys)
+        transaction.on_commit(batch)
+
+    def _is_pending(self, batch):
+        """Whether the batch's callback is still registered and has not run"""
+        if batch.done:
+            return False
+        connection = transaction.get_connection()
+        return any(callback is batch for _, callback, _ in connection.run_on_commit)
@@ -0,0 +1,100 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from .estimators import DEFAULT_FORMULA, estimate
+from .jobs import register
+from .models import SetLog, TrainingProfile
+from .records import rebuild_records
+from .summaries import rebuild_summaries
+from .sync import record_bulk
+from .versions import mark_changed
+
+
+def formulas_for(user_ids):
+    """{user_id: e1RM formula} for the given users, defaulting when unset"""
+    chosen = dict(
+        TrainingProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'e1rm_formula')
+    )
+    return {user_id: chosen.get(user_id, DEFAULT_FORMULA) for user_id in user_ids}
+
+
+def formula_for(user_id):
+    return formulas_for([user_id])[user_id]
+
+
+def formula_for_exercise_log(exercise_log_id):
+    """Formula of the user who owns an exercise log"""
+    chosen = TrainingProfile.objects.filter(
+        user__workoutlog__exercise_logs=exercise_log_id
+    ).values_list('e1rm_formula', flat=True).first()
+    return chosen or DEFAULT_FORMULA
+
+
+def fill_e1rm(set_logs, formula):
+    """Set e1rm on unsaved SetLog instances headed for bulk_create"""
+    if not set_logs:
+        return
+    estimates = estimate(
+        [set_log.weight for set_log in set_logs],
+        [set_log.reps for set_log in set_logs],
+        [set_log.rpe for set_log in set_logs],
+        formula,
+    )
+    for set_log, value in zip(set_logs, estimates.tolist()):
+        set_log.e1rm = value
+
+
+def recompute_e1rm(user_ids=None, batch_size=2000, missing_only=False):
+    """Rewrite stored estimates in primary key chunks, one transaction per chunk.
+
+    Each chunk is one SELECT, one vectorized estimate per formula present and
+    one executemany UPDATE by primary key (bulk_update's CASE expression grows
+    quadratically with the chunk). The rewritten sets are logged for delta
+    sync and their owners' log stamps bumped, so cached ETags go stale.
+    Returns the number of sets written.
+    """
+    quote = connection.ops.quote_name
+    update_sql = 'UPDATE {} SET {} = %s WHERE {} = %s'.format(
+        quote(SetLog._meta.db_table), quote(SetLog._meta.get_field('e1rm').column),
+        quote(SetLog._meta.pk.column),
+    )
+    sets = SetLog.objects.order_by('pk')
+    if user_ids:
+        sets = sets.filter(exercise_log__workout_log__user_id__in=user_ids)
+    if missing_only:
+        sets = sets.filter(e1rm__isnull=True)
+    sets = sets.values_list('pk', 'weight', 'reps', 'rpe', 'exercise_log__workout_log__user_id')
+
+    written, last_pk = 0, 0
+    while True:
+        rows = list(sets.filter(pk__gt=last_pk)[:batch_size])
+        if not rows:
+            return written
+        last_pk = rows[-1][0]
+
+        formulas = formulas_for({row[4] for row in rows})
+        by_formula = defaultdict(list)
+        for row in rows:
+            by_formula[formulas[row[4]]].append(row)
+
+        updates, by_user = [], defaultdict(list)
+        for formula, group in by_formula.items():
+            pks, weights, reps, rpes, _ = zip(*group)
+            updates += zip(estimate(weights, reps, rpes, formula).tolist(), pks)
+        for row in rows:
+            by_user[row[4]].append(row[0])
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.executemany(update_sql, updates)
+            for user_id, pks in by_user.items():
+                record_bulk(user_id, SetLog, pks)
+            mark_changed({('logs', user_id) for user_id in by_user})
+        written += len(updates)
+
+
+@register('formula')
+def apply_formula(user_id, keys):
+    """Job handler: recompute a user's estimates, then the summaries and records built on them"""
+    recompute_e1rm([user_id])
+    rebuild_summaries([user_id])
+    rebuild_records([user_id])
@@ -0,0 +1,72 @@
+"""Estimated one-rep max formulas over NumPy arrays.
+
+Every estimator takes equal-length arrays of weights, reps and RPEs (NaN
+where no RPE was logged) and returns an array of estimates, so a whole batch
+of sets is estimated in a few vector operations.
+"""
+import numpy as np
+
+
+def epley(weights, reps, rpes):
+    return weights * (1 + reps / 30)
+
+
+def brzycki(weights, reps, rpes):
+    # The formula breaks down at 37 reps; long sets are capped below that
+    return weights * 36 / (37 - np.minimum(reps, 36))
+
+
+def lombardi(weights, reps, rpes):
+    return weights * reps ** 0.10
+
+
+# Share of 1RM that can be lifted for 1..12 reps to failure (RPE 10)
+RPE_PERCENTAGES = np.array([
+    1.000, 0.955, 0.922, 0.892, 0.863, 0.837, 0.811, 0.786, 0.762, 0.739, 0.707, 0.680,
+])
+
+
+def rpe_table(weights, reps, rpes):
+    """Reps-in-reserve estimate: RPE 8 for 5 reps is treated as 7 reps to failure.
+
+    Falls back to Epley for sets without an RPE, and for sets whose reps to
+    failure run past the end of the table.
+    """
+    has_rpe = ~np.isnan(rpes)
+    reps_in_reserve = np.where(has_rpe, np.clip(10 - rpes, 0, None), 0)
+    to_failure = reps + reps_in_reserve
+    table_size = len(RPE_PERCENTAGES)
+    percentages = np.interp(to_failure, np.arange(1, table_size + 1), RPE_PERCENTAGES)
+    use_table = has_rpe & (to_failure <= table_size)
+    return np.where(use_table, weights / percentages, epley(weights, to_failure, rpes))
+
+
+FORMULAS = {
+    'epley': epley,
+    'brzycki': brzycki,
+    'lombardi': lombardi,
+    'rpe': rpe_table,
+}
+FORMULA_CHOICES = [
+    ('epley', 'Epley'),
+    ('brzycki', 'Brzycki'),
+    ('lombardi', 'Lombardi'),
+    ('rpe', 'RPE (reps in reserve)'),
+]
+DEFAULT_FORMULA = 'epley'
+
+
+def estimate(weights, reps, rpes=None, formula=DEFAULT_FORMULA):
+    """Estimated 1RM for each set, rounded to 2 decimals"""
+    weights = np.asarray(weights, dtype=np.float64)
+    reps = np.asarray(reps, dtype=np.float64)
+    # None (no RPE logged) becomes NaN
+    rpes = np.full_like(weights, np.nan) if rpes is None else np.array(rpes, dtype=np.float64)
+    estimates = FORMULAS[formula](weights, reps, rpes)
+    # Zero reps lifts nothing, whatever the formula says
+    return np.round(np.where(reps > 0, estimates, 0.0), 2)
+
+
+def estimate_one(weight, reps, rpe=None, formula=DEFAULT_FORMULA):
+    """Estimated 1RM of a single set"""
+    return float(estimate([weight], [reps], [rpe], formula)[0])
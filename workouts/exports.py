@@ -0,0 +1,120 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from .models import WorkoutLog
+
+
+# Column names match the import_history command, so an export can be re-imported.
+# notes are the set's notes; workout_notes and exercise_notes belong to the logs.
+EXPORT_FIELDS = (
+    'date', 'workout_name', 'duration_minutes', 'workout_notes', 'scheduled_workout',
+    'exercise', 'category', 'exercise_notes',
+    'set_number', 'reps', 'weight', 'rpe', 'notes', 'workout_log', 'exercise_log',
+)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """File-like object that hands written lines back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(user_id):
+    """One row per set of a user's history, ordered by session.
+
+    Workout and exercise logs are LEFT JOINed to their children, so a log
+    without exercises or sets still gets a row, with the missing columns
+    left empty.
+    """
+    return (
+        WorkoutLog.objects.filter(user_id=user_id)
+        .order_by(
+            'date', 'pk', 'exercise_logs__order', 'exercise_logs__pk', 'exercise_logs__set_logs__set_number',
+        )
+        .values_list(
+            'date', 'workout_name', 'duration_minutes', 'notes', 'scheduled_workout_id',
+            'exercise_logs__exercise__name', 'exercise_logs__exercise__category', 'exercise_logs__notes',
+            'exercise_logs__set_logs__set_number', 'exercise_logs__set_logs__reps',
+            'exercise_logs__set_logs__weight', 'exercise_logs__set_logs__rpe', 'exercise_logs__set_logs__notes',
+            'pk', 'exercise_logs__pk',
+        )
+    )
+
+
+def _record(row):
+    record = dict(zip(EXPORT_FIELDS, row))
+    record['date'] = record['date'].isoformat()
+    if record['weight'] is not None:
+        record['weight'] = str(record['weight'])
+    return record
+
+
+def _csv_line(writer, record):
+    return writer.writerow('' if record[field] is None else record[field] for field in EXPORT_FIELDS)
+
+
+def export_rows(user, chunk_size=2000):
+    """One dict per set (or childless log), read in chunks from the database"""
+    for row in export_queryset(user.pk).iterator(chunk_size=chunk_size):
+        yield _record(row)
+
+
+async def aexport_rows(user, chunk_size=2000):
+    """export_rows for ASGI: each chunk is fetched in the sync thread, so the event loop is free in between.
+
+    QuerySet.aiterator() cannot be used: values_list() runs its query as
+    soon as iteration starts, in the event loop.
+    """
+    rows = export_queryset(user.pk).iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    try:
+        while chunk := await next_chunk():
+            for row in chunk:
+                yield _record(row)
+    finally:
+        # Releases the cursor when the client goes away mid-download
+        await sync_to_async(rows.close)()
+
+
+def stream_ndjson(user):
+    for record in export_rows(user):
+        yield json.dumps(record) + '\n'
+
+
+def stream_csv(user):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for record in export_rows(user):
+        yield _csv_line(writer, record)
+
+
+async def astream_ndjson(user):
+    async for record in aexport_rows(user):
+        yield json.dumps(record) + '\n'
+
+
+async def astream_csv(user):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    async for record in aexport_rows(user):
+        yield _csv_line(writer, record)
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
+
+# Async generators, so the ASGI handler streams them instead of buffering a sync iterator
+ASYNC_STREAMERS = {
+    'csv': astream_csv,
+    'ndjson': astream_ndjson,
+}
@@ -0,0 +1,350 @@
+"""Read-only serialization straight from .values() rows.
+
+The nested ModelSerializers instantiate a serializer per object and look
+up every field through it, which dominates the CPU time of the workout log
+and calendar reads. Here each level of the tree is one .values() query and
+the nested dicts are assembled in a single pass over the rows. Each Shape
+is derived from the ModelSerializer it replaces and converts values with
+that serializer's own fields, so the output keeps its field names, order
+and formatting byte for byte.
+
+A Fieldset (?fields=/?expand=) narrows every level: unrequested columns
+are left out of the SELECT, along with their joins, and nested levels
+nobody asked for are not queried at all.
+"""
+import copy
+from collections import defaultdict
+
+from rest_framework import fields, relations
+from .estimators import estimate_one
+from .instrumentation import timed
+from .models import ExerciseLog, SetLog, TemplateExercise, WorkoutTemplate
+from .serializers import (
+    CompactScheduledWorkoutSerializer, ExerciseLogSerializer, ScheduledWorkoutSerializer,
+    SetLogSerializer, TemplateExerciseSerializer, WorkoutLogSerializer, WorkoutTemplateSerializer,
+)
+
+
+# Fields whose to_representation returns database values unchanged
+PASSTHROUGH = (
+    fields.BooleanField, fields.CharField, fields.FloatField, fields.IntegerField,
+    relations.PrimaryKeyRelatedField,
+)
+
+
+def _field_tree(value):
+    tree = {}
+    for path in filter(None, (part.strip() for part in value.split(','))):
+        node = tree
+        for name in path.split('.'):
+            if node.get(name) is None:
+                node[name] = {}
+            node = node[name]
+    return tree
+
+
+class Fieldset:
+    """The fields requested of one level of a response.
+
+    tree maps each requested name to the fieldset of its nested level, or
+    is None for every field, nested levels included.
+    """
+
+    def __init__(self, tree=None):
+        self.tree = tree
+
+    @classmethod
+    def from_params(cls, query_params):
+        """From ?fields= (dotted paths reach nested fields) and ?expand= (nested levels added in full)"""
+        fields_param = query_params.get('fields')
+        if not fields_param:
+            return cls()
+        tree = _field_tree(fields_param)
+        # A field named without nested paths is sent in full
+        cls._fill(tree)
+        for path in _field_tree(query_params.get('expand', '')).items():
+            cls._expand(tree, *path)
+        return cls(tree)
+
+    @classmethod
+    def _fill(cls, tree):
+        for name, nested in tree.items():
+            if nested == {}:
+                tree[name] = None
+            else:
+                cls._fill(nested)
+
+    @classmethod
+    def _expand(cls, tree, name, nested):
+        if tree.get(name, {}) is None:
+            return
+        if name not in tree or not nested:
+            tree[name] = None
+            return
+        for path in nested.items():
+            cls._expand(tree[name], *path)
+
+    def __contains__(self, name):
+        return self.tree is None or name in self.tree
+
+    def nested(self, name):
+        return Fieldset(None if self.tree is None else self.tree.get(name, {}))
+
+
+ALL_FIELDS = Fieldset()
+
+
+class Shape:
+    """One serializer's output built from a .values() row.
+
+    nested names are filled by the caller. computed maps names to (function
+    of the row, columns it reads); every other field reads its source as a
+    values() lookup.
+    """
+
+    def __init__(self, serializer_class, nested=(), computed=None):
+        computed = computed or {}
+        self.nested = set(nested)
+        self.fields = []
+        self.reads = {}
+        for name, field in serializer_class().fields.items():
+            if name in nested:
+                self.fields.append((name, None, None))
+                self.reads[name] = ()
+            elif name in computed:
+                function, columns = computed[name]
+                self.fields.append((name, None, function))
+                self.reads[name] = columns
+            else:
+                lookup = field.source.replace('.', '__')
+                convert = None if isinstance(field, PASSTHROUGH) else field.to_representation
+                self.fields.append((name, lookup, convert))
+                self.reads[name] = (lookup,)
+        self.lookups = list(dict.fromkeys(column for columns in self.reads.values() for column in columns))
+
+    def select(self, fieldset, columns=()):
+        """This shape narrowed to a fieldset, also reading the given columns.
+
+        Raises ValueError for names the serializer does not have, or dotted
+        paths into fields that are not nested.
+        """
+        if fieldset.tree is None:
+            shape = copy.copy(self)
+            shape.lookups = list(dict.fromkeys([*columns, *self.lookups]))
+            return shape
+
+        unknown = sorted(set(fieldset.tree) - set(self.reads))
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+        not_nested = sorted(name for name, nested in fieldset.tree.items() if nested and name not in self.nested)
+        if not_nested:
+            raise ValueError(f'Fields without nested fields: {", ".join(not_nested)}')
+
+        shape = copy.copy(self)
+        shape.fields = [field for field in self.fields if field[0] in fieldset]
+        shape.lookups = list(dict.fromkeys([
+            *columns, *(column for name, _, _ in shape.fields for column in self.reads[name]),
+        ]))
+        return shape
+
+    def build(self, row, nested=None):
+        data = {}
+        for name, lookup, convert in self.fields:
+            if lookup is None:
+                data[name] = nested[name] if convert is None else convert(row)
+                continue
+            value = row[lookup]
+            if convert is not None and value is not None:
+                value = convert(value)
+            data[name] = value
+        return data
+
+
+def set_estimated_1rm(row):
+    """SetLog.estimated_1rm from a row"""
+    if row['e1rm'] is not None:
+        return row['e1rm']
+    return estimate_one(row['weight'], row['reps'], row['rpe'])
+
+
+WORKOUT_LOG = Shape(WorkoutLogSerializer, nested=('exercise_logs',))
+EXERCISE_LOG = Shape(ExerciseLogSerializer, nested=('set_logs',))
+SET_LOG = Shape(SetLogSerializer, computed={
+    'estimated_1rm': (set_estimated_1rm, ('e1rm', 'weight', 'reps', 'rpe')),
+})
+
+WORKOUT_TEMPLATE = Shape(WorkoutTemplateSerializer, nested=('template_exercises', 'exercises'))
+TEMPLATE_EXERCISE = Shape(TemplateExerciseSerializer)
+SCHEDULED_WORKOUT = Shape(ScheduledWorkoutSerializer, nested=('template_details',))
+COMPACT_SCHEDULED_WORKOUT = Shape(CompactScheduledWorkoutSerializer)
+
+
+def group_by(rows, key, shape, nested=None):
+    """{parent id: [built rows]} in row order"""
+    groups = defaultdict(list)
+    for row in rows:
+        groups[row[key]].append(shape.build(row, nested and nested(row)))
+    return groups
+
+
+def _ids(rows, key='id'):
+    return list(dict.fromkeys(row[key] for row in rows))
+
+
+class WorkoutLogReader:
+    """WorkoutLogSerializer data: log -> exercise logs -> sets, one query per requested level.
+
+    Select the top-level rows with `lookups`; `columns` adds any the caller
+    needs itself, such as the pagination key.
+    """
+
+    def __init__(self, fieldset=ALL_FIELDS, columns=()):
+        self.log = WORKOUT_LOG.select(fieldset, ('id', *columns))
+        self.exercise_log = self.set_log = None
+        if 'exercise_logs' in fieldset:
+            exercise_fields = fieldset.nested('exercise_logs')
+            self.exercise_log = EXERCISE_LOG.select(exercise_fields, ('id', 'workout_log'))
+            if 'set_logs' in exercise_fields:
+                self.set_log = SET_LOG.select(exercise_fields.nested('set_logs'), ('exercise_log',))
+        self.lookups = self.log.lookups
+
+    def exercise_log_rows(self, log_rows):
+        return ExerciseLog.objects.filter(workout_log_id__in=_ids(log_rows)).order_by('order').values(
+            *self.exercise_log.lookups
+        )
+
+    def set_log_rows(self, exercise_rows):
+        return SetLog.objects.filter(exercise_log_id__in=_ids(exercise_rows)).order_by('set_number').values(
+            *self.set_log.lookups
+        )
+
+    def data(self, log_rows):
+        exercise_rows = set_rows = []
+        if self.exercise_log:
+            exercise_rows = list(self.exercise_log_rows(log_rows))
+            if self.set_log:
+                set_rows = list(self.set_log_rows(exercise_rows))
+        return self.assemble(log_rows, exercise_rows, set_rows)
+
+    async def adata(self, log_rows):
+        exercise_rows = set_rows = []
+        if self.exercise_log:
+            exercise_rows = [row async for row in self.exercise_log_rows(log_rows)]
+            if self.set_log:
+                set_rows = [row async for row in self.set_log_rows(exercise_rows)]
+        return self.assemble(log_rows, exercise_rows, set_rows)
+
+    @timed('serialize')
+    def assemble(self, log_rows, exercise_rows, set_rows):
+        sets = group_by(set_rows, 'exercise_log', self.set_log) if self.set_log else {}
+        exercise_logs = {}
+        if self.exercise_log:
+            exercise_logs = group_by(
+                exercise_rows, 'workout_log', self.exercise_log,
+                lambda row: {'set_logs': sets.get(row['id'], [])},
+            )
+        return [
+            self.log.build(row, {'exercise_logs': exercise_logs.get(row['id'], [])})
+            for row in log_rows
+        ]
+
+
+class TemplateReader:
+    """WorkoutTemplateSerializer data: template -> template exercises, plus the exercise ids"""
+
+    def __init__(self, fieldset=ALL_FIELDS, columns=()):
+        if fieldset.nested('exercises').tree:
+            raise ValueError('Fields without nested fields: exercises')
+        self.template = WORKOUT_TEMPLATE.select(fieldset, ('id', *columns))
+        self.template_exercise = None
+        if 'template_exercises' in fieldset or 'exercises' in fieldset:
+            # The exercise ids come from the template exercise rows too
+            self.template_exercise = TEMPLATE_EXERCISE.select(
+                fieldset.nested('template_exercises') if 'template_exercises' in fieldset else Fieldset({}),
+                ('template', 'exercise', 'exercise__name'),
+            )
+        self.lookups = self.template.lookups
+
+    def template_rows(self, template_ids):
+        return WorkoutTemplate.objects.filter(pk__in=template_ids).values(*self.lookups)
+
+    def template_exercise_rows(self, template_ids):
+        return TemplateExercise.objects.filter(template_id__in=template_ids).order_by('order').values(
+            *self.template_exercise.lookups
+        )
+
+    def by_id(self, template_ids):
+        """{template id: data} for the given ids"""
+        rows = list(self.template_rows(template_ids))
+        exercise_rows = list(self.template_exercise_rows(template_ids)) if self.template_exercise else []
+        return self.assemble(rows, exercise_rows)
+
+    async def aby_id(self, template_ids):
+        rows = [row async for row in self.template_rows(template_ids)]
+        exercise_rows = []
+        if self.template_exercise:
+            exercise_rows = [row async for row in self.template_exercise_rows(template_ids)]
+        return self.assemble(rows, exercise_rows)
+
+    def data(self, rows):
+        exercise_rows = list(self.template_exercise_rows(_ids(rows))) if self.template_exercise else []
+        return list(self.assemble(rows, exercise_rows).values())
+
+    @timed('serialize')
+    def assemble(self, rows, exercise_rows):
+        """{template id: data} in row order"""
+        template_exercises = group_by(exercise_rows, 'template', self.template_exercise) if exercise_rows else {}
+        # The exercises relation follows Exercise's default ordering, by name
+        exercises = defaultdict(list)
+        for row in sorted(exercise_rows, key=lambda row: row['exercise__name']):
+            exercises[row['template']].append(row['exercise'])
+        return {
+            row['id']: self.template.build(row, {
+                'template_exercises': template_exercises.get(row['id'], []),
+                'exercises': exercises.get(row['id'], []),
+            })
+            for row in rows
+        }
+
+
+class ScheduledWorkoutReader:
+    """ScheduledWorkoutSerializer data, each workout embedding its template.
+
+    With compact, compact_scheduled_workouts() data instead: workouts refer
+    to their template by id and each template is sent once.
+    """
+
+    def __init__(self, fieldset=ALL_FIELDS, columns=(), compact=False):
+        self.compact = compact
+        if compact:
+            self.scheduled_workout = COMPACT_SCHEDULED_WORKOUT.select(ALL_FIELDS, columns)
+            self.templates = TemplateReader()
+        else:
+            self.scheduled_workout = SCHEDULED_WORKOUT.select(fieldset, ('template', *columns))
+            self.templates = None
+            if 'template_details' in fieldset:
+                self.templates = TemplateReader(fieldset.nested('template_details'))
+        self.lookups = self.scheduled_workout.lookups
+
+    def template_data(self, rows):
+        """{template id: data} for the templates rows use, or {} when none are sent"""
+        return self.templates.by_id(_ids(rows, 'template')) if self.templates else {}
+
+    async def atemplate_data(self, rows):
+        return await self.templates.aby_id(_ids(rows, 'template')) if self.templates else {}
+
+    def data(self, rows):
+        return self.assemble(rows, self.template_data(rows))
+
+    @timed('serialize')
+    def assemble(self, rows, templates):
+        """Serialize rows, given at least the templates they use"""
+        if self.compact:
+            return {
+                'workouts': [self.scheduled_workout.build(row) for row in rows],
+                'templates': {str(pk): templates[pk] for pk in _ids(rows, 'template')},
+            }
+        return [
+            self.scheduled_workout.build(row, {'template_details': templates.get(row['template'])})
+            for row in rows
+        ]
@@ -0,0 +1,309 @@
+"""Per-request timings: SQL, serialization, rendering and compression.
+
+RequestTimingMiddleware starts a RequestTimings for each request in a
+context variable, which sync_to_async copies into the threads running the
+ORM for async views. A database execute wrapper, the app's serializers
+(built on the timed base classes here), the JSON renderer and the
+compression middleware add their time to it. The middleware then sends the
+breakdown in a Server-Timing header, logs slow requests with their most
+repeated statements and adds the request to per-endpoint histograms.
+"""
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Requests slower than this are logged with their most repeated statements
+    'SLOW_REQUEST_MS': 500,
+    # Statements listed in a slow request's log entry
+    'TOP_STATEMENTS': 5,
+    # Browsers show the Server-Timing header in their developer tools; turn
+    # it off to keep the breakdown from clients
+    'SERVER_TIMING_HEADER': True,
+}
+
+# Upper bounds of the latency histogram buckets; one more bucket holds the rest
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+PHASES = ('db', 'serialize', 'render', 'compress')
+
+_current = ContextVar('request_timings', default=None)
+
+
+def timing_options():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_TIMING', {})}
+
+
+class RequestTimings:
+    """Seconds spent per phase of one request, and the statements it ran"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.statements = Counter()
+        self.statement_seconds = defaultdict(float)
+        self._in_phase = False
+
+    def add_query(self, sql, seconds):
+        self.queries += 1
+        self.seconds['db'] += seconds
+        self.statements[sql] += 1
+        self.statement_seconds[sql] += seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def top_statements(self, limit):
+        """(count, seconds, sql), most repeated first, then slowest"""
+        ranked = sorted(
+            self.statements.items(),
+            key=lambda item: (item[1], self.statement_seconds[item[0]]),
+            reverse=True,
+        )
+        return [(count, self.statement_seconds[sql], sql) for sql, count in ranked[:limit]]
+
+
+@contextmanager
+def timed(phase):
+    """Add the time of the block, less the SQL it ran, to a phase of the current request.
+
+    A phase entered inside another one is counted by the outer phase only.
+    """
+    timings = _current.get()
+    if timings is None or timings._in_phase:
+        yield
+        return
+
+    timings._in_phase = True
+    db_before = timings.seconds['db']
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings.seconds[phase] += elapsed - (timings.seconds['db'] - db_before)
+        timings._in_phase = False
+
+
+def record_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver: time every statement of the connection.
+
+    Inserted first, so execute_wrapper() blocks popping their own wrapper
+    leave it in place.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """Time the data property, where instances become primitives, as the serialize phase.
+
+    Nested serializers are evaluated inside their parent's data and are not
+    counted twice. many=True builds a TimedListSerializer unless the Meta
+    names another list_serializer_class.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        meta = getattr(cls, 'Meta', None)
+        if meta is None:
+            cls.Meta = type('Meta', (), {'list_serializer_class': TimedListSerializer})
+        elif not hasattr(meta, 'list_serializer_class'):
+            meta.list_serializer_class = TimedListSerializer
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+class Serializer(TimedSerializerMixin, serializers.Serializer):
+    pass
+
+
+class ModelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    pass
+
+
+class RequestStats:
+    """Per-endpoint latency histograms and phase totals of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def record(self, endpoint, status_code, timings, seconds):
+        milliseconds = seconds * 1000
+        bucket = next(
+            (index for index, bound in enumerate(BUCKETS_MS) if milliseconds <= bound), len(BUCKETS_MS)
+        )
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {
+                'count': 0,
+                'errors': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'queries': 0,
+                **{f'{phase}_ms': 0.0 for phase in PHASES},
+                'buckets': [0] * (len(BUCKETS_MS) + 1),
+            })
+            entry['count'] += 1
+            entry['errors'] += status_code >= 500
+            entry['total_ms'] += milliseconds
+            entry['max_ms'] = max(entry['max_ms'], milliseconds)
+            entry['queries'] += timings.queries
+            for phase in PHASES:
+                entry[f'{phase}_ms'] += timings.seconds[phase] * 1000
+            entry['buckets'][bucket] += 1
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {name: {**entry, 'buckets': list(entry['buckets'])}
+                         for name, entry in self._endpoints.items()}
+        return {
+            'buckets_ms': list(BUCKETS_MS),
+            'endpoints': {name: summarize(entry) for name, entry in sorted(endpoints.items())},
+        }
+
+
+def histogram_percentile(buckets, fraction, max_ms):
+    """Upper bound of the bucket holding the given fraction of requests"""
+    rank = fraction * sum(buckets)
+    seen = 0
+    for bound, count in zip((*BUCKETS_MS, max_ms), buckets):
+        seen += count
+        if seen >= rank:
+            return min(bound, max_ms)
+    return max_ms
+
+
+def summarize(entry):
+    count = entry['count']
+
+    def mean(key):
+        return round(entry[key] / count, 2)
+
+    return {
+        'count': count,
+        'errors': entry['errors'],
+        'mean_ms': mean('total_ms'),
+        'max_ms': round(entry['max_ms'], 2),
+        **{f'p{round(fraction * 100)}_ms': round(histogram_percentile(entry['buckets'], fraction, entry['max_ms']), 2)
+           for fraction in (0.5, 0.95, 0.99)},
+        'queries': mean('queries'),
+        **{f'{phase}_ms': mean(f'{phase}_ms') for phase in PHASES},
+        'buckets': entry['buckets'],
+    }
+
+
+request_stats = RequestStats()
+
+
+def server_timing(timings, seconds):
+    total = seconds * 1000
+    phases = {phase: timings.seconds[phase] * 1000 for phase in PHASES}
+    app = max(total - sum(phases.values()), 0.0)
+    return ', '.join([
+        f'db;desc="{timings.queries} queries";dur={phases["db"]:.2f}',
+        f'serialize;dur={phases["serialize"]:.2f}',
+        f'render;dur={phases["render"]:.2f}',
+        f'compress;dur={phases["compress"]:.2f}',
+        f'app;dur={app:.2f}',
+        f'total;dur={total:.2f}',
+    ])
+
+
+class RequestTimingMiddleware:
+    """Time each request's SQL, serialization, rendering and compression.
+
+    Streaming responses are timed until their headers are ready.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        seconds = timings.elapsed()
+        options = timing_options()
+        match = request.resolver_match
+        endpoint = f'{request.method} {match.view_name if match else "unresolved"}'
+        request_stats.record(endpoint, response.status_code, timings, seconds)
+
+        if options['SERVER_TIMING_HEADER']:
+            response['Server-Timing'] = server_timing(timings, seconds)
+        if seconds * 1000 >= options['SLOW_REQUEST_MS']:
+            self.log_slow(request, endpoint, timings, seconds, options['TOP_STATEMENTS'])
+        return response
+
+    @staticmethod
+    def log_slow(request, endpoint, timings, seconds, limit):
+        statements = ''.join(
+            f'\n  {count}x {statement_seconds * 1000:.1f}ms {sql}'
+            for count, statement_seconds, sql in timings.top_statements(limit)
+        )
+        logger.warning(
+            'Slow request %s %s (%s): %.0fms, %d queries in %.0fms, serialize %.0fms, render %.0fms, '
+            'compress %.0fms%s',
+            request.method, request.get_full_path(), endpoint, seconds * 1000, timings.queries,
+            timings.seconds['db'] * 1000, timings.seconds['serialize'] * 1000,
+            timings.seconds['render'] * 1000, timings.seconds['compress'] * 1000, statements,
+        )
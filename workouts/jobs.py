@@ -0,0 +1,176 @@
+"""Database-backed queue for recomputing derived data off the request path.
+
+Writes enqueue a job per user and kind once they commit; the run_jobs
+worker claims due jobs and runs the kind's registered handler. A user has
+at most one pending job of a kind: a burst of writes within
+BATCH_DELAY_SECONDS adds its keys to the same job, which then runs once.
+Failed jobs are retried with exponential backoff and kept as failed after
+MAX_ATTEMPTS.
+
+With BACKGROUND_JOBS['ENABLED'] off (the default), handlers run right away
+in the committing request, as if the worker had picked the job up at once.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Writes within this window after the first one share its job
+    'BATCH_DELAY_SECONDS': 2,
+    'MAX_ATTEMPTS': 5,
+    # Doubled after every failed attempt
+    'RETRY_DELAY_SECONDS': 30,
+    # A running job not finished by then is assumed lost with its worker and run again
+    'LOCK_TIMEOUT_SECONDS': 600,
+}
+
+HANDLERS = {}
+
+
+def job_options():
+    return {**DEFAULTS, **getattr(settings, 'BACKGROUND_JOBS', {})}
+
+
+def register(kind):
+    """Register the handler of a kind, called as handler(user_id, keys)"""
+    def decorator(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+def _hashable(key):
+    return tuple(key) if isinstance(key, list) else key
+
+
+def merge_keys(*key_lists):
+    """Keys of all lists, each once, in a stable order"""
+    return sorted({_hashable(key) for keys in key_lists for key in keys})
+
+
+def enqueue(kind, user_id, keys=()):
+    """Queue keys for a user's job of this kind, or run the handler now when jobs are disabled.
+
+    Keys must be JSON serializable. Meant to be called after commit, so the
+    worker never sees a job before the rows it recomputes.
+    """
+    options = job_options()
+    if not options['ENABLED']:
+        with transaction.atomic():
+            HANDLERS[kind](user_id, list(keys))
+        return
+    _add(kind, user_id, list(keys), timezone.now() + timedelta(seconds=options['BATCH_DELAY_SECONDS']))
+
+
+def enqueue_by_user(kind, entries):
+    """Queue (user_id, key) entries, one job per user"""
+    by_user = {}
+    for user_id, key in entries:
+        by_user.setdefault(user_id, []).append(key)
+    for user_id, keys in by_user.items():
+        enqueue(kind, user_id, keys)
+
+
+def _add(kind, user_id, keys, run_after):
+    """Merge keys into the user's pending job, creating it if there is none.
+
+    Retries when a worker claims the pending job, or another request
+    creates one or merges its own keys in between.
+    """
+    while True:
+        pending = Job.objects.filter(user_id=user_id, kind=kind, status=Job.PENDING).first()
+        if pending is None:
+            try:
+                with transaction.atomic():
+                    return Job.objects.create(user_id=user_id, kind=kind, keys=merge_keys(keys), run_after=run_after)
+            except IntegrityError:
+                continue
+        merged = merge_keys(pending.keys, keys)
+        if merged == merge_keys(pending.keys):
+            return pending
+        # Conditional on the keys read above, so concurrent merges never drop each other's keys
+        if Job.objects.filter(pk=pending.pk, status=Job.PENDING, keys=pending.keys).update(keys=merged):
+            return pending
+
+
+def claim():
+    """Mark the next due job running and return it; None when nothing is due"""
+    now = timezone.now()
+    stale = now - timedelta(seconds=job_options()['LOCK_TIMEOUT_SECONDS'])
+    due = Job.objects.filter(
+        Q(status=Job.PENDING, run_after__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale)
+    )
+    while True:
+        job = due.first()
+        if job is None:
+            return None
+        # Conditional on the state read above, so two workers never claim the same job
+        claimed = Job.objects.filter(pk=job.pk, status=job.status, locked_at=job.locked_at).update(
+            status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            job.status, job.locked_at, job.attempts = Job.RUNNING, now, job.attempts + 1
+            return job
+
+
+def run(job):
+    """Run a claimed job in a transaction; True when it succeeded"""
+    try:
+        with transaction.atomic():
+            HANDLERS[job.kind](job.user_id, job.keys)
+    except Exception:
+        logger.exception('Job %s (%s for user %s) failed, attempt %d', job.pk, job.kind, job.user_id, job.attempts)
+        _failed(job, traceback.format_exc())
+        return False
+    Job.objects.filter(pk=job.pk, locked_at=job.locked_at).delete()
+    return True
+
+
+def _failed(job, error):
+    options = job_options()
+    mine = Job.objects.filter(pk=job.pk, locked_at=job.locked_at)
+    if job.attempts >= options['MAX_ATTEMPTS']:
+        mine.update(status=Job.FAILED, last_error=error)
+        return
+
+    run_after = timezone.now() + timedelta(seconds=options['RETRY_DELAY_SECONDS'] * 2 ** (job.attempts - 1))
+    try:
+        with transaction.atomic():
+            mine.update(status=Job.PENDING, locked_at=None, run_after=run_after, last_error=error)
+    except IntegrityError:
+        # Newer writes queued another job meanwhile; it takes over these keys
+        _add(job.kind, job.user_id, job.keys, run_after)
+        mine.delete()
+
+
+def run_due(limit=None):
+    """Run due jobs until none is left (or limit ran); returns (succeeded, failed)"""
+    succeeded = failed = 0
+    while limit is None or succeeded + failed < limit:
+        job = claim()
+        if job is None:
+            break
+        if run(job):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def retry_failed():
+    """Queue failed jobs again with a fresh attempt count; returns how many"""
+    failed = list(Job.objects.filter(status=Job.FAILED))
+    for job in failed:
+        _add(job.kind, job.user_id, job.keys, timezone.now())
+        job.delete()
+    return len(failed)
@@ -0,0 +1,287 @@
+"""Strength-score leaderboard, kept current one user at a time.
+
+A LeaderboardEntry holds each ranked user's best squat, bench and deadlift
+e1RMs (the best PersonalRecord of any exercise in the category), their
+latest bodyweight and the total's Wilks, DOTS and IPF GL scores. Entries
+are refreshed by a background job when a user's records, bodyweight or
+profile change, never on read. Only users who set leaderboard_visible on
+their profile are ranked.
+
+Ranks come from a Fenwick tree per formula over score slots of
+1 / SCALE points, stored in LeaderboardCounter: the entries in higher slots
+are a prefix sum of about log2(SLOTS) nodes, read in one query. Adding
+the entries above the user within their own slot (an index range over a
+fraction of a point) gives the exact rank, however many users there are.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from .deferred import OnCommitBatch
+from .jobs import enqueue, register
+from .models import BodyweightEntry, LeaderboardCounter, LeaderboardEntry, PersonalRecord, TrainingProfile
+from .scoring import SCORE_FORMULAS, scores
+
+
+LIFT_CATEGORIES = ('squat', 'bench', 'deadlift')
+
+# Score slots per point; scores of MAX_SCORE and above share the last slot
+SCALE = 10
+MAX_SCORE = 1000
+SLOTS = MAX_SCORE * SCALE + 1
+
+
+def score_slot(score):
+    return min(int(Decimal(score) * SCALE), SLOTS - 1)
+
+
+def _tree_position(slot):
+    """1-based position in the tree; higher scores come first"""
+    return SLOTS - slot
+
+
+def _update_nodes(position):
+    nodes = []
+    while position <= SLOTS:
+        nodes.append(position)
+        position += position & -position
+    return nodes
+
+
+def _prefix_nodes(position):
+    nodes = []
+    while position > 0:
+        nodes.append(position)
+        position -= position & -position
+    return nodes
+
+
+def _prefix_sum(formula, position):
+    return sum(LeaderboardCounter.objects.filter(
+        formula=formula, node__in=_prefix_nodes(position),
+    ).values_list('count', flat=True))
+
+
+# Never part of a prefix sum; refreshes write it first to take the trees' lock
+LOCK_NODE = 0
+
+
+def _upsert_counts(rows):
+    """Add (formula, node, delta) rows to the counters in one executemany upsert"""
+    quote = connection.ops.quote_name
+    sql = (
+        'INSERT INTO {table} ({formula}, {node}, {count}) VALUES (%s, %s, %s) '
+        'ON CONFLICT ({formula}, {node}) DO UPDATE SET {count} = {table}.{count} + excluded.{count}'
+    ).format(
+        table=quote(LeaderboardCounter._meta.db_table),
+        formula=quote('formula'), node=quote('node'), count=quote('count'),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _add_counts(deltas):
+    """Apply {(formula, slot): delta} to the trees"""
+    changes = defaultdict(int)
+    for (formula, slot), delta in deltas.items():
+        if delta:
+            for node in _update_nodes(_tree_position(slot)):
+                changes[formula, node] += delta
+    if changes:
+        _upsert_counts([(formula, node, delta) for (formula, node), delta in changes.items()])
+
+
+def _lock_trees():
+    """Make the transaction's first statement a write, so refreshes run one at a time.
+
+    On SQLite (which ignores select_for_update) the write takes the database
+    write lock at once, so a concurrent refresh waits for it instead of
+    failing with "database is locked" on a later write. Other backends lock
+    the counter row until commit.
+    """
+    _upsert_counts([(SCORE_FORMULAS[0], LOCK_NODE, 0)])
+
+
+def entrants(formula):
+    """Number of ranked users"""
+    return _prefix_sum(formula, SLOTS)
+
+
+def rank_of(formula, score):
+    """Competition rank of a score: 1 + the entries scoring strictly higher"""
+    slot = score_slot(score)
+    higher_slots = _prefix_sum(formula, _tree_position(slot) - 1)
+    same_slot = LeaderboardEntry.objects.filter(**{f'{formula}__gt': score})
+    if slot < SLOTS - 1:
+        same_slot = same_slot.filter(**{f'{formula}__lt': Decimal(slot + 1) / SCALE})
+    return higher_slots + same_slot.count() + 1
+
+
+def page_ranks(formula, entries):
+    """Ranks of a page of entries ordered by score, then id, descending.
+
+    Tied entries share the rank of the first; the entry after a tie group
+    ranks by its position.
+    """
+    if not entries:
+        return []
+    first = getattr(entries[0], formula)
+    first_rank = rank_of(formula, first)
+    # Entries tied with the first one, shown on earlier pages
+    offset = first_rank - 1 + LeaderboardEntry.objects.filter(**{formula: first}, pk__gt=entries[0].pk).count()
+    ranks = []
+    for index, entry in enumerate(entries):
+        score = getattr(entry, formula)
+        if score == first:
+            ranks.append(first_rank)
+        elif score == getattr(entries[index - 1], formula):
+            ranks.append(ranks[-1])
+        else:
+            ranks.append(offset + index + 1)
+    return ranks
+
+
+def best_lifts(user_ids):
+    """{user_id: {category: best e1RM}} from the stored personal records"""
+    rows = PersonalRecord.objects.filter(
+        user_id__in=user_ids, kind='e1rm', exercise__category__in=LIFT_CATEGORIES,
+    ).values('user_id', 'exercise__category').annotate(best=Max('value'))
+    lifts = defaultdict(dict)
+    for row in rows:
+        lifts[row['user_id']][row['exercise__category']] = row['best']
+    return lifts
+
+
+def scored_users():
+    """Users annotated with their latest bodyweight, sex ('' when unset) and leaderboard opt-in"""
+    profile = TrainingProfile.objects.filter(user=OuterRef('pk'))
+    return User.objects.annotate(
+        bodyweight=Subquery(
+            BodyweightEntry.objects.filter(user=OuterRef('pk')).order_by('-date').values('weight')[:1]
+        ),
+        sex=Coalesce(Subquery(profile.values('sex')[:1]), Value('')),
+        visible=Coalesce(Subquery(profile.values('leaderboard_visible')[:1]), Value(False)),
+    )
+
+
+def missing_requirements(user_id):
+    """What keeps a user off the leaderboard: 'leaderboard_visible', 'sex', 'bodyweight' and lifts without a record"""
+    user = scored_users().filter(pk=user_id).values('bodyweight', 'sex', 'visible').get()
+    lifts = best_lifts([user_id])[user_id]
+    missing = [] if user['visible'] else ['leaderboard_visible']
+    if not user['sex']:
+        missing.append('sex')
+    if user['bodyweight'] is None:
+        missing.append('bodyweight')
+    return missing + [category for category in LIFT_CATEGORIES if category not in lifts]
+
+
+def _fit(field_name, value):
+    """Round a value to an entry field's decimal places, capped at the largest it can store"""
+    field = LeaderboardEntry._meta.get_field(field_name)
+    step = Decimal(10) ** -field.decimal_places
+    largest = Decimal(10) ** (field.max_digits - field.decimal_places) - step
+    return min(Decimal(str(value)).quantize(step), largest)
+
+
+def build_entry(user_id, lifts, bodyweight, sex, visible):
+    """The user's unsaved entry, or None when not opted in or a lift, the bodyweight or the sex is missing"""
+    if not visible or not sex or bodyweight is None:
+        return None
+    if any(category not in lifts for category in LIFT_CATEGORIES):
+        return None
+    lifts = {category: _fit(category, lifts[category]) for category in LIFT_CATEGORIES}
+    total = _fit('total', sum(lifts.values()))
+    return LeaderboardEntry(
+        user_id=user_id, sex=sex, bodyweight=bodyweight, total=total, **lifts,
+        # As stored, so slots computed before and after saving agree
+        **{formula: _fit(formula, f'{score:.2f}') for formula, score in scores(total, bodyweight, sex).items()},
+    )
+
+
+ENTRY_FIELDS = ['sex', 'bodyweight', *LIFT_CATEGORIES, 'total', *SCORE_FORMULAS, 'updated_at']
+
+
+def refresh_entry(user_id):
+    """Recompute one user's entry and move it in the rank trees; returns it or None"""
+    with transaction.atomic():
+        # Before reading the entry, so the trees count each entry once
+        _lock_trees()
+        user = scored_users().filter(pk=user_id).values('bodyweight', 'sex', 'visible').first()
+        current = LeaderboardEntry.objects.filter(user_id=user_id).first()
+        entry = None
+        if user is not None:
+            entry = build_entry(
+                user_id, best_lifts([user_id])[user_id], user['bodyweight'], user['sex'], user['visible'],
+            )
+
+        if entry is None:
+            if current is not None:
+                # leave_rank_trees (signals.py) takes it out of the trees
+                current.delete()
+            return None
+
+        deltas = defaultdict(int)
+        for formula in SCORE_FORMULAS:
+            if current is not None:
+                deltas[formula, score_slot(getattr(current, formula))] -= 1
+            deltas[formula, score_slot(getattr(entry, formula))] += 1
+
+        if current is None:
+            entry.save()
+        else:
+            entry.pk = current.pk
+            entry.save(update_fields=ENTRY_FIELDS)
+        _add_counts(deltas)
+    return entry
+
+
+def leave_trees(entry):
+    """Take a deleted entry out of the rank trees"""
+    _add_counts({(formula, score_slot(getattr(entry, formula))): -1 for formula in SCORE_FORMULAS})
+
+
+@register('leaderboard')
+def refresh_user_entry(user_id, keys):
+    refresh_entry(user_id)
+
+
+def rebuild_leaderboard(batch_size=1000):
+    """Recreate every entry and the rank trees from scratch; returns the number of entries"""
+    with transaction.atomic():
+        # Entries first: their delete signals decrement counters dropped right after
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardCounter.objects.all().delete()
+        users = list(
+            scored_users().filter(bodyweight__isnull=False, visible=True).exclude(sex='').values_list(
+                'pk', 'bodyweight', 'sex',
+            )
+        )
+        created, slot_counts = 0, defaultdict(int)
+        for start in range(0, len(users), batch_size):
+            chunk = users[start:start + batch_size]
+            lifts = best_lifts([user_id for user_id, _, _ in chunk])
+            entries = []
+            for user_id, bodyweight, sex in chunk:
+                entry = build_entry(user_id, lifts[user_id], bodyweight, sex, visible=True)
+                if entry is not None:
+                    entries.append(entry)
+                    for formula in SCORE_FORMULAS:
+                        slot_counts[formula, score_slot(getattr(entry, formula))] += 1
+            LeaderboardEntry.objects.bulk_create(entries)
+            created += len(entries)
+        _add_counts(slot_counts)
+    return created
+
+
+def queue_entries(user_ids):
+    for user_id in user_ids:
+        enqueue('leaderboard', user_id)
+
+
+# Queue user ids whose entry needs a refresh once the transaction commits
+pending_entries = OnCommitBatch(queue_entries)
+mark_leaderboard_dirty = pending_entries.add
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from workouts.e1rm import recompute_e1rm
+from workouts.records import rebuild_records
+from workouts.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Store each set's estimated 1RM under its owner's formula, in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only backfill sets of this user id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--missing', action='store_true',
+                            help='Only fill sets without a stored estimate')
+        parser.add_argument('--skip-summaries', action='store_true',
+                            help='Do not rebuild daily summaries and personal records afterwards')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = recompute_e1rm(
+            options['users'], batch_size=options['batch_size'], missing_only=options['missing']
+        )
+        elapsed = time.perf_counter() - started
+        rate = written / elapsed if elapsed else 0
+        self.stdout.write(f'Stored {written} estimates in {elapsed:.1f}s ({rate:.0f} sets/s)')
+
+        # Daily summaries and e1RM records carry the best stored estimate
+        if written and not options['skip_summaries']:
+            created = rebuild_summaries(options['users'])
+            records = rebuild_records(options['users'])
+            self.stdout.write(f'Rebuilt {created} daily summaries and {records} personal records')
+
+        self.stdout.write(self.style.SUCCESS('Successfully backfilled estimated 1RMs'))
@@ -0,0 +1,153 @@
+import json
+import logging
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.utils import timezone
+from drf_spectacular.drainage import GENERATOR_STATS
+from rest_framework.authtoken.models import Token
+from workouts.benchmarking import (
+    Account, api_endpoints, benchmark_exercises, regressions, run_endpoint, seed_user
+)
+
+
+@contextmanager
+def quiet():
+    """Keep expected 4xx warnings and schema generation notes out of the results table"""
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    try:
+        # The test client's host, as the test runner allows it
+        with GENERATOR_STATS.silence(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            yield
+    finally:
+        request_logger.setLevel(level)
+
+
+@contextmanager
+def benchmark_database(path=None):
+    """Point the default connection at a separate, migrated SQLite file for the run.
+
+    Without a path the file is temporary and removed afterwards; a given path
+    is kept, with its benchmark users, for later runs.
+    """
+    test_settings = connection.settings_dict['TEST']
+    previous = test_settings['NAME']
+    with tempfile.TemporaryDirectory() as directory:
+        test_settings['NAME'] = str(path or Path(directory) / 'benchmark.sqlite3')
+        keepdb = path is not None
+        try:
+            old_config = setup_databases(
+                verbosity=0, interactive=False, keepdb=keepdb, aliases={'default'}, serialized_aliases=set(),
+            )
+            try:
+                yield
+            finally:
+                teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+        finally:
+            test_settings['NAME'] = previous
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed benchmark users in a separate database and drive every API endpoint '
+        'through the test client with concurrent workers. Reports p50/p95/p99 '
+        'latency, throughput, SQL queries and payload size per endpoint; saves and '
+        'compares JSON results.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2)
+        parser.add_argument('--years', type=float, default=1, help='Training history per user')
+        parser.add_argument('--sessions-per-week', type=int, default=3, choices=range(1, 8))
+        parser.add_argument('--sets', type=int, default=5, help='Sets per exercise in each session')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Only run endpoints whose name contains this (repeatable)')
+        parser.add_argument('--database',
+                            help='SQLite file to benchmark in, created and migrated if missing and kept '
+                                 'afterwards; later runs reuse its users with whatever earlier writes added. '
+                                 'By default every run seeds a temporary database, so runs start from the '
+                                 'same data')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to flag regressions against')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Relative p95 latency or payload growth that counts as a regression')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            baseline = json.loads(Path(options['compare']).read_text())
+
+        database = options['database'] and Path(options['database']).resolve()
+        if database and database == Path(settings.DATABASES['default']['NAME']).resolve():
+            raise CommandError('--database must not be the configured database')
+
+        with benchmark_database(database):
+            run = self.benchmark(options)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(run, indent=2))
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            found = regressions(baseline, run, options['threshold'])
+            for regression in found:
+                self.stdout.write(self.style.ERROR(f'Regression: {regression}'))
+            if found:
+                raise CommandError(f'{len(found)} regressions against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}'))
+
+    def benchmark(self, options):
+        accounts = [
+            Account(*seed_user(f'bench-user-{index}', options['years'], options['sessions_per_week'],
+                               options['sets'], seed=index))
+            for index in range(options['users'])
+        ]
+        admin, _ = User.objects.update_or_create(username='bench-admin', defaults={'is_staff': True})
+        admin_account = Account(admin, Token.objects.get_or_create(user=admin)[0].key)
+
+        endpoints = api_endpoints(benchmark_exercises(), admin_account)
+        if options['endpoints']:
+            endpoints = [
+                endpoint for endpoint in endpoints
+                if any(part in endpoint.name for part in options['endpoints'])
+            ]
+
+        results = {}
+        self.stdout.write(f"{'endpoint':<20} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+                          f"{'queries':>7} {'bytes':>9} {'errors':>6}")
+        for endpoint in endpoints:
+            with quiet():
+                result = results[endpoint.name] = run_endpoint(
+                    endpoint, accounts, options['requests'], options['concurrency']
+                )
+            line = (f"{endpoint.name:<20} {result['rps']:>8.1f} {result['p50_ms']:>8.2f} "
+                    f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['queries']:>7} "
+                    f"{result['bytes']:>9} {result['errors']:>6}")
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+        return {'meta': self.meta(options), 'endpoints': results}
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5,
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            'created_at': timezone.now().isoformat(),
+            'commit': commit,
+            'database_profile': settings.DATABASE_PROFILE,
+            **{key: options[key] for key in ('users', 'years', 'sessions_per_week', 'sets', 'requests', 'concurrency')},
+        }
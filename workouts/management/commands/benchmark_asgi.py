@@ -0,0 +1,133 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from workouts.benchmarking import latency_summary, seed_user
+
+
+MODES = {
+    # (handler, URL configuration)
+    'wsgi': ('wsgi', 'django_project.urls'),
+    'asgi-sync': ('asgi', 'django_project.urls'),
+    'asgi': ('asgi', 'django_project.asgi_urls'),
+}
+
+
+def read_paths():
+    today = date.today()
+    return [
+        ('/api/calendar/', f'year={today.year}&month={today.month}'),
+        ('/api/workout-logs/', ''),
+        ('/api/analytics/e1rm/', 'period=week'),
+        ('/api/analytics/training-load/', ''),
+        ('/api/records/', ''),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests per second and tail latency of the read endpoints under '
+        'WSGI with threads, ASGI with the sync views and ASGI with the async views. '
+        'Requests go straight to the handlers, without a server or network.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per mode')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--mode', choices=list(MODES), action='append', dest='modes')
+        parser.add_argument('--user', default='benchmark', help='User to read as, seeded if missing')
+
+    def handle(self, *args, **options):
+        _, self.token = seed_user(options['user'])
+        paths = read_paths()
+        requests = [paths[index % len(paths)] for index in range(options['requests'])]
+
+        for mode in options['modes'] or list(MODES):
+            handler, urlconf = MODES[mode]
+            with override_settings(ROOT_URLCONF=urlconf):
+                run = self.run_wsgi if handler == 'wsgi' else self.run_asgi
+                statuses, timings, elapsed = run(requests, options['concurrency'])
+
+            failed = sum(status >= 400 for status in statuses)
+            summary = latency_summary(timings, elapsed)
+            self.stdout.write(
+                f"{mode:>9}: {summary['rps']:7.1f} req/s  p50 {summary['p50_ms']:7.2f} ms  "
+                f"p95 {summary['p95_ms']:7.2f} ms  p99 {summary['p99_ms']:7.2f} ms"
+                + (self.style.ERROR(f'  {failed} failed') if failed else '')
+            )
+
+    def run_wsgi(self, requests, concurrency):
+        handler = WSGIHandler()
+
+        def call(request):
+            path, query = request
+            started = time.perf_counter()
+            status = []
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+                'HTTP_AUTHORIZATION': f'Token {self.token}',
+                'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+            }
+            response = handler(environ, lambda line, headers: status.append(int(line.split()[0])))
+            b''.join(response)
+            response.close()
+            return status[0], time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(call, requests))
+        return [status for status, _ in results], [timing for _, timing in results], time.perf_counter() - started
+
+    def run_asgi(self, requests, concurrency):
+        handler = ASGIHandler()
+
+        async def call(request):
+            path, query = request
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+                'query_string': query.encode(), 'root_path': '',
+                'headers': [(b'host', b'localhost'), (b'authorization', f'Token {self.token}'.encode())],
+                'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+            }
+            received = False
+
+            async def receive():
+                nonlocal received
+                if received:
+                    # Waits for a disconnect that never comes; cancelled once the response is sent
+                    await asyncio.Future()
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            status = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            started = time.perf_counter()
+            await handler(scope, receive, send)
+            return status[0], time.perf_counter() - started
+
+        async def run():
+            queue = list(reversed(requests))
+            results = []
+
+            async def worker():
+                while queue:
+                    results.append(await call(queue.pop()))
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return results
+
+        started = time.perf_counter()
+        results = asyncio.run(run())
+        return [status for status, _ in results], [timing for _, timing in results], time.perf_counter() - started
@@ -0,0 +1,86 @@
+import math
+import time
+import uuid
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer as DRFJSONRenderer
+from workouts.benchmarking import BENCHMARK_EXERCISES, seed_user
+from workouts.fast_serializers import ScheduledWorkoutReader, WorkoutLogReader
+from workouts.models import ScheduledWorkout, SetLog, WorkoutLog
+from workouts.renderers import JSONRenderer
+from workouts.serializers import ScheduledWorkoutSerializer, WorkoutLogSerializer
+
+
+SESSIONS_PER_WEEK = 3
+SETS_PER_EXERCISE = 5
+
+
+def best_of(build, repeat):
+    """Median milliseconds of build() and its last result"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = build()
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings)), result
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the workout log and scheduled workout reads on a synthetic payload: '
+        'ModelSerializer and DRF JSON rendering against .values() rows and orjson'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sets', type=int, default=1000, help='Logged sets in the workout log payload')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        sets_per_week = SESSIONS_PER_WEEK * len(BENCHMARK_EXERCISES) * SETS_PER_EXERCISE
+        weeks = math.ceil(options['sets'] / sets_per_week)
+
+        # Seeded inside a transaction that is rolled back, leaving the database as it was
+        with transaction.atomic():
+            user, _ = seed_user(f'bench-serialization-{uuid.uuid4().hex[:8]}', years=weeks / 52,
+                                sessions_per_week=SESSIONS_PER_WEEK, sets_per_exercise=SETS_PER_EXERCISE)
+            set_count = SetLog.objects.filter(exercise_log__workout_log__user=user).count()
+            workout_logs = WorkoutLog.objects.filter(user=user)
+            scheduled = ScheduledWorkout.objects.filter(user=user)
+            log_reader, scheduled_reader = WorkoutLogReader(), ScheduledWorkoutReader()
+
+            self.compare(
+                f'Workout logs ({workout_logs.count()} logs, {set_count} sets)', options['repeat'],
+                lambda: WorkoutLogSerializer(WorkoutLogSerializer.setup_eager_loading(workout_logs), many=True).data,
+                lambda: log_reader.data(list(workout_logs.values(*log_reader.lookups))),
+            )
+            self.compare(
+                f'Scheduled workouts ({scheduled.count()} with templates)', options['repeat'],
+                lambda: ScheduledWorkoutSerializer(
+                    ScheduledWorkoutSerializer.setup_eager_loading(scheduled), many=True
+                ).data,
+                lambda: scheduled_reader.data(list(scheduled.values(*scheduled_reader.lookups))),
+            )
+            transaction.set_rollback(True)
+
+    def compare(self, label, repeat, serialize, fast_serialize):
+        drf_renderer, renderer = DRFJSONRenderer(), JSONRenderer()
+        # Warm up query compilation and the database cache for both paths
+        serialize(), fast_serialize()
+
+        serialize_ms, data = best_of(serialize, repeat)
+        render_ms, body = best_of(lambda: drf_renderer.render(data), repeat)
+        fast_serialize_ms, fast_data = best_of(fast_serialize, repeat)
+        fast_render_ms, fast_body = best_of(lambda: renderer.render(fast_data), repeat)
+        if fast_body != body:
+            raise CommandError(f'{label}: the fast path output differs from the serializers')
+
+        before, after = serialize_ms + render_ms, fast_serialize_ms + fast_render_ms
+        self.stdout.write(
+            f'{label}, {len(body):,} bytes:\n'
+            f'  serializers + DRF JSON: {before:.1f} ms (serialize {serialize_ms:.1f}, render {render_ms:.1f})\n'
+            f'  values() + orjson:      {after:.1f} ms (serialize {fast_serialize_ms:.1f}, '
+            f'render {fast_render_ms:.1f})\n'
+            f'  {before / after:.1f}x faster, identical output'
+        )
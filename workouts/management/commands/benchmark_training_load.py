@@ -0,0 +1,46 @@
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from workouts.training_load import CATEGORIES, TrainingHistory, training_load_report
+
+
+def synthetic_history(years, sessions_per_week=4, sets_per_session=20, seed=0):
+    """A TrainingHistory of random daily training, built without the database"""
+    rng = np.random.default_rng(seed)
+    days = int(years * 365)
+    training_days = np.flatnonzero(rng.random(days) < sessions_per_week / 7)
+    set_days = np.repeat(training_days, sets_per_session)
+    exercises = rng.integers(0, 12, len(set_days))
+    reps = rng.integers(1, 13, len(set_days)).astype(np.float64)
+    weights = np.round(rng.uniform(40, 200, len(set_days)), 1)
+    return TrainingHistory(
+        date.today() - timedelta(days=days - 1), days, set_days,
+        exercises % len(CATEGORIES), exercises, reps, weights, weights * (1 + reps / 30),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Time the training-load analysis over synthetic daily history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=float, default=5)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        history = synthetic_history(options['years'])
+        start_date = history.first_day
+        end_date = history.first_day + timedelta(days=history.days - 1)
+
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            training_load_report(history, start_date, end_date)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(
+            f'{history.days} days, {len(history.reps)} sets: '
+            f'median {np.median(timings):.1f} ms, best {min(timings):.1f} ms '
+            f'over {len(timings)} runs'
+        )
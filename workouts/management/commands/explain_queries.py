@@ -0,0 +1,32 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from workouts.query_plans import check_query_plans
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN QUERY PLAN for the main endpoint queries and flag full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, default=1,
+                            help='User id to plan the queries for (the plan rarely depends on it)')
+        parser.add_argument('--quiet', action='store_true', help='Only report queries with full scans')
+
+    def handle(self, *args, **options):
+        try:
+            results = check_query_plans(options['user'])
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+
+        scanned = {name: scans for name, (_, scans) in results.items() if scans}
+        for name, (plan, scans) in results.items():
+            if options['quiet'] and not scans:
+                continue
+            style = self.style.ERROR if scans else self.style.SUCCESS
+            self.stdout.write(style(name))
+            for line in plan:
+                self.stdout.write(f'    {line}')
+
+        if scanned:
+            tables = ', '.join(f"{name} ({', '.join(scans)})" for name, scans in scanned.items())
+            raise CommandError(f'Full table scans in: {tables}')
+        self.stdout.write(self.style.SUCCESS(f'No full table scans in {len(results)} queries'))
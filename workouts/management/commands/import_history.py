@@ -0,0 +1,244 @@
+import csv
+import json
+import time
+from datetime import datetime, time as dt_time
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from workouts.e1rm import fill_e1rm, formula_for
+from workouts.models import Exercise, ScheduledWorkout, WorkoutLog, ExerciseLog, SetLog
+from workouts.records import rebuild_records
+from workouts.summaries import rebuild_summaries
+from workouts.sync import record_created
+from workouts.versions import mark_changed
+
+
+CATEGORIES = {value for value, _ in Exercise._meta.get_field('category').choices}
+
+
+@lru_cache(maxsize=4096)
+def parse_when(raw_date):
+    """Parse a date or datetime string; every set of a session shares one"""
+    when = parse_datetime(raw_date)
+    if when is None:
+        day = parse_date(raw_date)
+        if day is None:
+            raise ValueError(f'unrecognised date {raw_date!r}')
+        when = datetime.combine(day, dt_time())
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+
+class Command(BaseCommand):
+    help = (
+        'Import historical sets from CSV or NDJSON files. Each row is one set with '
+        'date, exercise, reps and weight, plus optional workout_name, set_number, rpe '
+        'and notes. Rows of a session must be contiguous. The other columns of the '
+        'history export (workout and exercise notes, duration, scheduled workout and '
+        'log ids) are read too, including rows of logs without sets.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='CSV (.csv) or NDJSON (.ndjson/.jsonl) files')
+        parser.add_argument('--user', required=True, help='Username to import the history for')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Number of sets written per bulk insert')
+        parser.add_argument('--create-exercises', action='store_true',
+                            help='Create unknown exercises (category from the row, else accessory)')
+
+    def handle(self, *args, **options):
+        try:
+            self.user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+
+        self.formula = formula_for(self.user.pk)
+        self.create_exercises = options['create_exercises']
+        self.exercises = {
+            name.lower(): pk for pk, name in Exercise.objects.values_list('pk', 'name')
+        }
+        batch_size = options['batch_size']
+
+        started = time.perf_counter()
+        self.total_sessions = self.total_sets = 0
+        pending, pending_sets = [], 0
+
+        for session in self.read_sessions(options['paths'], options['format']):
+            pending.append(session)
+            pending_sets += sum(len(entry['sets']) for entry in session['exercises'])
+            if pending_sets >= batch_size:
+                self.write(pending)
+                pending, pending_sets = [], 0
+        self.write(pending)
+
+        summaries = rebuild_summaries([self.user.pk])
+        records = rebuild_records([self.user.pk])
+        elapsed = time.perf_counter() - started
+        rate = self.total_sets / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.total_sets} sets in {self.total_sessions} workouts '
+            f'({summaries} daily summaries, {records} personal records) in {elapsed:.2f}s, {rate:,.0f} sets/s'
+        ))
+
+    def read_rows(self, path, fmt):
+        path = Path(path)
+        if fmt is None:
+            fmt = 'csv' if path.suffix.lower() == '.csv' else 'ndjson'
+        with path.open(newline='', encoding='utf-8') as handle:
+            if fmt == 'csv':
+                for line, row in enumerate(csv.DictReader(handle), start=2):
+                    yield f'{path.name}:{line}', row
+            else:
+                for line, text in enumerate(handle, start=1):
+                    if text.strip():
+                        yield f'{path.name}:{line}', json.loads(text)
+
+    def read_sessions(self, paths, fmt):
+        """Group contiguous rows into sessions with lists of exercise entries and their sets.
+
+        Rows of one workout_log (or, without it, one date and workout name)
+        form a session; rows of one exercise_log (or, without it, a run of
+        the same exercise) form an exercise entry.
+        """
+        session = None
+        for path in paths:
+            for location, row in self.read_rows(path, fmt):
+                try:
+                    workout, exercise, set_values = self.parse_row(row)
+                except (KeyError, ValueError, InvalidOperation) as exc:
+                    raise CommandError(f'{location}: invalid row ({exc})')
+
+                if session is None or session['key'] != workout['key']:
+                    if session is not None:
+                        yield session
+                    session = {**workout, 'exercises': []}
+                if exercise is None:
+                    continue
+
+                exercises = session['exercises']
+                if not exercises or exercises[-1]['key'] != exercise['key']:
+                    exercises.append({**exercise, 'sets': []})
+                    numbers = set()
+                if set_values is None:
+                    continue
+                # Rows without a set_number follow the highest one so far
+                if set_values['set_number'] is None:
+                    set_values['set_number'] = max(numbers, default=0) + 1
+                elif set_values['set_number'] in numbers:
+                    raise CommandError(
+                        f"{location}: set_number {set_values['set_number']} is already used by this exercise"
+                    )
+                numbers.add(set_values['set_number'])
+                exercises[-1]['sets'].append(set_values)
+        if session is not None:
+            yield session
+
+    @staticmethod
+    def optional_int(row, field):
+        value = row.get(field)
+        return int(value) if value not in (None, '') else None
+
+    def parse_row(self, row):
+        """(workout, exercise, set) parts of a row; exercise and set are None when left empty"""
+        when = parse_when(str(row['date']).strip())
+        name = (row.get('workout_name') or '').strip() or f'Imported workout {when.date()}'
+        workout_log = self.optional_int(row, 'workout_log')
+        workout = {
+            'key': workout_log if workout_log is not None else (when, name),
+            'date': when,
+            'name': name,
+            'duration_minutes': self.optional_int(row, 'duration_minutes'),
+            'notes': row.get('workout_notes') or '',
+            'scheduled_workout': self.optional_int(row, 'scheduled_workout'),
+        }
+        # An exported workout log without exercises
+        if row['exercise'] in (None, ''):
+            return workout, None, None
+
+        exercise_id = self.resolve_exercise(row)
+        exercise_log = self.optional_int(row, 'exercise_log')
+        exercise = {
+            'key': exercise_log if exercise_log is not None else exercise_id,
+            'exercise_id': exercise_id,
+            'notes': row.get('exercise_notes') or '',
+        }
+        # An exported exercise log without sets
+        if row.get('reps') in (None, '') and row.get('weight') in (None, ''):
+            return workout, exercise, None
+
+        set_number = self.optional_int(row, 'set_number')
+        if set_number is not None and set_number < 1:
+            raise ValueError(f'set_number must be positive, got {set_number}')
+        rpe = row.get('rpe')
+        return workout, exercise, {
+            'set_number': set_number,
+            'reps': int(row['reps']),
+            'weight': Decimal(str(row['weight'])),
+            'rpe': int(float(rpe)) if rpe not in (None, '') else None,
+            'notes': row.get('notes') or '',
+        }
+
+    def resolve_exercise(self, row):
+        name = str(row['exercise']).strip()
+        exercise_id = self.exercises.get(name.lower())
+        if exercise_id is None:
+            if not self.create_exercises:
+                raise ValueError(f'unknown exercise {name!r}, use --create-exercises')
+            category = row.get('category') or 'accessory'
+            if category not in CATEGORIES:
+                raise ValueError(f'unknown category {category!r} for exercise {name!r}')
+            exercise_id = Exercise.objects.create(name=name, category=category).pk
+            self.exercises[name.lower()] = exercise_id
+        return exercise_id
+
+    def write(self, sessions):
+        """Insert a chunk of sessions with one bulk insert per table"""
+        if not sessions:
+            return
+        # Exported scheduled workout ids are kept only when they are the user's own
+        scheduled = set(ScheduledWorkout.objects.filter(
+            user=self.user, pk__in={session['scheduled_workout'] for session in sessions} - {None},
+        ).values_list('pk', flat=True))
+        with transaction.atomic():
+            workout_logs = WorkoutLog.objects.bulk_create([
+                WorkoutLog(
+                    user=self.user, workout_name=session['name'], date=session['date'],
+                    duration_minutes=session['duration_minutes'], notes=session['notes'],
+                    scheduled_workout_id=session['scheduled_workout'] if session['scheduled_workout'] in scheduled
+                    else None,
+                )
+                for session in sessions
+            ])
+            exercise_entries = [
+                (workout_log, order, entry)
+                for workout_log, session in zip(workout_logs, sessions)
+                for order, entry in enumerate(session['exercises'])
+            ]
+            exercise_logs = ExerciseLog.objects.bulk_create([
+                ExerciseLog(workout_log=workout_log, exercise_id=entry['exercise_id'], notes=entry['notes'],
+                            order=order)
+                for workout_log, order, entry in exercise_entries
+            ])
+            set_logs = [
+                SetLog(exercise_log=exercise_log, **set_values)
+                for exercise_log, (_, _, entry) in zip(exercise_logs, exercise_entries)
+                for set_values in entry['sets']
+            ]
+            fill_e1rm(set_logs, self.formula)
+            SetLog.objects.bulk_create(set_logs)
+
+            mark_changed({('logs', self.user.pk)})
+            record_created(self.user.pk, [*workout_logs, *exercise_logs, *set_logs])
+
+        self.total_sessions += len(workout_logs)
+        self.total_sets += len(set_logs)
+        self.stdout.write(f'Wrote {self.total_sets} sets in {self.total_sessions} workouts')
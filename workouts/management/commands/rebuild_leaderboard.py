@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from workouts.leaderboard import rebuild_leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the strength-score leaderboard and its rank trees from records, bodyweights and profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        created = rebuild_leaderboard(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {created} leaderboard entries')
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from workouts.records import rebuild_records
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the personal record board from the logged sets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only rebuild records for this user id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        created = rebuild_records(options['users'], batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {created} personal records')
+        )
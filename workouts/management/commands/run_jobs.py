@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from workouts.jobs import job_options, retry_failed, run_due
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (summary, record, estimate and leaderboard recomputation). '
+        'Start one per worker process; workers never claim the same job.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the jobs due now, then exit')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when no job is due')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Queue jobs that used up their attempts again first')
+
+    def handle(self, *args, **options):
+        if not job_options()['ENABLED']:
+            self.stderr.write(
+                self.style.WARNING("BACKGROUND_JOBS['ENABLED'] is off: writes run their jobs inline")
+            )
+        if options['retry_failed']:
+            self.stdout.write(f'Queued {retry_failed()} failed jobs again')
+
+        if options['once']:
+            self.report(*run_due())
+            return
+
+        self.stdout.write(f'Waiting for jobs (polling every {options["poll"]}s), Ctrl-C to stop')
+        try:
+            while True:
+                # Persistent connections are recycled between batches, as between requests
+                close_old_connections()
+                succeeded, failed = run_due(limit=100)
+                if succeeded or failed:
+                    self.report(succeeded, failed)
+                else:
+                    time.sleep(options['poll'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
+
+    def report(self, succeeded, failed):
+        message = f'Ran {succeeded + failed} jobs, {failed} failed'
+        self.stdout.write(self.style.WARNING(message) if failed else self.style.SUCCESS(message))
@@ -0,0 +1,98 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+from workouts.calendar_cache import build_months, month_start
+from workouts.models import Exercise, ScheduledWorkout, WorkoutLog, WorkoutTemplate
+from workouts.serializers import WorkoutLogCreateSerializer, WorkoutLogSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Run parallel workout-log writers and calendar/log readers against the '
+        'configured database and fail on any "database is locked" error'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=3)
+        parser.add_argument('--user', default='stress', help='User the logs are written for')
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        self.stdout.write(f'Profile {settings.DATABASE_PROFILE}, journal_mode={journal_mode}')
+
+        self.user, _ = User.objects.get_or_create(username=options['user'])
+        self.exercise = Exercise.objects.get_or_create(name='Back Squat', defaults={'category': 'squat'})[0]
+        template, _ = WorkoutTemplate.objects.get_or_create(user=self.user, name='Stress')
+        today = timezone.now().date()
+        for offset in range(0, 28, 2):
+            ScheduledWorkout.objects.get_or_create(
+                user=self.user, template=template, scheduled_date=today - timedelta(days=offset)
+            )
+        self.month = month_start(today)
+        connection.close()
+
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.counts = {'writes': 0, 'reads': 0}
+        self.errors = []
+
+        threads = [threading.Thread(target=self.run, args=(self.write, 'writes')) for _ in range(options['writers'])]
+        threads += [threading.Thread(target=self.run, args=(self.read, 'reads')) for _ in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{self.counts['writes']} workout logs written ({self.counts['writes'] / elapsed:.0f}/s), "
+            f"{self.counts['reads']} reads ({self.counts['reads'] / elapsed:.0f}/s), "
+            f'{len(self.errors)} lock errors'
+        )
+        if self.errors:
+            raise CommandError(f'First error: {self.errors[0]}')
+
+    def run(self, operation, counter):
+        try:
+            while not self.stop.is_set():
+                try:
+                    operation()
+                except OperationalError as exc:
+                    with self.lock:
+                        self.errors.append(str(exc))
+                    continue
+                with self.lock:
+                    self.counts[counter] += 1
+        finally:
+            connection.close()
+
+    def write(self):
+        serializer = WorkoutLogCreateSerializer(data={
+            'workout_name': 'Stress',
+            'date': timezone.now().isoformat(),
+            'exercise_logs': [{
+                'exercise': self.exercise.pk,
+                'order': 0,
+                'set_logs': [{'set_number': number, 'reps': 5, 'weight': '100'} for number in range(1, 6)],
+            }],
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=self.user)
+
+    def read(self):
+        build_months(self.user.pk, [self.month], compact=False)
+        logs = WorkoutLogSerializer.setup_eager_loading(WorkoutLog.objects.filter(user=self.user))[:20]
+        WorkoutLogSerializer(logs, many=True).data
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyExerciseSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_sets', models.PositiveIntegerField(default=0)),
+                ('total_reps', models.PositiveIntegerField(default=0)),
+                ('tonnage', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('best_set_weight', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('best_set_reps', models.PositiveIntegerField(default=0)),
+                ('best_e1rm', models.FloatField(default=0)),
+                ('avg_rpe', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='workouts.exercise')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('user', 'exercise', 'date')},
+            },
+        ),
+    ]
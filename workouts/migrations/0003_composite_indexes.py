@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0002_daily_exercise_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exerciselog',
+            index=models.Index(fields=['exercise', 'workout_log'], name='exerciselog_exercise_log_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledworkout',
+            index=models.Index(fields=['user', 'scheduled_date'], name='scheduled_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutlog',
+            index=models.Index(fields=['user', 'date'], name='workoutlog_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# (change log model key, model name, path from the row to its owner)
+SYNCED_MODELS = [
+    ('workout_templates', 'WorkoutTemplate', 'user_id'),
+    ('template_exercises', 'TemplateExercise', 'template__user_id'),
+    ('scheduled_workouts', 'ScheduledWorkout', 'user_id'),
+    ('workout_logs', 'WorkoutLog', 'user_id'),
+    ('exercise_logs', 'ExerciseLog', 'workout_log__user_id'),
+    ('set_logs', 'SetLog', 'exercise_log__workout_log__user_id'),
+]
+
+
+def backfill_change_log(apps, schema_editor):
+    """Record every existing row so a first sync from token 0 returns it"""
+    ChangeLog = apps.get_model('workouts', 'ChangeLog')
+    for key, model_name, owner in SYNCED_MODELS:
+        rows = apps.get_model('workouts', model_name).objects.order_by('pk').values_list('pk', owner)
+        ChangeLog.objects.bulk_create(
+            (ChangeLog(user_id=user_id, model=key, object_id=pk) for pk, user_id in rows.iterator()),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0004_resource_versions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('workout_templates', 'Workout template'), ('template_exercises', 'Template exercise'), ('scheduled_workouts', 'Scheduled workout'), ('workout_logs', 'Workout log'), ('exercise_logs', 'Exercise log'), ('set_logs', 'Set log')], max_length=30)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['user', 'id'], name='changelog_user_id_idx')],
+                'unique_together': {('model', 'object_id')},
+            },
+        ),
+        migrations.RunPython(backfill_change_log, migrations.RunPython.noop),
+    ]
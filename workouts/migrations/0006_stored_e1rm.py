@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0005_change_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='setlog',
+            name='e1rm',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='TrainingProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('e1rm_formula', models.CharField(choices=[('epley', 'Epley'), ('brzycki', 'Brzycki'), ('lombardi', 'Lombardi'), ('rpe', 'RPE (reps in reserve)')], default='epley', max_length=20)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='training_profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
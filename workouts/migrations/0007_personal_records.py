@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0006_stored_e1rm'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('rep_max', 'Rep max'), ('e1rm', 'Estimated 1RM'), ('tonnage', 'Session tonnage')], max_length=10)),
+                ('reps', models.PositiveSmallIntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('achieved_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='workouts.exercise')),
+                ('set_log', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='workouts.setlog')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('workout_log', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='workouts.workoutlog')),
+            ],
+            options={
+                'ordering': ['exercise_id', 'kind', 'reps'],
+                'unique_together': {('user', 'exercise', 'kind', 'reps')},
+            },
+        ),
+    ]
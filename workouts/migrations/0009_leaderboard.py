@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0008_job_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingprofile',
+            name='sex',
+            field=models.CharField(blank=True, choices=[('male', 'Male'), ('female', 'Female')], max_length=10),
+        ),
+        migrations.CreateModel(
+            name='LeaderboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('formula', models.CharField(max_length=10)),
+                ('node', models.PositiveIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('formula', 'node')},
+            },
+        ),
+        migrations.CreateModel(
+            name='BodyweightEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('weight', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sex', models.CharField(choices=[('male', 'Male'), ('female', 'Female')], max_length=10)),
+                ('bodyweight', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('squat', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('bench', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('deadlift', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('wilks', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('dots', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('ipf_gl', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entry', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wilks', 'id'], name='leaderboard_wilks_idx'), models.Index(fields=['dots', 'id'], name='leaderboard_dots_idx'), models.Index(fields=['ipf_gl', 'id'], name='leaderboard_ipf_gl_idx')],
+            },
+        ),
+    ]
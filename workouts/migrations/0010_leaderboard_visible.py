@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0009_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingprofile',
+            name='leaderboard_visible',
+            field=models.BooleanField(default=False),
+        ),
+    ]
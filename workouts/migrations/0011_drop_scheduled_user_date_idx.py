@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0010_leaderboard_visible'),
+    ]
+
+    operations = [
+        # The unique (user, scheduled_date, template) index serves the same lookups
+        migrations.RemoveIndex(
+            model_name='scheduledworkout',
+            name='scheduled_user_date_idx',
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def merge_global_duplicates(apps, schema_editor):
+    """Keep one global stamp per duplicated resource, past the highest version any copy reached"""
+    ResourceVersion = apps.get_model('workouts', 'ResourceVersion')
+    rows = ResourceVersion.objects.filter(user__isnull=True)
+    duplicated = rows.values('resource').annotate(copies=Count('pk'), top=Max('version')).filter(copies__gt=1)
+    for row in duplicated:
+        copies = rows.filter(resource=row['resource'])
+        keep = copies.order_by('pk').first()
+        copies.exclude(pk=keep.pk).delete()
+        # Past every copy, so no tag built from a duplicate matches the merged stamp
+        ResourceVersion.objects.filter(pk=keep.pk).update(version=row['top'] + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0011_drop_scheduled_user_date_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_global_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='resourceversion',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('resource',), name='resourceversion_one_global'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from .estimators import DEFAULT_FORMULA, FORMULA_CHOICES, estimate_one
+from .scoring import SEX_CHOICES
 
 
 class Exercise(models.Model):
@@ -12,6 +14,7 @@ class Exercise(models.Model):
     ])
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -63,6 +66,7 @@ class ScheduledWorkout(models.Model):
 
     class Meta:
         ordering = ['-scheduled_date']
+        # Also serves (user, scheduled_date) lookups and ranges as its leading columns
         unique_together = ['user', 'scheduled_date', 'template']
 
 
@@ -74,12 +78,16 @@ class WorkoutLog(models.Model):
     duration_minutes = models.PositiveIntegerField(null=True, blank=True)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.workout_name} - {self.date.date()}"
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['user', 'date'], name='workoutlog_user_date_idx'),
+        ]
 
 
 class ExerciseLog(models.Model):
@@ -90,6 +98,9 @@ class ExerciseLog(models.Model):
 
     class Meta:
         ordering = ['order']
+        indexes = [
+            models.Index(fields=['exercise', 'workout_log'], name='exerciselog_exercise_log_idx'),
+        ]
 
 
 class SetLog(models.Model):
@@ -99,11 +110,15 @@ class SetLog(models.Model):
     weight = models.DecimalField(max_digits=6, decimal_places=2)
     rpe = models.PositiveIntegerField(null=True, blank=True, help_text="Rate of Perceived Exertion (1-10)")
     notes = models.TextField(blank=True)
+    # Estimated 1RM under the owner's chosen formula, kept current on save
+    e1rm = models.FloatField(null=True, blank=True, db_index=True)
 
     @property
     def estimated_1rm(self):
-        """Calculate estimated 1RM using Epley formula"""
-        return float(self.weight) * (1 + float(self.reps) / 30)
+        """Stored estimated 1RM, or Epley for a set that has not been saved yet"""
+        if self.e1rm is not None:
+            return self.e1rm
+        return estimate_one(self.weight, self.reps, self.rpe)
 
     def __str__(self):
         return f"Set {self.set_number}: {self.reps}x{self.weight}"
@@ -111,3 +126,213 @@ class SetLog(models.Model):
     class Meta:
         ordering = ['set_number']
         unique_together = ['exercise_log', 'set_number']
+
+
+class TrainingProfile(models.Model):
+    """Per-user training preferences"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='training_profile')
+    e1rm_formula = models.CharField(max_length=20, choices=FORMULA_CHOICES, default=DEFAULT_FORMULA)
+    # Picks the Wilks/DOTS/IPF GL coefficients; users without it are left off the leaderboard
+    sex = models.CharField(max_length=10, choices=SEX_CHOICES, blank=True)
+    # The leaderboard shows username, sex and bodyweight, so users opt in
+    leaderboard_visible = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.e1rm_formula}"
+
+
+class DailyExerciseSummary(models.Model):
+    """Denormalized per-user, per-exercise, per-day training totals"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE)
+    date = models.DateField()
+    total_sets = models.PositiveIntegerField(default=0)
+    total_reps = models.PositiveIntegerField(default=0)
+    tonnage = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    best_set_weight = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    best_set_reps = models.PositiveIntegerField(default=0)
+    best_e1rm = models.FloatField(default=0)
+    avg_rpe = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.exercise.name} - {self.date}"
+
+    class Meta:
+        ordering = ['date']
+        unique_together = ['user', 'exercise', 'date']
+
+
+class PersonalRecord(models.Model):
+    """A user's best result of one kind on one exercise"""
+    KIND_CHOICES = [
+        ('rep_max', 'Rep max'),
+        ('e1rm', 'Estimated 1RM'),
+        ('tonnage', 'Session tonnage'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Rep count for rep maxes, 0 for the other kinds
+    reps = models.PositiveSmallIntegerField(default=0)
+    value = models.DecimalField(max_digits=12, decimal_places=2)
+    workout_log = models.ForeignKey(WorkoutLog, on_delete=models.SET_NULL, null=True, blank=True)
+    set_log = models.ForeignKey(SetLog, on_delete=models.SET_NULL, null=True, blank=True)
+    achieved_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        label = f"{self.reps}RM" if self.kind == 'rep_max' else self.kind
+        return f"{self.user.username} - {self.exercise.name} {label}: {self.value}"
+
+    class Meta:
+        ordering = ['exercise_id', 'kind', 'reps']
+        unique_together = ['user', 'exercise', 'kind', 'reps']
+
+
+class BodyweightEntry(models.Model):
+    """A user's bodyweight in kg on one day; the latest one scores their lifts"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+    weight = models.DecimalField(max_digits=5, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date}: {self.weight}kg"
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['user', 'date']
+
+
+class LeaderboardEntry(models.Model):
+    """A user's best squat, bench and deadlift e1RMs and the total's scores.
+
+    Users without all three lifts, a bodyweight or a sex have no entry.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='leaderboard_entry')
+    sex = models.CharField(max_length=10, choices=SEX_CHOICES)
+    bodyweight = models.DecimalField(max_digits=5, decimal_places=2)
+    squat = models.DecimalField(max_digits=7, decimal_places=2)
+    bench = models.DecimalField(max_digits=7, decimal_places=2)
+    deadlift = models.DecimalField(max_digits=7, decimal_places=2)
+    total = models.DecimalField(max_digits=7, decimal_places=2)
+    wilks = models.DecimalField(max_digits=6, decimal_places=2)
+    dots = models.DecimalField(max_digits=6, decimal_places=2)
+    ipf_gl = models.DecimalField(max_digits=6, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.total}kg (DOTS {self.dots})"
+
+    class Meta:
+        # Pages walk these backwards, highest score first
+        indexes = [
+            models.Index(fields=['wilks', 'id'], name='leaderboard_wilks_idx'),
+            models.Index(fields=['dots', 'id'], name='leaderboard_dots_idx'),
+            models.Index(fields=['ipf_gl', 'id'], name='leaderboard_ipf_gl_idx'),
+        ]
+
+
+class LeaderboardCounter(models.Model):
+    """One node of a formula's Fenwick tree, counting leaderboard entries per score slot"""
+    formula = models.CharField(max_length=10)
+    node = models.PositiveIntegerField()
+    # Signed, so decrements can go through the same upsert as increments
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.formula} node {self.node}: {self.count}"
+
+    class Meta:
+        unique_together = ['formula', 'node']
+
+
+class ResourceVersion(models.Model):
+    """Change counter for one kind of resource, per user (or global when user is null)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    resource = models.CharField(max_length=30)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        owner = self.user.username if self.user else 'global'
+        return f"{owner} - {self.resource} - v{self.version}"
+
+    class Meta:
+        unique_together = ['user', 'resource']
+        constraints = [
+            # unique_together treats every null user as distinct
+            models.UniqueConstraint(
+                fields=['resource'], condition=models.Q(user__isnull=True), name='resourceversion_one_global',
+            ),
+        ]
+
+
+class ChangeLog(models.Model):
+    """Latest change to one synced row; the id orders changes for delta sync"""
+    MODEL_CHOICES = [
+        ('workout_templates', 'Workout template'),
+        ('template_exercises', 'Template exercise'),
+        ('scheduled_workouts', 'Scheduled workout'),
+        ('workout_logs', 'Workout log'),
+        ('exercise_logs', 'Exercise log'),
+        ('set_logs', 'Set log'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    model = models.CharField(max_length=30, choices=MODEL_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        action = 'deleted' if self.deleted else 'changed'
+        return f"{self.user.username} - {self.model} {self.object_id} {action}"
+
+    class Meta:
+        ordering = ['id']
+        unique_together = ['model', 'object_id']
+        indexes = [
+            models.Index(fields=['user', 'id'], name='changelog_user_id_idx'),
+        ]
+
+
+class Job(models.Model):
+    """Derived data to recompute for one user, run by the run_jobs worker.
+
+    A user has at most one pending job of each kind; writes arriving before
+    it runs add their keys to it.
+    """
+    PENDING, RUNNING, FAILED = 'pending', 'running', 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=30)
+    # What to recompute, in the JSON form the kind's handler expects
+    keys = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField()
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.kind} ({self.status})"
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'kind'], condition=models.Q(status='pending'), name='job_one_pending_per_user',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
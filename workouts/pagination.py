@@ -0,0 +1,106 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination keyed on (ordering field, id).
+
+    Each page is a range query on an indexed key instead of OFFSET, and no
+    COUNT(*) is run, so page 500 costs the same as page 1. Rows sharing an
+    ordering value are split by id, so ties never repeat or go missing.
+    The response keeps the `results` envelope with `next`/`previous` links.
+    """
+    ordering = '-date'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page([instance async for instance in queryset[:self.page_size + 1]])
+
+    def page_queryset(self, queryset, request):
+        """The queryset narrowed to the requested page and one row past it"""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.field = self.ordering.lstrip('-')
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+
+        # Walking forward through a descending ordering means smaller keys next
+        towards_smaller = self.ordering.startswith('-') != reverse
+        if self.cursor:
+            value, pk = self._split_position(self.cursor.position, queryset.model)
+            lookup = 'lt' if towards_smaller else 'gt'
+            # The inclusive bound lets the database seek straight to the key range
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}e': value}),
+                Q(**{f'{self.field}__{lookup}': value}) | Q(**{f'pk__{lookup}': pk}),
+            )
+        if towards_smaller:
+            return queryset.order_by(f'-{self.field}', '-pk')
+        return queryset.order_by(self.field, 'pk')
+
+    def set_page(self, results):
+        reverse = self.cursor.reverse if self.cursor else False
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = Cursor(offset=0, reverse=False, position=self._position(self.page[-1]))
+        return self.encode_cursor(cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        cursor = Cursor(offset=0, reverse=True, position=self._position(self.page[0]))
+        return self.encode_cursor(cursor)
+
+    def _position(self, instance):
+        # Pages of .values() rows hold dicts
+        if isinstance(instance, dict):
+            value, pk = instance[self.field], instance['id']
+        else:
+            value, pk = getattr(instance, self.field), instance.pk
+        value = value.isoformat() if hasattr(value, 'isoformat') else value
+        return f'{value}|{pk}'
+
+    def _split_position(self, position, model):
+        try:
+            value, pk = position.rsplit('|', 1)
+            return model._meta.get_field(self.field).to_python(value), int(pk)
+        except (AttributeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class WorkoutLogPagination(KeysetPagination):
+    ordering = '-date'
+
+
+class ScheduledWorkoutPagination(KeysetPagination):
+    ordering = '-scheduled_date'
+
+
+class LeaderboardPagination(KeysetPagination):
+    """Highest score first; the view sets the ordering to the requested formula"""
+    ordering = '-dots'
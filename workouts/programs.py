@@ -0,0 +1,122 @@
+"""Expand training programs into scheduled workouts and move blocks of them.
+
+Both operations write with one bulk statement instead of a save per
+session. Bulk writes send no signals, so each one refreshes the version
+stamps, the calendar cache and the sync change log itself.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import DateField, F
+from django.db.models.functions import Cast
+from .calendar_cache import mark_months_stale, month_start
+from .models import ScheduledWorkout
+from .sync import record_bulk
+from .versions import mark_changed
+
+
+# Far enough ahead that no real schedule reaches it (see shift_block)
+PARKING_OFFSET = timedelta(days=365 * 1000)
+
+
+class ScheduleConflict(Exception):
+    """A shifted block would land on days already scheduled with the same template"""
+
+    def __init__(self, dates):
+        super().__init__(f'{len(dates)} conflicting days')
+        self.dates = dates
+
+
+def program_sessions(templates, weekdays, start_date, weeks):
+    """(date, template) per session, oldest first.
+
+    Week n covers the 7 days from start_date + n weeks; weekdays are 0-6
+    from Monday. Templates rotate through the sessions in order, so two
+    templates on three weekdays alternate A/B/A, then B/A/B.
+    """
+    offsets = sorted((weekday - start_date.weekday()) % 7 for weekday in weekdays)
+    days = [start_date + timedelta(weeks=week, days=offset) for week in range(weeks) for offset in offsets]
+    return [(day, templates[index % len(templates)]) for index, day in enumerate(days)]
+
+
+def _touch(user_id, days):
+    mark_changed({('scheduled', user_id)})
+    mark_months_stale({(user_id, month_start(day)) for day in days})
+
+
+def schedule_program(user, templates, weekdays, start_date, weeks, notes=''):
+    """Create a program's scheduled workouts with a single INSERT.
+
+    Days already scheduled with the same template are skipped by the
+    (user, scheduled_date, template) constraint rather than checked one by
+    one. Returns (ids of the created rows, number skipped).
+    """
+    sessions = program_sessions(templates, weekdays, start_date, weeks)
+    window = ScheduledWorkout.objects.filter(
+        user=user,
+        template__in=templates,
+        scheduled_date__range=(sessions[0][0], sessions[-1][0]),
+    )
+    with transaction.atomic():
+        existing = set(window.values_list('pk', flat=True))
+        # ignore_conflicts returns no primary keys, so the new rows are read back
+        ScheduledWorkout.objects.bulk_create([
+            ScheduledWorkout(user=user, template=template, scheduled_date=day, notes=notes)
+            for day, template in sessions
+        ], ignore_conflicts=True)
+        created_ids = [pk for pk in window.values_list('pk', flat=True) if pk not in existing]
+
+        if created_ids:
+            record_bulk(user.pk, ScheduledWorkout, created_ids, created=True)
+            _touch(user.pk, [day for day, _ in sessions])
+    return created_ids, len(sessions) - len(created_ids)
+
+
+def _shifted(offset):
+    return Cast(F('scheduled_date') + offset, DateField())
+
+
+def shift_block(user, start_date, end_date, days, templates=None):
+    """Move the incomplete workouts scheduled between two dates by a number of days.
+
+    Two set-based UPDATEs at most, whatever the size of the block. Raises
+    ScheduleConflict, without moving anything, if a moved workout would
+    land on a day that already has the same template outside the block.
+    Returns the number of workouts moved.
+    """
+    offset = timedelta(days=days)
+    block = ScheduledWorkout.objects.filter(
+        user=user, scheduled_date__range=(start_date, end_date), is_completed=False
+    )
+    if templates:
+        block = block.filter(template__in=templates)
+
+    with transaction.atomic():
+        rows = list(block.values_list('pk', 'template_id', 'scheduled_date'))
+        if not rows:
+            return 0
+        moved_ids = [pk for pk, _, _ in rows]
+        targets = {(template_id, day + offset) for _, template_id, day in rows}
+
+        taken = ScheduledWorkout.objects.filter(
+            user=user,
+            template_id__in={template_id for template_id, _ in targets},
+            scheduled_date__range=(start_date + offset, end_date + offset),
+        ).exclude(pk__in=moved_ids).values_list('template_id', 'scheduled_date')
+        conflicts = sorted({day for template_id, day in taken if (template_id, day) in targets})
+        if conflicts:
+            raise ScheduleConflict(conflicts)
+
+        moved = ScheduledWorkout.objects.filter(pk__in=moved_ids)
+        if abs(days) <= (end_date - start_date).days:
+            # The unique constraint is checked row by row, so a workout moving
+            # onto a day another one is leaving would fail mid-statement.
+            # Parking the block out of range first avoids any overlap.
+            moved.update(scheduled_date=_shifted(offset + PARKING_OFFSET))
+            moved.update(scheduled_date=_shifted(-PARKING_OFFSET))
+        else:
+            moved.update(scheduled_date=_shifted(offset))
+
+        record_bulk(user.pk, ScheduledWorkout, moved_ids)
+        _touch(user.pk, [day for _, _, day in rows] + [day for _, day in targets])
+    return len(rows)
@@ -0,0 +1,91 @@
+import re
+from datetime import date, timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from .models import (
+    WorkoutTemplate, TemplateExercise, ScheduledWorkout,
+    WorkoutLog, ExerciseLog, SetLog, DailyExerciseSummary, ChangeLog, PersonalRecord,
+    LeaderboardCounter, LeaderboardEntry
+)
+from .exports import export_queryset
+
+
+# SQLite reports a full table scan as "SCAN <table>" with no index after it
+FULL_SCAN = re.compile(r'\bSCAN (?!.*\bUSING\b.*\bINDEX\b)(\w+)')
+
+
+def endpoint_querysets(user_id):
+    """The main query each endpoint issues, keyed by a short description.
+
+    Parameter values only need to be the right type; the plan depends on
+    the shape of the query, not on the data.
+    """
+    now = timezone.now()
+    today = date.today()
+    ids = [1, 2, 3]
+    return {
+        'workout-logs list': WorkoutLog.objects.filter(user_id=user_id).order_by('-date', '-pk')[:21],
+        'workout-logs next page': WorkoutLog.objects.filter(
+            Q(user_id=user_id), Q(date__lte=now), Q(date__lt=now) | Q(pk__lt=1),
+        ).order_by('-date', '-pk')[:21],
+        'workout-logs exercise prefetch': ExerciseLog.objects.filter(
+            workout_log_id__in=ids
+        ).select_related('exercise').order_by('order'),
+        'workout-logs set prefetch': SetLog.objects.filter(exercise_log_id__in=ids).order_by('set_number'),
+        'scheduled-workouts list': ScheduledWorkout.objects.filter(
+            user_id=user_id
+        ).order_by('-scheduled_date', '-pk')[:21],
+        'calendar month': ScheduledWorkout.objects.filter(
+            user_id=user_id, scheduled_date__gte=today, scheduled_date__lte=today + timedelta(days=31)
+        ).select_related('user', 'template__user'),
+        'template list': WorkoutTemplate.objects.filter(user_id=user_id),
+        'template exercise prefetch': TemplateExercise.objects.filter(
+            template_id__in=ids
+        ).select_related('exercise').order_by('order'),
+        'exercise history': ExerciseLog.objects.filter(
+            exercise_id=1, workout_log__user_id=user_id
+        ).order_by('-workout_log__date'),
+        'e1rm progress': DailyExerciseSummary.objects.filter(
+            user_id=user_id, date__gte=today - timedelta(days=365), exercise_id__in=ids
+        ),
+        'summary refresh': SetLog.objects.filter(
+            exercise_log__workout_log__user_id=user_id, exercise_log__exercise_id=1,
+            exercise_log__workout_log__date__date=today,
+        ),
+        'export': export_queryset(user_id),
+        'record board': PersonalRecord.objects.filter(user_id=user_id).select_related('exercise'),
+        'record recompute': SetLog.objects.filter(
+            exercise_log__workout_log__user_id=user_id, exercise_log__exercise_id=1,
+        ).order_by('exercise_log__workout_log__date', 'pk'),
+        'leaderboard page': LeaderboardEntry.objects.filter(
+            Q(dots__lte=100), Q(dots__lt=100) | Q(pk__lt=1),
+        ).order_by('-dots', '-pk')[:21],
+        'leaderboard rank slot': LeaderboardEntry.objects.filter(dots__gt=100, dots__lt=101),
+        'leaderboard rank tree': LeaderboardCounter.objects.filter(formula='dots', node__in=ids),
+        'sync page': ChangeLog.objects.filter(user_id=user_id, id__gt=1).order_by('id')[:501],
+        'sync entry replace': ChangeLog.objects.filter(model='set_logs', object_id=1),
+    }
+
+
+def explain(queryset):
+    """EXPLAIN QUERY PLAN output for a queryset, one line per plan step"""
+    return queryset.explain().splitlines()
+
+
+def full_scans(plan):
+    """Tables the plan reads without an index"""
+    return [match.group(1) for line in plan for match in [FULL_SCAN.search(line)] if match]
+
+
+def check_query_plans(user_id):
+    """Map each endpoint query to (plan lines, tables read by full scan)"""
+    if connection.vendor != 'sqlite':
+        raise ImproperlyConfigured('Plan inspection currently understands SQLite output only')
+    results = {}
+    for name, queryset in endpoint_querysets(user_id).items():
+        plan = explain(queryset)
+        results[name] = (plan, full_scans(plan))
+    return results
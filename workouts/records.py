@@ -0,0 +1,187 @@
+from collections import defaultdict
+from decimal import Decimal
+from itertools import groupby
+
+from django.db import transaction
+from .deferred import OnCommitBatch
+from .estimators import estimate_one
+from .jobs import enqueue_by_user, register
+from .leaderboard import LIFT_CATEGORIES, mark_leaderboard_dirty, rebuild_leaderboard
+from .models import PersonalRecord, SetLog
+
+
+# Rep maxes and e1RM records are tracked for sets of exactly 1 to MAX_REP_MAX
+# reps; estimates from longer sets are unrealistic and unbounded
+MAX_REP_MAX = 12
+
+SET_FIELDS = (
+    'pk', 'exercise_log__workout_log_id', 'exercise_log__workout_log__date',
+    'reps', 'weight', 'rpe', 'e1rm',
+)
+UPDATE_FIELDS = ['value', 'workout_log', 'set_log', 'achieved_at', 'updated_at']
+
+
+def best_results(rows):
+    """Best result per (kind, reps) from one exercise's set rows in date order.
+
+    Rows are (set_log_id, workout_log_id, date, reps, weight, rpe, e1rm). Ties
+    keep the earlier result. Returns {(kind, reps): (value, workout_log_id,
+    set_log_id, achieved_at)}.
+    """
+    best = {}
+
+    def offer(key, value, workout_log_id, set_log_id, when):
+        if value > 0 and (key not in best or value > best[key][0]):
+            best[key] = (value, workout_log_id, set_log_id, when)
+
+    tonnage = defaultdict(Decimal)
+    dates = {}
+    for set_log_id, workout_log_id, when, reps, weight, rpe, e1rm in rows:
+        if 1 <= reps <= MAX_REP_MAX:
+            offer(('rep_max', reps), weight, workout_log_id, set_log_id, when)
+            if e1rm is None:
+                # Not backfilled yet
+                e1rm = estimate_one(weight, reps, rpe)
+            offer(('e1rm', 0), Decimal(str(e1rm)), workout_log_id, set_log_id, when)
+        tonnage[workout_log_id] += weight * reps
+        dates[workout_log_id] = when
+
+    for workout_log_id, total in tonnage.items():
+        offer(('tonnage', 0), total, workout_log_id, None, dates[workout_log_id])
+    return best
+
+
+def _records(user_id, exercise_id, best):
+    return [
+        PersonalRecord(
+            user_id=user_id, exercise_id=exercise_id, kind=kind, reps=reps, value=value,
+            workout_log_id=workout_log_id, set_log_id=set_log_id, achieved_at=when,
+        )
+        for (kind, reps), (value, workout_log_id, set_log_id, when) in best.items()
+    ]
+
+
+def record_new_sets(workout_log, exercise_logs, set_logs):
+    """Raise the records beaten by a newly created workout log's sets.
+
+    Compares against the stored records instead of rescanning history: one
+    SELECT and at most one upsert. Returns the new records.
+    """
+    exercises = {exercise_log.pk: exercise_log.exercise for exercise_log in exercise_logs}
+    rows = defaultdict(list)
+    for set_log in set_logs:
+        rows[exercises[set_log.exercise_log_id]].append((
+            set_log.pk, workout_log.pk, workout_log.date,
+            set_log.reps, set_log.weight, set_log.rpe, set_log.e1rm,
+        ))
+    if not rows:
+        return []
+
+    current = {
+        (record.exercise_id, record.kind, record.reps): record.value
+        for record in PersonalRecord.objects.filter(
+            user_id=workout_log.user_id, exercise__in=list(rows)
+        ).only('exercise_id', 'kind', 'reps', 'value')
+    }
+    improved = []
+    for exercise, exercise_rows in rows.items():
+        for record in _records(workout_log.user_id, exercise.pk, best_results(exercise_rows)):
+            previous = current.get((exercise.pk, record.kind, record.reps))
+            if previous is None or record.value > previous:
+                record.exercise = exercise
+                improved.append(record)
+
+    PersonalRecord.objects.bulk_create(
+        improved, update_conflicts=True,
+        unique_fields=['user', 'exercise', 'kind', 'reps'], update_fields=UPDATE_FIELDS,
+    )
+    if any(record.kind == 'e1rm' and record.exercise.category in LIFT_CATEGORIES for record in improved):
+        mark_leaderboard_dirty({workout_log.user_id})
+    return improved
+
+
+def recompute_records(user_id, exercise_id):
+    """Rebuild one user's records on one exercise from their sets"""
+    rows = SetLog.objects.filter(
+        exercise_log__workout_log__user_id=user_id, exercise_log__exercise_id=exercise_id,
+    ).order_by('exercise_log__workout_log__date', 'pk').values_list(*SET_FIELDS)
+    records = _records(user_id, exercise_id, best_results(rows))
+
+    with transaction.atomic():
+        PersonalRecord.objects.filter(user_id=user_id, exercise_id=exercise_id).delete()
+        PersonalRecord.objects.bulk_create(records)
+        mark_leaderboard_dirty({user_id})
+
+
+def refresh_records(pairs):
+    for user_id, exercise_id in pairs:
+        recompute_records(user_id, exercise_id)
+
+
+@register('records')
+def refresh_user_records(user_id, exercise_ids):
+    refresh_records((user_id, exercise_id) for exercise_id in exercise_ids)
+
+
+# Queue (user_id, exercise_id) pairs whose records need a recompute after commit.
+# Sets created through the nested create use record_new_sets instead, inline,
+# as the response lists the records they beat.
+pending_records = OnCommitBatch(lambda pairs: enqueue_by_user('records', pairs))
+mark_records_dirty = pending_records.add
+
+
+def board_records(user):
+    return PersonalRecord.objects.filter(user=user).select_related('exercise')
+
+
+def record_board(records):
+    """The PR board: rep maxes, best e1RM and best session tonnage per exercise"""
+    board = {}
+    for record in records:
+        entry = board.setdefault(record.exercise_id, {
+            'exercise': record.exercise_id,
+            'exercise_name': record.exercise.name,
+            'rep_maxes': {},
+            'e1rm': None,
+            'tonnage': None,
+        })
+        result = {
+            'value': record.value,
+            'achieved_at': record.achieved_at,
+            'workout_log': record.workout_log_id,
+            'set_log': record.set_log_id,
+        }
+        if record.kind == 'rep_max':
+            entry['rep_maxes'][str(record.reps)] = result
+        else:
+            entry[record.kind] = result
+    return {'exercises': list(board.values())}
+
+
+def rebuild_records(user_ids=None, batch_size=1000):
+    """Recreate records from scratch, streaming sets grouped by user and exercise"""
+    records = PersonalRecord.objects.all()
+    sets = SetLog.objects.all()
+    if user_ids:
+        records = records.filter(user_id__in=user_ids)
+        sets = sets.filter(exercise_log__workout_log__user_id__in=user_ids)
+
+    rows = sets.order_by(
+        'exercise_log__workout_log__user_id', 'exercise_log__exercise_id',
+        'exercise_log__workout_log__date', 'pk',
+    ).values_list(
+        'exercise_log__workout_log__user_id', 'exercise_log__exercise_id', *SET_FIELDS
+    ).iterator(chunk_size=batch_size)
+
+    created = 0
+    with transaction.atomic():
+        records.delete()
+        for (user_id, exercise_id), group in groupby(rows, key=lambda row: row[:2]):
+            batch = _records(user_id, exercise_id, best_results(row[2:] for row in group))
+            PersonalRecord.objects.bulk_create(batch)
+            created += len(batch)
+        if user_ids:
+            mark_leaderboard_dirty(set(user_ids))
+        else:
+            rebuild_leaderboard()
+    return created
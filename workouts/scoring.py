@@ -0,0 +1,75 @@
+"""Bodyweight-normalized scores for a squat + bench + deadlift total.
+
+All three formulas divide the total by a curve of bodyweight (kg) that
+differs between men and women:
+
+- Wilks (1994 coefficients): 500 / fifth-degree polynomial
+- DOTS: 500 / fourth-degree polynomial
+- IPF GL (2020, classic powerlifting): 100 / (A - B * e^(-C * bodyweight))
+
+Bodyweights outside the range each polynomial was fitted on are clamped
+to it.
+"""
+import math
+
+
+SEX_CHOICES = [
+    ('male', 'Male'),
+    ('female', 'Female'),
+]
+
+SCORE_FORMULAS = ('wilks', 'dots', 'ipf_gl')
+
+# Bodyweights (kg) accepted for scoring; IPF GL's curve turns negative far below
+BODYWEIGHT_RANGE = (30, 300)
+
+# Coefficients from the constant term up
+WILKS = {
+    'male': (-216.0475144, 16.2606339, -0.002388645, -0.00113732, 7.01863e-06, -1.291e-08),
+    'female': (594.31747775582, -27.23842536447, 0.82112226871, -0.00930733913, 4.731582e-05, -9.054e-08),
+}
+WILKS_BODYWEIGHT = {'male': (40.0, 201.9), 'female': (26.51, 154.53)}
+
+DOTS = {
+    'male': (-307.75076, 24.0900756, -0.1918759221, 0.0007391293, -0.000001093),
+    'female': (-57.96288, 13.6175032, -0.1126655495, 0.0005158568, -0.0000010706),
+}
+DOTS_BODYWEIGHT = {'male': (40.0, 210.0), 'female': (40.0, 150.0)}
+
+# A, B, C of the classic (raw) powerlifting total
+IPF_GL = {
+    'male': (1199.72839, 1025.18162, 0.00921),
+    'female': (610.32796, 1045.59282, 0.03048),
+}
+
+
+def _polynomial(coefficients, x):
+    return sum(coefficient * x ** power for power, coefficient in enumerate(coefficients))
+
+
+def _clamp(bodyweight, bounds):
+    low, high = bounds
+    return min(max(bodyweight, low), high)
+
+
+def wilks(total, bodyweight, sex):
+    bodyweight = _clamp(float(bodyweight), WILKS_BODYWEIGHT[sex])
+    return float(total) * 500 / _polynomial(WILKS[sex], bodyweight)
+
+
+def dots(total, bodyweight, sex):
+    bodyweight = _clamp(float(bodyweight), DOTS_BODYWEIGHT[sex])
+    return float(total) * 500 / _polynomial(DOTS[sex], bodyweight)
+
+
+def ipf_gl(total, bodyweight, sex):
+    a, b, c = IPF_GL[sex]
+    return float(total) * 100 / (a - b * math.exp(-c * float(bodyweight)))
+
+
+FORMULAS = {'wilks': wilks, 'dots': dots, 'ipf_gl': ipf_gl}
+
+
+def scores(total, bodyweight, sex):
+    """{formula: score rounded to 2 places} of a total (kg) at a bodyweight (kg)"""
+    return {name: round(FORMULAS[name](total, bodyweight, sex), 2) for name in SCORE_FORMULAS}
@@ -1,13 +1,22 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from django.db import transaction
+from django.db.models import Prefetch
 from .models import (
     Exercise, WorkoutTemplate, TemplateExercise, 
-    ScheduledWorkout, WorkoutLog, ExerciseLog, SetLog
+    ScheduledWorkout, WorkoutLog, ExerciseLog, SetLog, TrainingProfile, PersonalRecord,
+    BodyweightEntry, LeaderboardEntry
 )
+from .e1rm import fill_e1rm, formula_for
+from .instrumentation import ModelSerializer, Serializer
+from .records import record_new_sets
+from .scoring import BODYWEIGHT_RANGE
+from .summaries import bucket_day, mark_dirty
+from .sync import record_created
 
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
+class UserRegistrationSerializer(ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     password_confirm = serializers.CharField(write_only=True)
 
@@ -26,14 +35,52 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'date_joined')
         read_only_fields = ('id', 'date_joined')
 
 
-class LoginSerializer(serializers.Serializer):
+class TrainingProfileSerializer(ModelSerializer):
+    class Meta:
+        model = TrainingProfile
+        fields = ('e1rm_formula', 'sex', 'leaderboard_visible')
+
+
+class BodyweightEntrySerializer(ModelSerializer):
+    class Meta:
+        model = BodyweightEntry
+        fields = ('id', 'date', 'weight', 'created_at')
+        read_only_fields = ('id', 'created_at')
+
+    def validate_weight(self, value):
+        low, high = BODYWEIGHT_RANGE
+        if not low <= value <= high:
+            raise serializers.ValidationError(f'Bodyweight must be between {low} and {high} kg')
+        return value
+
+    def validate_date(self, value):
+        entries = BodyweightEntry.objects.filter(user=self.context['request'].user, date=value)
+        if self.instance is not None:
+            entries = entries.exclude(pk=self.instance.pk)
+        if entries.exists():
+            raise serializers.ValidationError('A bodyweight is already logged for this date')
+        return value
+
+
+class LeaderboardEntrySerializer(ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = (
+            'user', 'username', 'sex', 'bodyweight', 'squat', 'bench', 'deadlift', 'total',
+            'wilks', 'dots', 'ipf_gl', 'updated_at',
+        )
+
+
+class LoginSerializer(Serializer):
     username = serializers.CharField()
     password = serializers.CharField()
 
@@ -53,13 +100,13 @@ class LoginSerializer(serializers.Serializer):
             raise serializers.ValidationError('Must include username and password')
 
 
-class ExerciseSerializer(serializers.ModelSerializer):
+class ExerciseSerializer(ModelSerializer):
     class Meta:
         model = Exercise
         fields = '__all__'
 
 
-class SetLogSerializer(serializers.ModelSerializer):
+class SetLogSerializer(ModelSerializer):
     estimated_1rm = serializers.ReadOnlyField()
 
     class Meta:
@@ -67,7 +114,7 @@ class SetLogSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ExerciseLogSerializer(serializers.ModelSerializer):
+class ExerciseLogSerializer(ModelSerializer):
     set_logs = SetLogSerializer(many=True, read_only=True)
     exercise_name = serializers.CharField(source='exercise.name', read_only=True)
 
@@ -76,7 +123,7 @@ class ExerciseLogSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class WorkoutLogSerializer(serializers.ModelSerializer):
+class WorkoutLogSerializer(ModelSerializer):
     exercise_logs = ExerciseLogSerializer(many=True, read_only=True)
     user_name = serializers.CharField(source='user.username', read_only=True)
 
@@ -85,8 +132,19 @@ class WorkoutLogSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('user',)
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Fetch the whole log -> exercise -> set tree in a fixed number of queries"""
+        return queryset.select_related('user').prefetch_related(
+            Prefetch(
+                'exercise_logs',
+                queryset=ExerciseLog.objects.select_related('exercise').order_by('order'),
+            ),
+            Prefetch('exercise_logs__set_logs', queryset=SetLog.objects.order_by('set_number')),
+        )
+
 
-class TemplateExerciseSerializer(serializers.ModelSerializer):
+class TemplateExerciseSerializer(ModelSerializer):
     exercise_name = serializers.CharField(source='exercise.name', read_only=True)
     exercise_category = serializers.CharField(source='exercise.category', read_only=True)
 
@@ -95,7 +153,7 @@ class TemplateExerciseSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class WorkoutTemplateSerializer(serializers.ModelSerializer):
+class WorkoutTemplateSerializer(ModelSerializer):
     template_exercises = serializers.SerializerMethodField()
     user_name = serializers.CharField(source='user.username', read_only=True)
 
@@ -105,11 +163,26 @@ class WorkoutTemplateSerializer(serializers.ModelSerializer):
         read_only_fields = ('user',)
 
     def get_template_exercises(self, obj):
-        template_exercises = TemplateExercise.objects.filter(template=obj).order_by('order')
+        # Uses the ordered prefetch from setup_eager_loading when present
+        template_exercises = obj.templateexercise_set.all()
         return TemplateExerciseSerializer(template_exercises, many=True).data
 
+    @staticmethod
+    def template_exercises_prefetch(lookup='templateexercise_set'):
+        return Prefetch(
+            lookup,
+            queryset=TemplateExercise.objects.select_related('exercise').order_by('order'),
+        )
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Fetch templates with their exercises in a fixed number of queries"""
+        return queryset.select_related('user').prefetch_related(
+            'exercises', WorkoutTemplateSerializer.template_exercises_prefetch()
+        )
 
-class ScheduledWorkoutSerializer(serializers.ModelSerializer):
+
+class ScheduledWorkoutSerializer(ModelSerializer):
     template_name = serializers.CharField(source='template.name', read_only=True)
     user_name = serializers.CharField(source='user.username', read_only=True)
     template_details = WorkoutTemplateSerializer(source='template', read_only=True)
@@ -119,24 +192,167 @@ class ScheduledWorkoutSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('user',)
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Fetch scheduled workouts with their templates in a fixed number of queries"""
+        return queryset.select_related('user', 'template__user').prefetch_related(
+            'template__exercises',
+            WorkoutTemplateSerializer.template_exercises_prefetch('template__templateexercise_set'),
+        )
+
+
+class CompactScheduledWorkoutSerializer(ScheduledWorkoutSerializer):
+    """Scheduled workout referring to its template by id only"""
+    template_details = None
+
+
+def compact_scheduled_workouts(scheduled_workouts):
+    """Serialize scheduled workouts with each referenced template sent once"""
+    templates = {}
+    for scheduled_workout in scheduled_workouts:
+        templates.setdefault(scheduled_workout.template_id, scheduled_workout.template)
+    return {
+        'workouts': CompactScheduledWorkoutSerializer(scheduled_workouts, many=True).data,
+        'templates': {
+            str(pk): WorkoutTemplateSerializer(template).data
+            for pk, template in templates.items()
+        },
+    }
+
+
+# Longest program or block a single request may schedule or move
+MAX_PROGRAM_WEEKS = 52
+
+
+class UserTemplatesField(serializers.PrimaryKeyRelatedField):
+    """Template id limited to the requesting user's templates"""
+
+    def get_queryset(self):
+        return WorkoutTemplate.objects.filter(user=self.context['request'].user)
+
+
+class ProgramSerializer(Serializer):
+    templates = UserTemplatesField(many=True, allow_empty=False)
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6), allow_empty=False, max_length=7,
+        help_text='Training days, 0 (Monday) to 6 (Sunday)'
+    )
+    start_date = serializers.DateField()
+    weeks = serializers.IntegerField(min_value=1, max_value=MAX_PROGRAM_WEEKS)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate_weekdays(self, value):
+        if len(value) != len(set(value)):
+            raise serializers.ValidationError('Weekdays must be unique')
+        return value
 
-class WorkoutLogCreateSerializer(serializers.ModelSerializer):
-    exercise_logs = ExerciseLogSerializer(many=True, required=False)
+
+class ShiftBlockSerializer(Serializer):
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    days = serializers.IntegerField(required=False, help_text='Days to move by, negative for earlier')
+    to_date = serializers.DateField(required=False, help_text='New date of the block\'s first day')
+    templates = UserTemplatesField(many=True, required=False)
+
+    def validate(self, attrs):
+        if attrs['start_date'] > attrs['end_date']:
+            raise serializers.ValidationError('start_date must not be after end_date')
+        if (attrs['end_date'] - attrs['start_date']).days >= MAX_PROGRAM_WEEKS * 7:
+            raise serializers.ValidationError(f'Blocks are limited to {MAX_PROGRAM_WEEKS} weeks')
+        if ('days' in attrs) == ('to_date' in attrs):
+            raise serializers.ValidationError('Pass either days or to_date')
+        if 'to_date' in attrs:
+            attrs['days'] = (attrs.pop('to_date') - attrs['start_date']).days
+        if not attrs['days']:
+            raise serializers.ValidationError('The block must move by at least one day')
+        return attrs
+
+
+class SetLogCreateSerializer(ModelSerializer):
+    estimated_1rm = serializers.ReadOnlyField()
+
+    class Meta:
+        model = SetLog
+        exclude = ('exercise_log',)
+
+
+class ExerciseLogCreateSerializer(ModelSerializer):
+    set_logs = SetLogCreateSerializer(many=True, required=False)
+    exercise_name = serializers.CharField(source='exercise.name', read_only=True)
+
+    class Meta:
+        model = ExerciseLog
+        exclude = ('workout_log',)
+
+    def validate_set_logs(self, value):
+        set_numbers = [set_log['set_number'] for set_log in value]
+        if len(set_numbers) != len(set(set_numbers)):
+            raise serializers.ValidationError('Set numbers must be unique within an exercise')
+        return value
+
+
+class PersonalRecordSerializer(ModelSerializer):
+    exercise_name = serializers.CharField(source='exercise.name', read_only=True)
+
+    class Meta:
+        model = PersonalRecord
+        fields = ('exercise', 'exercise_name', 'kind', 'reps', 'value', 'achieved_at', 'workout_log', 'set_log')
+
+
+class WorkoutLogCreateSerializer(ModelSerializer):
+    exercise_logs = ExerciseLogCreateSerializer(many=True, required=False)
+    new_records = serializers.SerializerMethodField()
 
     class Meta:
         model = WorkoutLog
         fields = '__all__'
         read_only_fields = ('user',)
 
+    def get_new_records(self, obj):
+        # Set by create(); records the log's sets beat
+        return PersonalRecordSerializer(getattr(obj, 'new_records', []), many=True).data
+
     def create(self, validated_data):
         exercise_logs_data = validated_data.pop('exercise_logs', [])
-        workout_log = WorkoutLog.objects.create(**validated_data)
-        
-        for exercise_log_data in exercise_logs_data:
-            set_logs_data = exercise_log_data.pop('set_logs', [])
-            exercise_log = ExerciseLog.objects.create(workout_log=workout_log, **exercise_log_data)
-            
-            for set_log_data in set_logs_data:
-                SetLog.objects.create(exercise_log=exercise_log, **set_log_data)
-        
-        return workout_log
\ No newline at end of file
+
+        # Three INSERT statements in one transaction, whatever the number of sets
+        with transaction.atomic():
+            workout_log = WorkoutLog.objects.create(**validated_data)
+            set_logs_data = [data.pop('set_logs', []) for data in exercise_logs_data]
+            exercise_logs = ExerciseLog.objects.bulk_create([
+                ExerciseLog(workout_log=workout_log, **data) for data in exercise_logs_data
+            ])
+            set_logs = [
+                SetLog(exercise_log=exercise_log, **set_log_data)
+                for exercise_log, sets in zip(exercise_logs, set_logs_data)
+                for set_log_data in sets
+            ]
+            fill_e1rm(set_logs, formula_for(workout_log.user_id))
+            SetLog.objects.bulk_create(set_logs)
+
+            # bulk_create skips the model signals, so queue the summaries and
+            # log the new rows for sync here
+            day = bucket_day(workout_log.date)
+            mark_dirty({
+                (workout_log.user_id, exercise_log.exercise_id, day) for exercise_log in exercise_logs
+            })
+            record_created(workout_log.user_id, [*exercise_logs, *set_logs])
+            workout_log.new_records = record_new_sets(workout_log, exercise_logs, set_logs)
+
+        return workout_log
+
+
+def sync_serializer(model_class):
+    """Flat serializer for one synced table: every column, foreign keys as ids.
+
+    Many-to-many fields are left out; they sync as rows of their through model.
+    """
+    fields = [field.name for field in model_class._meta.concrete_fields]
+    meta = type('Meta', (), {'model': model_class, 'fields': fields})
+    return type(f'{model_class.__name__}SyncSerializer', (ModelSerializer,), {'Meta': meta})
+
+
+SYNC_SERIALIZERS = {
+    model: sync_serializer(model)
+    for model in (WorkoutTemplate, TemplateExercise, ScheduledWorkout, WorkoutLog, ExerciseLog, SetLog)
+}
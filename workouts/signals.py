@@ -0,0 +1,245 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .authentication import token_cache
+from .calendar_cache import forget_all, mark_months_stale, month_start
+from .e1rm import formula_for_exercise_log
+from .estimators import estimate_one
+from .leaderboard import leave_trees, mark_leaderboard_dirty
+from .models import (
+    Exercise, WorkoutTemplate, TemplateExercise, ScheduledWorkout,
+    WorkoutLog, ExerciseLog, SetLog, BodyweightEntry, TrainingProfile, LeaderboardEntry
+)
+from .records import mark_records_dirty
+from .summaries import bucket_day, mark_dirty
+from .sync import record_change
+from .versions import mark_changed
+
+
+def _exercise_log_buckets(**filters):
+    """Summary buckets covered by the exercise logs matching filters"""
+    rows = ExerciseLog.objects.filter(**filters).values_list(
+        'workout_log__user_id', 'exercise_id', 'workout_log__date'
+    )
+    return {(user_id, exercise_id, bucket_day(when)) for user_id, exercise_id, when in rows}
+
+
+@receiver(pre_save, sender=SetLog)
+def store_set_log_e1rm(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.e1rm = estimate_one(
+            instance.weight, instance.reps, instance.rpe,
+            formula_for_exercise_log(instance.exercise_log_id),
+        )
+
+
+def _refresh_buckets(buckets):
+    """Queue the daily summaries and personal records covering the buckets"""
+    mark_dirty(buckets)
+    mark_records_dirty({(user_id, exercise_id) for user_id, exercise_id, _ in buckets})
+
+
+# Updates remember the bucket a row belonged to before the save, so moving a
+# set, exercise log or whole workout to another day refreshes both days.
+
+@receiver(pre_save, sender=SetLog)
+def remember_set_log_bucket(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        instance._previous_buckets = _exercise_log_buckets(set_logs__pk=instance.pk)
+
+
+@receiver(post_save, sender=SetLog)
+@receiver(post_delete, sender=SetLog)
+def refresh_set_log_bucket(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _deleting_user(origin):
+        return
+    buckets = _exercise_log_buckets(pk=instance.exercise_log_id)
+    _refresh_buckets(buckets | getattr(instance, '_previous_buckets', set()))
+
+
+@receiver(pre_save, sender=ExerciseLog)
+def remember_exercise_log_bucket(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        instance._previous_buckets = _exercise_log_buckets(pk=instance.pk)
+
+
+@receiver(post_save, sender=ExerciseLog)
+def refresh_exercise_log_bucket(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    _refresh_buckets(_exercise_log_buckets(pk=instance.pk) | instance._previous_buckets)
+
+
+@receiver(pre_save, sender=WorkoutLog)
+def remember_workout_log_buckets(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        instance._previous_buckets = _exercise_log_buckets(workout_log_id=instance.pk)
+
+
+@receiver(post_save, sender=WorkoutLog)
+def refresh_workout_log_buckets(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    _refresh_buckets(_exercise_log_buckets(workout_log_id=instance.pk) | instance._previous_buckets)
+
+
+# Version stamps behind the conditional GET validators, and the change log
+# behind delta sync. Writes that go through bulk_create (nested log creation,
+# imports) save their WorkoutLog with a regular save, which bumps the owner's
+# 'logs' stamp, and log the bulk created rows themselves.
+
+def _deleting_user(origin):
+    """Whether a delete cascades from removing users, whose rows all go with them"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, User)
+
+
+def _changed(resource, owners, instance, signal, created=False, origin=None, **kwargs):
+    """Bump the owners' stamp for a resource and log the row for sync"""
+    if signal is post_delete and _deleting_user(origin):
+        return
+    owners = set(owners)
+    mark_changed({(resource, user_id) for user_id in owners})
+    for user_id in owners:
+        record_change(user_id, instance, created=created, deleted=signal is post_delete)
+
+
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+def exercise_changed(sender, instance, **kwargs):
+    mark_changed({('exercises', None)})
+
+
+@receiver(post_save, sender=WorkoutTemplate)
+@receiver(post_delete, sender=WorkoutTemplate)
+def template_changed(sender, instance, **kwargs):
+    _changed('templates', [instance.user_id], instance, **kwargs)
+
+
+# Owner lookups are lazy querysets, skipped when a user delete cascades
+
+@receiver(post_save, sender=TemplateExercise)
+@receiver(post_delete, sender=TemplateExercise)
+def template_exercise_changed(sender, instance, **kwargs):
+    owners = WorkoutTemplate.objects.filter(pk=instance.template_id).values_list('user_id', flat=True)
+    _changed('templates', owners, instance, **kwargs)
+
+
+@receiver(post_save, sender=ScheduledWorkout)
+@receiver(post_delete, sender=ScheduledWorkout)
+def scheduled_workout_changed(sender, instance, **kwargs):
+    _changed('scheduled', [instance.user_id], instance, **kwargs)
+
+
+@receiver(post_save, sender=WorkoutLog)
+@receiver(post_delete, sender=WorkoutLog)
+def workout_log_changed(sender, instance, **kwargs):
+    _changed('logs', [instance.user_id], instance, **kwargs)
+
+
+@receiver(post_save, sender=ExerciseLog)
+@receiver(post_delete, sender=ExerciseLog)
+def exercise_log_changed(sender, instance, **kwargs):
+    owners = WorkoutLog.objects.filter(pk=instance.workout_log_id).values_list('user_id', flat=True)
+    _changed('logs', owners, instance, **kwargs)
+
+
+@receiver(post_save, sender=SetLog)
+@receiver(post_delete, sender=SetLog)
+def set_log_changed(sender, instance, **kwargs):
+    owners = WorkoutLog.objects.filter(
+        exercise_logs__pk=instance.exercise_log_id
+    ).values_list('user_id', flat=True)
+    _changed('logs', owners, instance, **kwargs)
+
+
+# Cached calendar months. Template and template exercise changes show up in
+# every scheduled day using the template, so those months go too.
+
+def _template_months(template_id):
+    rows = ScheduledWorkout.objects.filter(template_id=template_id).values_list(
+        'user_id', 'scheduled_date'
+    )
+    return {(user_id, month_start(day)) for user_id, day in rows}
+
+
+@receiver(pre_save, sender=ScheduledWorkout)
+def remember_scheduled_month(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        instance._previous_months = {
+            (user_id, month_start(day))
+            for user_id, day in ScheduledWorkout.objects.filter(pk=instance.pk).values_list(
+                'user_id', 'scheduled_date'
+            )
+        }
+
+
+@receiver(post_save, sender=ScheduledWorkout)
+@receiver(post_delete, sender=ScheduledWorkout)
+def forget_scheduled_month(sender, instance, origin=None, **kwargs):
+    if _deleting_user(origin):
+        return
+    previous = getattr(instance, '_previous_months', set())
+    mark_months_stale({(instance.user_id, month_start(instance.scheduled_date))} | previous)
+
+
+@receiver(post_save, sender=WorkoutTemplate)
+@receiver(post_delete, sender=WorkoutTemplate)
+def forget_template_months(sender, instance, origin=None, **kwargs):
+    if not _deleting_user(origin):
+        mark_months_stale(_template_months(instance.pk))
+
+
+@receiver(post_save, sender=TemplateExercise)
+@receiver(post_delete, sender=TemplateExercise)
+def forget_template_exercise_months(sender, instance, origin=None, **kwargs):
+    if not _deleting_user(origin):
+        mark_months_stale(_template_months(instance.template_id))
+
+
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+def forget_all_months(sender, instance, **kwargs):
+    # Exercise names appear in every template; renames are rare enough to drop everything
+    transaction.on_commit(forget_all)
+
+
+# Leaderboard entries score the latest bodyweight with the user's sex. Record
+# changes queue their own refresh (see records.py).
+
+@receiver(post_save, sender=BodyweightEntry)
+@receiver(post_delete, sender=BodyweightEntry)
+@receiver(post_save, sender=TrainingProfile)
+def refresh_leaderboard_entry(sender, instance, raw=False, origin=None, **kwargs):
+    if not raw and not _deleting_user(origin):
+        mark_leaderboard_dirty({instance.user_id})
+
+
+@receiver(post_delete, sender=LeaderboardEntry)
+def leave_rank_trees(sender, instance, **kwargs):
+    # Also when deleting the user cascades to the entry, or ranks would count it forever
+    leave_trees(instance)
+
+
+# Cached token authentication. Entries are dropped after commit, so a request
+# racing the write cannot cache the old row again.
+
+def _forget_tokens(keys):
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: token_cache.invalidate(*keys))
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    _forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    # Any change to the user, deactivation included, reloads it on the next request
+    if not created:
+        _forget_tokens(Token.objects.filter(user=instance).values_list('key', flat=True))
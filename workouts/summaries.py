@@ -0,0 +1,140 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from .deferred import OnCommitBatch
+from .estimators import estimate_one
+from .jobs import enqueue_by_user, register
+from .models import DailyExerciseSummary, SetLog
+
+
+SET_FIELDS = (
+    'exercise_log__workout_log__user_id', 'exercise_log__exercise_id',
+    'exercise_log__workout_log__date', 'reps', 'weight', 'rpe', 'e1rm',
+)
+
+
+def bucket_day(when):
+    """Calendar day a workout log timestamp is summarized under"""
+    return timezone.localtime(when).date() if timezone.is_aware(when) else when.date()
+
+
+def summarize(rows):
+    """Fold (reps, weight, rpe, e1rm) rows of one bucket into summary field values"""
+    total_sets = total_reps = 0
+    tonnage = Decimal('0')
+    best_weight, best_reps, best_e1rm = Decimal('0'), 0, 0.0
+    rpe_total = rpe_count = 0
+
+    for reps, weight, rpe, e1rm in rows:
+        total_sets += 1
+        total_reps += reps
+        tonnage += weight * reps
+        if (weight, reps) > (best_weight, best_reps):
+            best_weight, best_reps = weight, reps
+        if e1rm is None:
+            # Not backfilled yet
+            e1rm = estimate_one(weight, reps, rpe)
+        best_e1rm = max(best_e1rm, e1rm)
+        if rpe is not None:
+            rpe_total += rpe
+            rpe_count += 1
+
+    return {
+        'total_sets': total_sets,
+        'total_reps': total_reps,
+        'tonnage': tonnage,
+        'best_set_weight': best_weight,
+        'best_set_reps': best_reps,
+        'best_e1rm': round(best_e1rm, 2),
+        'avg_rpe': round(rpe_total / rpe_count, 2) if rpe_count else None,
+    }
+
+
+def refresh_summary(user_id, exercise_id, day):
+    """Recompute a single (user, exercise, day) summary row from its sets"""
+    rows = SetLog.objects.filter(
+        exercise_log__workout_log__user_id=user_id,
+        exercise_log__exercise_id=exercise_id,
+        exercise_log__workout_log__date__date=day,
+    ).values_list('reps', 'weight', 'rpe', 'e1rm')
+    values = summarize(rows)
+
+    if not values['total_sets']:
+        DailyExerciseSummary.objects.filter(user_id=user_id, exercise_id=exercise_id, date=day).delete()
+        return None
+    summary, _ = DailyExerciseSummary.objects.update_or_create(
+        user_id=user_id, exercise_id=exercise_id, date=day, defaults=values
+    )
+    return summary
+
+
+def refresh_summaries(buckets):
+    for user_id, exercise_id, day in buckets:
+        refresh_summary(user_id, exercise_id, day)
+
+
+@register('summaries')
+def refresh_user_summaries(user_id, keys):
+    """Job handler; keys are [exercise_id, ISO day]"""
+    refresh_summaries((user_id, exercise_id, date.fromisoformat(day)) for exercise_id, day in keys)
+
+
+def queue_summaries(buckets):
+    enqueue_by_user('summaries', (
+        (user_id, [exercise_id, day.isoformat()]) for user_id, exercise_id, day in buckets
+    ))
+
+
+# Queue (user_id, exercise_id, day) buckets for a refresh once the transaction commits
+pending_summaries = OnCommitBatch(queue_summaries)
+mark_dirty = pending_summaries.add
+
+
+def rebuild_summaries(user_ids=None, batch_size=1000):
+    """Recreate summary rows from scratch, streaming sets in bucket order"""
+    summaries = DailyExerciseSummary.objects.all()
+    sets = SetLog.objects.all()
+    if user_ids:
+        summaries = summaries.filter(user_id__in=user_ids)
+        sets = sets.filter(exercise_log__workout_log__user_id__in=user_ids)
+
+    rows = sets.order_by(
+        'exercise_log__workout_log__user_id', 'exercise_log__exercise_id',
+        'exercise_log__workout_log__date',
+    ).values_list(*SET_FIELDS).iterator(chunk_size=batch_size)
+
+    created = 0
+    batch = []
+    current_key, current_rows = None, []
+
+    def emit():
+        nonlocal created
+        user_id, exercise_id, day = current_key
+        batch.append(DailyExerciseSummary(
+            user_id=user_id, exercise_id=exercise_id, date=day, **summarize(current_rows)
+        ))
+        if len(batch) >= batch_size:
+            DailyExerciseSummary.objects.bulk_create(batch)
+            created += len(batch)
+            batch.clear()
+
+    with transaction.atomic():
+        summaries.delete()
+        last_when = last_day = None
+        for user_id, exercise_id, when, reps, weight, rpe, e1rm in rows:
+            if when != last_when:
+                last_when, last_day = when, bucket_day(when)
+            key = (user_id, exercise_id, last_day)
+            if key != current_key:
+                if current_key is not None:
+                    emit()
+                current_key, current_rows = key, []
+            current_rows.append((reps, weight, rpe, e1rm))
+        if current_key is not None:
+            emit()
+        DailyExerciseSummary.objects.bulk_create(batch)
+        created += len(batch)
+
+    return created
@@ -0,0 +1,102 @@
+from django.db import transaction
+from .models import (
+    ChangeLog, WorkoutTemplate, TemplateExercise, ScheduledWorkout,
+    WorkoutLog, ExerciseLog, SetLog
+)
+
+
+# Change log key for each synced model, in the order a client should apply
+# upserts (parents before children)
+SYNCED_MODELS = {
+    'workout_templates': WorkoutTemplate,
+    'template_exercises': TemplateExercise,
+    'scheduled_workouts': ScheduledWorkout,
+    'workout_logs': WorkoutLog,
+    'exercise_logs': ExerciseLog,
+    'set_logs': SetLog,
+}
+MODEL_KEYS = {model: key for key, model in SYNCED_MODELS.items()}
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+
+def record_change(user_id, instance, created=False, deleted=False):
+    """Make the instance's row the newest entry in its owner's change log.
+
+    Runs inside the writing transaction, so a rollback drops the entry with
+    the data. Each row keeps a single entry: replacing it moves the row past
+    every token already handed out.
+    """
+    key = MODEL_KEYS[type(instance)]
+    if created:
+        ChangeLog.objects.create(user_id=user_id, model=key, object_id=instance.pk)
+        return
+    with transaction.atomic():
+        ChangeLog.objects.filter(model=key, object_id=instance.pk).delete()
+        ChangeLog.objects.create(user_id=user_id, model=key, object_id=instance.pk, deleted=deleted)
+
+
+def record_created(user_id, instances):
+    """Log rows inserted with bulk_create, which sends no signals.
+
+    New rows have no earlier entry to replace, so this is one INSERT.
+    """
+    ChangeLog.objects.bulk_create([
+        ChangeLog(user_id=user_id, model=MODEL_KEYS[type(instance)], object_id=instance.pk)
+        for instance in instances
+    ])
+
+
+def record_bulk(user_id, model, object_ids, created=False):
+    """Log rows of one model written by bulk_create(ignore_conflicts) or update().
+
+    Neither sends signals or hands back instances. Updated rows replace
+    their earlier entries, as record_change does for a single row.
+    """
+    key = MODEL_KEYS[model]
+    with transaction.atomic():
+        if not created:
+            ChangeLog.objects.filter(model=key, object_id__in=object_ids).delete()
+        ChangeLog.objects.bulk_create([
+            ChangeLog(user_id=user_id, model=key, object_id=object_id) for object_id in object_ids
+        ])
+
+
+def parse_token(value):
+    """Change log position from a client token; missing means from the start"""
+    if value in (None, ''):
+        return 0
+    position = int(value)
+    if position < 0:
+        raise ValueError('Negative sync token')
+    return position
+
+
+def changes_since(user_id, position, limit=DEFAULT_LIMIT):
+    """Rows created, updated or deleted after a change log position.
+
+    Reads at most limit entries through the (user, id) index and one query
+    per synced model, so the cost follows the number of changes rather than
+    the size of the history. Returns (changes, next position, has more).
+    """
+    entries = list(
+        ChangeLog.objects.filter(user_id=user_id, id__gt=position)
+        .order_by('id').values_list('id', 'model', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    updated = {key: [] for key in SYNCED_MODELS}
+    deleted = {key: [] for key in SYNCED_MODELS}
+    for _, key, object_id, is_deleted in entries:
+        (deleted if is_deleted else updated)[key].append(object_id)
+
+    changes = {}
+    for key, model in SYNCED_MODELS.items():
+        # A row deleted after its entry was read shows up as a tombstone on a later page
+        rows = model.objects.filter(pk__in=updated[key]).order_by('pk') if updated[key] else []
+        changes[key] = {'updated': rows, 'deleted': deleted[key]}
+
+    next_position = entries[-1][0] if entries else position
+    return changes, next_position, has_more
@@ -1,3 +1,2109 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.conf import settings
+from django.test import AsyncClient, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework import serializers as drf_serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer as DRFJSONRenderer
+from rest_framework.test import APIClient
+
+from .models import (
+    Exercise, WorkoutTemplate, TemplateExercise, ScheduledWorkout,
+    WorkoutLog, ExerciseLog, SetLog, DailyExerciseSummary, ChangeLog, TrainingProfile,
+    PersonalRecord, Job, BodyweightEntry, LeaderboardCounter, LeaderboardEntry, ResourceVersion
+)
+from . import calendar_cache, jobs, versions
+from .authentication import TokenCache, token_cache
+from .calendar_cache import LOCAL_TIMEOUT, cache_timeout
+from .benchmarking import regressions
+from .compression import accepted_encodings, brotli
+from .estimators import estimate
+from .fast_serializers import ScheduledWorkoutReader, TemplateReader, WorkoutLogReader
+from .leaderboard import entrants, rank_of
+from .jobs import HANDLERS, claim, enqueue, retry_failed, run, run_due
+from .instrumentation import BUCKETS_MS, RequestTimings, TimedListSerializer, histogram_percentile, request_stats
+from .training_load import rolling_mean
+from .query_plans import check_query_plans, full_scans
+from .renderers import JSONRenderer
+from .scoring import scores, wilks
+from .serializers import (
+    ScheduledWorkoutSerializer, SetLogSerializer, WorkoutLogSerializer, WorkoutTemplateSerializer,
+    compact_scheduled_workouts,
+)
+from .versions import bump_versions
+
+
+def make_log(user, exercise, when, sets, name='Session'):
+    """Create a workout log with one exercise and the given (reps, weight) sets"""
+    workout_log = WorkoutLog.objects.create(user=user, workout_name=name, date=when)
+    exercise_log = ExerciseLog.objects.create(workout_log=workout_log, exercise=exercise)
+    for number, (reps, weight) in enumerate(sets, start=1):
+        SetLog.objects.create(
+            exercise_log=exercise_log, set_number=number, reps=reps, weight=Decimal(weight)
+        )
+    return workout_log
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='lifter', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.squat = Exercise.objects.create(name='Back Squat', category='squat')
+            self.bench = Exercise.objects.create(name='Bench Press', category='bench')
+
+    def make_log(self, *args, **kwargs):
+        """make_log that also runs the summary refresh queued for commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_log(*args, **kwargs)
+
+
+class E1RMProgressTests(APITestCase):
+    url = reverse('analytics-e1rm')
+
+    def test_daily_max_per_exercise(self):
+        self.make_log(self.user, self.squat, datetime(2025, 1, 6, 9, tzinfo=dt_timezone.utc),
+                      [(5, '100'), (3, '110')])
+        self.make_log(self.user, self.squat, datetime(2025, 1, 6, 18, tzinfo=dt_timezone.utc),
+                      [(1, '120')])
+        self.make_log(self.user, self.squat, datetime(2025, 1, 8, tzinfo=dt_timezone.utc),
+                      [(5, '105')])
+        self.make_log(self.user, self.bench, datetime(2025, 1, 7, tzinfo=dt_timezone.utc),
+                      [(10, '60')])
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        exercises = {e['exercise_name']: e['points'] for e in response.data['exercises']}
+        self.assertEqual([p['date'].isoformat() for p in exercises['Back Squat']],
+                         ['2025-01-06', '2025-01-08'])
+        self.assertEqual(exercises['Back Squat'][0]['estimated_1rm'], 124.0)
+        self.assertEqual(exercises['Bench Press'][0]['estimated_1rm'], 80.0)
+
+    def test_weekly_period_and_filters(self):
+        self.make_log(self.user, self.squat, datetime(2025, 1, 6, tzinfo=dt_timezone.utc), [(5, '100')])
+        self.make_log(self.user, self.squat, datetime(2025, 1, 9, tzinfo=dt_timezone.utc), [(5, '110')])
+        self.make_log(self.user, self.squat, datetime(2025, 2, 3, tzinfo=dt_timezone.utc), [(5, '120')])
+        self.make_log(self.user, self.bench, datetime(2025, 1, 7, tzinfo=dt_timezone.utc), [(5, '80')])
+
+        response = self.client.get(self.url, {
+            'period': 'week', 'exercise': self.squat.id,
+            'start_date': '2025-01-01', 'end_date': '2025-01-31',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['exercises']), 1)
+        points = response.data['exercises'][0]['points']
+        self.assertEqual(len(points), 1)
+        self.assertEqual(points[0]['date'].isoformat(), '2025-01-06')
+
+    def test_only_own_logs(self):
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.make_log(other, self.squat, datetime(2025, 1, 6, tzinfo=dt_timezone.utc), [(5, '100')])
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.data['exercises'], [])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'period': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start_date': 'soon'}).status_code, 400)
+
+
+class DailyExerciseSummaryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = datetime(2025, 1, 6, 9, tzinfo=dt_timezone.utc)
+
+    def summary(self, exercise=None):
+        return DailyExerciseSummary.objects.get(user=self.user, exercise=exercise or self.squat)
+
+    def test_created_with_log(self):
+        self.make_log(self.user, self.squat, self.day, [(5, '100'), (3, '110'), (3, '110')])
+        self.make_log(self.user, self.squat, self.day.replace(hour=18), [(1, '100')])
+
+        summary = self.summary()
+        self.assertEqual(summary.total_sets, 4)
+        self.assertEqual(summary.total_reps, 12)
+        self.assertEqual(summary.tonnage, Decimal('1260'))
+        self.assertEqual((summary.best_set_weight, summary.best_set_reps), (Decimal('110'), 3))
+        self.assertEqual(summary.best_e1rm, 121.0)
+        self.assertIsNone(summary.avg_rpe)
+
+    def test_created_through_api(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/workout-logs/', {
+                'workout_name': 'Squat day',
+                'date': '2025-01-06T09:00:00Z',
+                'exercise_logs': [{
+                    'exercise': self.squat.id,
+                    'set_logs': [
+                        {'set_number': 1, 'reps': 5, 'weight': '100', 'rpe': 7},
+                        {'set_number': 2, 'reps': 5, 'weight': '100', 'rpe': 8},
+                    ],
+                }],
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.summary().total_sets, 2)
+        self.assertEqual(self.summary().avg_rpe, 7.5)
+
+    def test_updates_and_deletes(self):
+        workout_log = self.make_log(self.user, self.squat, self.day, [(5, '100'), (5, '120')])
+        set_log = SetLog.objects.get(weight=120)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            set_log.weight = Decimal('90')
+            set_log.save()
+        self.assertEqual(self.summary().best_set_weight, Decimal('100'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            exercise_log = workout_log.exercise_logs.get()
+            exercise_log.exercise = self.bench
+            exercise_log.save()
+        self.assertFalse(DailyExerciseSummary.objects.filter(exercise=self.squat).exists())
+        self.assertEqual(self.summary(self.bench).total_sets, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            workout_log.date = self.day.replace(day=7)
+            workout_log.save()
+        self.assertEqual(self.summary(self.bench).date.isoformat(), '2025-01-07')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            workout_log.delete()
+        self.assertFalse(DailyExerciseSummary.objects.exists())
+
+    def test_rebuild_command(self):
+        self.make_log(self.user, self.squat, self.day, [(5, '100')])
+        self.make_log(self.user, self.bench, self.day, [(5, '80')])
+        self.make_log(self.user, self.squat, self.day.replace(day=8), [(5, '105')])
+        expected = list(DailyExerciseSummary.objects.values_list(
+            'exercise', 'date', 'total_sets', 'tonnage', 'best_e1rm'
+        ).order_by('exercise', 'date'))
+        DailyExerciseSummary.objects.all().delete()
+
+        call_command('rebuild_summaries', stdout=StringIO())
+
+        self.assertEqual(list(DailyExerciseSummary.objects.values_list(
+            'exercise', 'date', 'total_sets', 'tonnage', 'best_e1rm'
+        ).order_by('exercise', 'date')), expected)
+
+
+class WorkoutLogQueryCountTests(APITestCase):
+    def make_logs(self, count):
+        for day in range(1, count + 1):
+            workout_log = self.make_log(
+                self.user, self.squat, datetime(2025, 1, day, tzinfo=dt_timezone.utc),
+                [(5, '100'), (5, '100'), (5, '100')],
+            )
+            exercise_log = ExerciseLog.objects.create(workout_log=workout_log, exercise=self.bench, order=1)
+            SetLog.objects.create(exercise_log=exercise_log, set_number=1, reps=8, weight=Decimal('80'))
+
+    def test_list_query_count_is_constant(self):
+        self.make_logs(2)
+        with self.assertNumQueries(4):
+            small = self.client.get('/api/workout-logs/')
+        self.make_logs(18)
+        with self.assertNumQueries(4):
+            large = self.client.get('/api/workout-logs/')
+
+        self.assertEqual(len(small.data['results']), 2)
+        self.assertEqual(len(large.data['results']), 20)
+        exercise_logs = large.data['results'][0]['exercise_logs']
+        self.assertEqual([e['exercise_name'] for e in exercise_logs], ['Back Squat', 'Bench Press'])
+        self.assertEqual([s['set_number'] for s in exercise_logs[0]['set_logs']], [1, 2, 3])
+
+    def test_detail_query_count(self):
+        self.make_logs(1)
+        workout_log = WorkoutLog.objects.get()
+
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/workout-logs/{workout_log.pk}/')
+
+        self.assertEqual(response.data['user_name'], 'lifter')
+        self.assertEqual(len(response.data['exercise_logs']), 2)
+
+
+class FastSerializerTests(APITestCase):
+    """The .values() fast path and the orjson renderer give the serializers' bytes"""
+
+    def setUp(self):
+        super().setUp()
+        drf_renderer = DRFJSONRenderer()
+        self.render = drf_renderer.render
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log = self.make_log(self.user, self.squat, datetime(2025, 1, 6, 9, 30, 15, 123456,
+                                                                       tzinfo=dt_timezone.utc),
+                                     [(5, '102.5'), (3, '110')], name='Heavy \u2028 day ✓')
+            ExerciseLog.objects.create(workout_log=self.log, exercise=self.bench, order=1, notes='ünïcode')
+            # A set saved before e1rm was stored, and a log without exercises
+            SetLog.objects.filter(exercise_log__workout_log=self.log, set_number=2).update(e1rm=None, rpe=8)
+            WorkoutLog.objects.create(user=self.user, workout_name='Empty', duration_minutes=45,
+                                      date=datetime(2025, 1, 8, tzinfo=dt_timezone.utc))
+
+            heavy = WorkoutTemplate.objects.create(user=self.user, name='Heavy')
+            TemplateExercise.objects.create(template=heavy, exercise=self.squat, target_sets=5, target_reps=5,
+                                            target_weight=Decimal('140.5'), order=0)
+            TemplateExercise.objects.create(template=heavy, exercise=self.bench, target_sets=3, target_reps=8, order=1)
+            empty = WorkoutTemplate.objects.create(user=self.user, name='Empty')
+            for day, template in [(6, heavy), (7, empty), (9, heavy)]:
+                ScheduledWorkout.objects.create(user=self.user, template=template, scheduled_date=date(2025, 1, day))
+
+    def test_workout_logs(self):
+        queryset = WorkoutLog.objects.filter(user=self.user)
+        expected = WorkoutLogSerializer(WorkoutLogSerializer.setup_eager_loading(queryset), many=True).data
+        reader = WorkoutLogReader()
+        data = reader.data(list(queryset.values(*reader.lookups)))
+        self.assertEqual(self.render(data), self.render(expected))
+        self.assertIsNone(data[1]['exercise_logs'][0]['set_logs'][1]['e1rm'])
+        self.assertIsNotNone(data[1]['exercise_logs'][0]['set_logs'][1]['estimated_1rm'])
+
+    def test_scheduled_workouts(self):
+        queryset = ScheduledWorkout.objects.filter(user=self.user)
+        eager = ScheduledWorkoutSerializer.setup_eager_loading(queryset)
+        for reader, expected in [
+            (ScheduledWorkoutReader(), ScheduledWorkoutSerializer(eager, many=True).data),
+            (ScheduledWorkoutReader(compact=True), compact_scheduled_workouts(eager)),
+        ]:
+            self.assertEqual(self.render(reader.data(list(queryset.values(*reader.lookups)))), self.render(expected))
+
+    def test_templates(self):
+        queryset = WorkoutTemplate.objects.filter(user=self.user)
+        expected = WorkoutTemplateSerializer(WorkoutTemplateSerializer.setup_eager_loading(queryset), many=True).data
+        reader = TemplateReader()
+        self.assertEqual(self.render(reader.data(list(queryset.values(*reader.lookups)))), self.render(expected))
+
+    def test_endpoints_use_the_fast_path(self):
+        queryset = WorkoutLog.objects.filter(user=self.user)
+        expected = WorkoutLogSerializer(WorkoutLogSerializer.setup_eager_loading(queryset.filter(pk=self.log.pk)),
+                                        many=True).data[0]
+        response = self.client.get(reverse('workout-logs-detail', args=[self.log.pk]))
+        self.assertEqual(response.content, self.render(expected))
+        self.assertEqual(self.client.get(reverse('workout-logs-detail', args=[999])).status_code, 404)
+        self.assertEqual(self.client.get('/api/workout-logs/x/').status_code, 404)
+
+        listed = self.client.get(reverse('scheduled-workouts-list'), {'page_size': 2})
+        self.assertEqual([w['scheduled_date'] for w in listed.data['results']], ['2025-01-09', '2025-01-07'])
+        following = self.client.get(listed.data['next'])
+        self.assertEqual([w['scheduled_date'] for w in following.data['results']], ['2025-01-06'])
+
+    def test_renderer_matches_drf(self):
+        data = {
+            'when': datetime(2025, 1, 6, 9, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'day': date(2025, 1, 6),
+            'weight': Decimal('102.50'),
+            'ratio': 1.1,
+            'text': 'line\u2028separator ✓ "quoted"',
+            'nested': [{'a': None, 'b': True}, []],
+            'big': 2 ** 70,
+        }
+        self.assertEqual(JSONRenderer().render(data), self.render(data))
+        self.assertEqual(JSONRenderer().render(data, 'application/json; indent=2'),
+                         self.render(data, 'application/json; indent=2'))
+        self.assertEqual(JSONRenderer().render(None), b'')
+
+    def test_parser(self):
+        response = self.client.post(reverse('scheduled-workouts-shift'), '{"start_date": ',
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.data['detail'])
+
+        response = self.client.post(reverse('scheduled-workouts-shift'), '{"days": NaN}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(reverse('scheduled-workouts-shift'),
+                                    json.dumps({'start_date': '2025-01-06', 'end_date': '2025-01-07', 'days': 7}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['moved'], 2)
+
+
+class CalendarTests(APITestCase):
+    url = reverse('calendar-workouts')
+
+    def schedule(self, days, templates=2):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._schedule(days, templates)
+
+    def _schedule(self, days, templates):
+        for index in range(templates):
+            template = WorkoutTemplate.objects.create(user=self.user, name=f'Day {index}')
+            TemplateExercise.objects.create(template=template, exercise=self.squat,
+                                            target_sets=5, target_reps=5, order=0)
+            TemplateExercise.objects.create(template=template, exercise=self.bench,
+                                            target_sets=3, target_reps=8, order=1)
+        templates = list(WorkoutTemplate.objects.filter(user=self.user))
+        for day in range(1, days + 1):
+            ScheduledWorkout.objects.create(user=self.user, template=templates[day % len(templates)],
+                                            scheduled_date=date(2025, 1, day))
+
+    def test_query_count_is_constant(self):
+        self.schedule(3)
+        with self.assertNumQueries(4):
+            small = self.client.get(self.url, {'year': 2025, 'month': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            ScheduledWorkout.objects.all().delete()
+        self.schedule(28, templates=4)
+        with self.assertNumQueries(4):
+            large = self.client.get(self.url, {'year': 2025, 'month': 1})
+
+        self.assertEqual(len(small.data), 3)
+        self.assertEqual(len(large.data), 28)
+        details = large.data[0]['template_details']
+        self.assertEqual([e['exercise_name'] for e in details['template_exercises']],
+                         ['Back Squat', 'Bench Press'])
+
+    def test_compact_mode_sends_templates_once(self):
+        self.schedule(10)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, {'year': 2025, 'month': 1, 'compact': 'true'})
+
+        self.assertEqual(len(response.data['workouts']), 10)
+        self.assertEqual(len(response.data['templates']), 2)
+        workout = response.data['workouts'][0]
+        self.assertNotIn('template_details', workout)
+        template = response.data['templates'][str(workout['template'])]
+        self.assertEqual(template['name'], workout['template_name'])
+        self.assertEqual(len(template['template_exercises']), 2)
+
+    def test_template_list_query_count(self):
+        self.schedule(1, templates=5)
+
+        # Versions, count, templates, and their exercises with the exercise ids
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/workout-templates/')
+
+        self.assertEqual(len(response.data['results']), 5)
+
+
+class CalendarCacheTests(APITestCase):
+    url = reverse('calendar-workouts')
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.template = WorkoutTemplate.objects.create(user=self.user, name='Heavy')
+            self.template_exercise = TemplateExercise.objects.create(
+                template=self.template, exercise=self.squat, target_sets=5, target_reps=5, order=0
+            )
+            self.january = ScheduledWorkout.objects.create(
+                user=self.user, template=self.template, scheduled_date=date(2025, 1, 6)
+            )
+            ScheduledWorkout.objects.create(user=self.user, template=self.template,
+                                            scheduled_date=date(2025, 2, 3))
+
+    def get(self, **params):
+        return self.client.get(self.url, {'year': 2025, 'month': 1, **params})
+
+    def test_second_request_is_served_from_cache(self):
+        self.get()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get()
+
+        self.assertEqual(len(response.data), 1)
+        self.assertFalse([q for q in queries if 'workouts_scheduledworkout' in q['sql']])
+
+    def test_scheduled_workout_edit_invalidates_month(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.january.notes = 'Felt strong'
+            self.january.save()
+
+        self.assertEqual(self.get().data[0]['notes'], 'Felt strong')
+
+    def test_moving_workout_invalidates_both_months(self):
+        self.get()
+        self.get(month=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.january.scheduled_date = date(2025, 2, 10)
+            self.january.save()
+
+        self.assertEqual(self.get().data, [])
+        self.assertEqual(len(self.get(month=2).data), 2)
+
+    def test_template_changes_invalidate_months_using_it(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.template.name = 'Volume'
+            self.template.save()
+        self.assertEqual(self.get().data[0]['template_name'], 'Volume')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.template_exercise.target_reps = 3
+            self.template_exercise.save()
+        details = self.get().data[0]['template_details']
+        self.assertEqual(details['template_exercises'][0]['target_reps'], 3)
+
+    def test_exercise_rename_invalidates_everything(self):
+        self.get(compact='1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.squat.name = 'High Bar Squat'
+            self.squat.save()
+
+        template = self.get(compact='1').data['templates'][str(self.template.pk)]
+        self.assertEqual(template['template_exercises'][0]['exercise_name'], 'High Bar Squat')
+
+    def test_writes_from_other_processes_miss_the_cached_month(self):
+        first = self.get()
+        # Another process saves the row: its deletes never reach this cache, its stamps do
+        ScheduledWorkout.objects.filter(pk=self.january.pk).update(notes='Felt strong')
+        bump_versions({('scheduled', self.user.pk)})
+
+        response = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['notes'], 'Felt strong')
+
+    def test_local_memory_entries_are_short_lived(self):
+        self.assertEqual(cache_timeout(), LOCAL_TIMEOUT)
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.assertEqual(cache_timeout(), calendar_cache.TIMEOUT)
+
+    def test_range_across_months(self):
+        response = self.client.get(self.url, {'start_date': '2025-01-01', 'end_date': '2025-02-28'})
+        self.assertEqual([w['scheduled_date'] for w in response.data], ['2025-02-03', '2025-01-06'])
+
+        # Partial months are trimmed after the cached lookup
+        response = self.client.get(self.url, {'start_date': '2025-01-06', 'end_date': '2025-01-12'})
+        self.assertEqual([w['scheduled_date'] for w in response.data], ['2025-01-06'])
+
+        response = self.client.get(self.url, {'start_date': '2025-01-20', 'end_date': '2025-02-02',
+                                              'compact': '1'})
+        self.assertEqual(response.data, {'workouts': [], 'templates': {}})
+
+    def test_invalid_ranges_are_rejected(self):
+        for params in [
+            {'start_date': '2025-01-01'},
+            {'start_date': '2025-02-01', 'end_date': '2025-01-01'},
+            {'start_date': '2025-01-01', 'end_date': '2026-01-02'},
+            {'start_date': 'soon', 'end_date': '2025-01-01'},
+        ]:
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+
+class ProgramSchedulingTests(APITestCase):
+    program_url = reverse('scheduled-workouts-program')
+    shift_url = reverse('scheduled-workouts-shift')
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.heavy = WorkoutTemplate.objects.create(user=self.user, name='Heavy')
+            self.light = WorkoutTemplate.objects.create(user=self.user, name='Light')
+
+    def schedule(self, weeks=4, **data):
+        payload = {'templates': [self.heavy.pk, self.light.pk], 'weekdays': [0, 2, 4],
+                   'start_date': '2025-01-06', 'weeks': weeks, **data}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.program_url, payload, format='json')
+
+    def shift(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.shift_url, data, format='json')
+
+    def dates(self, template=None):
+        workouts = ScheduledWorkout.objects.filter(user=self.user).order_by('scheduled_date')
+        if template:
+            workouts = workouts.filter(template=template)
+        return [str(day) for day in workouts.values_list('scheduled_date', flat=True)]
+
+    def test_expands_program_with_rotating_templates(self):
+        response = self.schedule(weeks=2)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['skipped']), (6, 0))
+        self.assertEqual(self.dates(self.heavy), ['2025-01-06', '2025-01-10', '2025-01-15'])
+        self.assertEqual(self.dates(self.light), ['2025-01-08', '2025-01-13', '2025-01-17'])
+        self.assertEqual(response.data['scheduled_workouts'][0]['template_name'], 'Heavy')
+
+    def test_insert_count_does_not_grow_with_weeks(self):
+        # The first write creates the version stamp rows
+        self.schedule(weeks=1, start_date='2024-01-01')
+        with CaptureQueriesContext(connection) as short:
+            self.schedule(weeks=1)
+        with CaptureQueriesContext(connection) as long:
+            self.schedule(weeks=12, start_date='2025-03-03')
+
+        self.assertEqual(ScheduledWorkout.objects.count(), 42)
+        self.assertEqual(len(short), len(long))
+
+    def test_existing_days_are_skipped(self):
+        self.schedule(weeks=1)
+        response = self.schedule(weeks=2)
+
+        self.assertEqual((response.data['created'], response.data['skipped']), (3, 3))
+        self.assertEqual(ScheduledWorkout.objects.count(), 6)
+
+    def test_program_refreshes_calendar_versions_and_sync(self):
+        calendar = self.client.get(reverse('calendar-workouts'), {'year': 2025, 'month': 1})
+        self.assertEqual(calendar.data, [])
+        token = self.client.get(reverse('sync')).data['token']
+
+        self.schedule(weeks=1)
+
+        response = self.client.get(reverse('calendar-workouts'), {'year': 2025, 'month': 1},
+                                   HTTP_IF_NONE_MATCH=calendar['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        changes = self.client.get(reverse('sync'), {'token': token}).data['changes']
+        self.assertEqual(len(changes['scheduled_workouts']['updated']), 3)
+
+    def test_rejects_other_users_templates(self):
+        other = User.objects.create_user(username='other', password='testpass123')
+        template = WorkoutTemplate.objects.create(user=other, name='Theirs')
+
+        response = self.schedule(templates=[template.pk])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ScheduledWorkout.objects.exists())
+
+    def test_shift_block_overlapping_itself(self):
+        self.schedule(weeks=2)
+        response = self.shift(start_date='2025-01-06', end_date='2025-01-19', days=7)
+
+        self.assertEqual(response.data, {'moved': 6})
+        self.assertEqual(self.dates(self.heavy), ['2025-01-13', '2025-01-17', '2025-01-22'])
+        self.assertEqual(self.dates(self.light), ['2025-01-15', '2025-01-20', '2025-01-24'])
+
+    def test_reschedule_to_date_keeps_completed_workouts(self):
+        self.schedule(weeks=1)
+        ScheduledWorkout.objects.filter(scheduled_date=date(2025, 1, 6)).update(is_completed=True)
+        calendar = self.client.get(reverse('calendar-workouts'), {'year': 2025, 'month': 2})
+        self.assertEqual(calendar.data, [])
+
+        response = self.shift(start_date='2025-01-06', end_date='2025-01-12', to_date='2025-02-03',
+                              templates=[self.light.pk])
+
+        self.assertEqual(response.data, {'moved': 1})
+        self.assertEqual(self.dates(), ['2025-01-06', '2025-01-10', '2025-02-05'])
+        calendar = self.client.get(reverse('calendar-workouts'), {'year': 2025, 'month': 2})
+        self.assertEqual([w['scheduled_date'] for w in calendar.data], ['2025-02-05'])
+
+    def test_shift_onto_scheduled_days_conflicts(self):
+        self.schedule(weeks=2)
+        response = self.shift(start_date='2025-01-06', end_date='2025-01-08', days=9)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['conflicts'], [date(2025, 1, 15), date(2025, 1, 17)])
+        self.assertEqual(self.dates(self.heavy), ['2025-01-06', '2025-01-10', '2025-01-15'])
+
+    def test_shift_validation(self):
+        for data in [
+            {'start_date': '2025-01-06', 'end_date': '2025-01-12'},
+            {'start_date': '2025-01-06', 'end_date': '2025-01-12', 'days': 0},
+            {'start_date': '2025-01-12', 'end_date': '2025-01-06', 'days': 7},
+            {'start_date': '2025-01-06', 'end_date': '2025-01-12', 'days': 7, 'to_date': '2025-01-13'},
+        ]:
+            self.assertEqual(self.shift(**data).status_code, 400, data)
+
+
+class AsyncReadViewTests(APITestCase):
+    """The async views behind ASGI answer exactly like the sync DRF views"""
+    async_urls = 'django_project.asgi_urls'
+
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        day = datetime(2025, 1, 6, 9, tzinfo=dt_timezone.utc)
+        self.logs = [
+            self.make_log(self.user, self.squat, day.replace(day=6 + week * 7), [(5, str(100 + week * 5))])
+            for week in range(3)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            template = WorkoutTemplate.objects.create(user=self.user, name='Heavy')
+            TemplateExercise.objects.create(template=template, exercise=self.squat,
+                                            target_sets=5, target_reps=5, order=0)
+            ScheduledWorkout.objects.create(user=self.user, template=template,
+                                            scheduled_date=date(2025, 1, 8))
+
+    def assertSameResponse(self, url, params=None, **headers):
+        sync_response = self.client.get(url, params, **headers)
+        with self.settings(ROOT_URLCONF=self.async_urls):
+            async_response = self.client.get(url, params, **headers)
+
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+        self.assertEqual(async_response.get('ETag'), sync_response.get('ETag'))
+        return async_response
+
+    def test_routes_resolve_to_async_views(self):
+        with self.settings(ROOT_URLCONF=self.async_urls):
+            for url in ['/api/calendar/', '/api/workout-logs/', f'/api/workout-logs/{self.logs[0].pk}/',
+                        '/api/analytics/e1rm/', '/api/analytics/training-load/', '/api/records/']:
+                self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func), url)
+
+    def test_same_responses(self):
+        self.assertSameResponse(reverse('calendar-workouts'), {'year': 2025, 'month': 1})
+        self.assertSameResponse(reverse('calendar-workouts'), {'year': 2025, 'month': 1, 'compact': '1'})
+        self.assertSameResponse(reverse('workout-logs-detail', args=[self.logs[0].pk]))
+        self.assertSameResponse(reverse('analytics-e1rm'), {'period': 'week'})
+        self.assertSameResponse(reverse('analytics-training-load'),
+                                {'start_date': '2025-01-01', 'end_date': '2025-01-31'})
+        self.assertSameResponse(reverse('personal-records'))
+
+    def test_keyset_pages_match(self):
+        first = json.loads(self.assertSameResponse(reverse('workout-logs-list'), {'page_size': 2}).content)
+        self.assertEqual(len(first['results']), 2)
+        self.assertSameResponse(first['next'])
+
+    def test_errors_match(self):
+        self.assertSameResponse(reverse('workout-logs-detail', args=[999]))
+        self.assertSameResponse(reverse('calendar-workouts'), {'start_date': '2025-01-01'})
+        self.assertSameResponse(reverse('analytics-e1rm'), {'period': 'year'})
+        self.assertSameResponse(reverse('personal-records'), HTTP_AUTHORIZATION='Token nope')
+        self.client.credentials()
+        self.assertSameResponse(reverse('personal-records'))
+
+    def test_conditional_get(self):
+        with self.settings(ROOT_URLCONF=self.async_urls):
+            first = self.client.get(reverse('workout-logs-list'))
+            second = self.client.get(reverse('workout-logs-list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_writes_go_to_drf(self):
+        with self.settings(ROOT_URLCONF=self.async_urls):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(reverse('workout-logs-detail', args=[self.logs[0].pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(WorkoutLog.objects.filter(pk=self.logs[0].pk).exists())
+
+    async def test_asgi_handler(self):
+        with self.settings(ROOT_URLCONF=self.async_urls):
+            response = await AsyncClient().get(
+                reverse('calendar-workouts'), {'year': 2025, 'month': 1},
+                headers={'Authorization': f'Token {self.token.key}'},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([w['scheduled_date'] for w in json.loads(response.content)], ['2025-01-08'])
+
+    async def test_export_streams_through_the_asgi_handler(self):
+        with self.settings(ROOT_URLCONF=self.async_urls):
+            response = await AsyncClient().get(
+                reverse('export-history', args=['ndjson']), headers={'Authorization': f'Token {self.token.key}'},
+            )
+            self.assertEqual(response.status_code, 200)
+            # Async content is streamed as read; a sync iterator would be buffered whole
+            self.assertTrue(response.is_async)
+            content = b''.join([chunk async for chunk in response.streaming_content])
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([(r['exercise'], r['weight']) for r in records],
+                         [('Back Squat', '100.00'), ('Back Squat', '105.00'), ('Back Squat', '110.00')])
+
+
+class WorkoutLogCreateTests(APITestCase):
+    def payload(self, day=6, sets=10):
+        return {
+            'workout_name': 'Squat day',
+            'date': f'2025-01-{day:02d}T09:00:00Z',
+            'exercise_logs': [
+                {
+                    'exercise': exercise.id,
+                    'order': order,
+                    'set_logs': [
+                        {'set_number': number, 'reps': 5, 'weight': '100'}
+                        for number in range(1, sets + 1)
+                    ],
+                }
+                for order, exercise in enumerate([self.squat, self.bench])
+            ],
+        }
+
+    def test_insert_count_is_constant(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/workout-logs/', self.payload(sets=15), format='json')
+
+        self.assertEqual(response.status_code, 201)
+        # One per table, the change log entries for the log and its bulk created
+        # rows, and the personal record upsert
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 6)
+        self.assertEqual(SetLog.objects.count(), 30)
+        self.assertEqual(len(response.data['exercise_logs'][1]['set_logs']), 15)
+
+    def test_failure_leaves_no_partial_log(self):
+        payload = self.payload()
+        with mock.patch.object(SetLog.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.client.post('/api/workout-logs/', payload, format='json')
+
+        self.assertFalse(WorkoutLog.objects.exists())
+        self.assertFalse(ExerciseLog.objects.exists())
+
+    def test_duplicate_set_numbers_rejected(self):
+        payload = self.payload(sets=2)
+        payload['exercise_logs'][0]['set_logs'][1]['set_number'] = 1
+
+        response = self.client.post('/api/workout-logs/', payload, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_create(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/workout-logs/batch/',
+                                        [self.payload(day) for day in (6, 8, 10)], format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(WorkoutLog.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(DailyExerciseSummary.objects.count(), 6)
+
+    def test_batch_is_all_or_nothing(self):
+        invalid = self.payload(8)
+        del invalid['workout_name']
+
+        response = self.client.post('/api/workout-logs/batch/', [self.payload(6), invalid], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WorkoutLog.objects.exists())
+
+
+class JobQueueTests(APITestCase):
+    """Derived data recomputed by the job queue instead of the write request"""
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(self.settings(BACKGROUND_JOBS={
+            **settings.BACKGROUND_JOBS, 'ENABLED': True, 'BATCH_DELAY_SECONDS': 0, 'MAX_ATTEMPTS': 2,
+        }))
+        # Not a leaderboard lift, so logging it queues no leaderboard refresh
+        with self.captureOnCommitCallbacks(execute=True):
+            self.press = Exercise.objects.create(name='Leg Press', category='accessory')
+
+    def post_log(self, day):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/workout-logs/', {
+                'workout_name': 'Squat day',
+                'date': f'2025-01-{day:02d}T09:00:00Z',
+                'exercise_logs': [
+                    {'exercise': self.press.id, 'set_logs': [{'set_number': 1, 'reps': 5, 'weight': '100'}]},
+                ],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def test_writes_queue_the_recomputation(self):
+        response = self.post_log(6)
+
+        # The records beaten by the new sets are still part of the response
+        self.assertEqual(len(response.data['new_records']), 3)
+        self.assertFalse(DailyExerciseSummary.objects.exists())
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.status), ('summaries', Job.PENDING))
+        self.assertEqual(job.keys, [[self.press.id, '2025-01-06']])
+
+        self.assertEqual(run_due(), (1, 0))
+        self.assertEqual(DailyExerciseSummary.objects.get().tonnage, Decimal('500'))
+        self.assertFalse(Job.objects.exists())
+
+    def test_concurrent_merges_keep_every_key(self):
+        enqueue('records', self.user.pk, [1])
+        merge_keys = jobs.merge_keys
+
+        def merge_racing_another_request(*key_lists):
+            if not Job.objects.filter(keys=[1, 2]).exists():
+                # Another request merges its key between our read and our update
+                Job.objects.filter(kind='records').update(keys=[1, 2])
+            return merge_keys(*key_lists)
+
+        with mock.patch.object(jobs, 'merge_keys', merge_racing_another_request):
+            enqueue('records', self.user.pk, [3])
+
+        self.assertEqual(Job.objects.get().keys, [1, 2, 3])
+
+    def test_bursts_share_one_job_per_user_and_kind(self):
+        self.post_log(6)
+        self.post_log(7)
+        with self.captureOnCommitCallbacks(execute=True):
+            SetLog.objects.filter(exercise_log__workout_log__date__day=7).delete()
+
+        self.assertEqual(sorted(Job.objects.values_list('kind', 'keys')), [
+            ('records', [self.press.id]),
+            ('summaries', [[self.press.id, '2025-01-06'], [self.press.id, '2025-01-07']]),
+        ])
+        self.assertEqual(run_due(), (2, 0))
+        self.assertEqual(list(DailyExerciseSummary.objects.values_list('date', flat=True)), [date(2025, 1, 6)])
+
+    def test_jobs_wait_for_the_batch_delay(self):
+        with self.settings(BACKGROUND_JOBS={'ENABLED': True, 'BATCH_DELAY_SECONDS': 60}):
+            self.post_log(6)
+        self.assertEqual(run_due(), (0, 0))
+
+        Job.objects.update(run_after=timezone.now())
+        self.assertEqual(run_due(), (1, 0))
+
+    def test_writes_during_a_run_queue_another_job(self):
+        self.post_log(6)
+        running = claim()
+        self.post_log(7)
+
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).get().keys, [[self.press.id, '2025-01-07']])
+        self.assertTrue(run(running))
+        self.assertEqual(run_due(), (1, 0))
+        self.assertEqual(DailyExerciseSummary.objects.count(), 2)
+
+    def test_failures_are_retried_then_kept(self):
+        self.post_log(6)
+        with mock.patch.dict(HANDLERS, {'summaries': mock.Mock(side_effect=ValueError('boom'))}):
+            with self.assertLogs('workouts.jobs', 'ERROR'):
+                self.assertEqual(run_due(), (0, 1))
+            job = Job.objects.get()
+            self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+            self.assertIn('boom', job.last_error)
+            self.assertGreater(job.run_after, timezone.now())
+
+            Job.objects.update(run_after=timezone.now())
+            with self.assertLogs('workouts.jobs', 'ERROR'):
+                self.assertEqual(run_due(), (0, 1))
+            self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+        self.assertEqual(retry_failed(), 1)
+        self.assertEqual(run_due(), (1, 0))
+        self.assertTrue(DailyExerciseSummary.objects.exists())
+
+    def test_jobs_of_lost_workers_are_claimed_again(self):
+        self.post_log(6)
+        job = claim()
+        self.assertIsNone(claim())
+
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        reclaimed = claim()
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (job.pk, 2))
+        # The first worker's late result does not remove the job from the new one
+        self.assertTrue(run(job))
+        self.assertTrue(Job.objects.exists())
+
+    def test_formula_change(self):
+        self.post_log(6)
+        run_due()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('profile'), {'e1rm_formula': 'lombardi'}, format='json')
+
+        self.assertIn('formula', Job.objects.values_list('kind', flat=True))
+        out = StringIO()
+        call_command('run_jobs', '--once', stdout=out)
+        self.assertIn(' 0 failed', out.getvalue())
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(SetLog.objects.get().e1rm, round(100 * 5 ** 0.1, 2))
+
+    def test_disabled_queue_runs_inline(self):
+        with self.settings(BACKGROUND_JOBS={'ENABLED': False}):
+            with self.captureOnCommitCallbacks(execute=True):
+                enqueue('summaries', self.user.pk, [[self.press.id, '2025-01-06']])
+            self.post_log(6)
+        self.assertFalse(Job.objects.exists())
+        self.assertTrue(DailyExerciseSummary.objects.exists())
+
+
+class ImportHistoryTests(APITestCase):
+    def write_file(self, name, content):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / name
+        path.write_text(content)
+        return str(path)
+
+    def test_csv_import(self):
+        path = self.write_file('history.csv', (
+            'date,workout_name,exercise,reps,weight,rpe\n'
+            '2024-03-01,Heavy,Back Squat,5,140,8\n'
+            '2024-03-01,Heavy,back squat,5,140,9\n'
+            '2024-03-01,Heavy,Bench Press,8,90,\n'
+            '2024-03-03,,Back Squat,3,150,\n'
+        ))
+
+        call_command('import_history', path, user='lifter', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(WorkoutLog.objects.filter(user=self.user).count(), 2)
+        heavy = WorkoutLog.objects.get(workout_name='Heavy')
+        self.assertEqual([e.exercise.name for e in heavy.exercise_logs.all()], ['Back Squat', 'Bench Press'])
+        squat_sets = heavy.exercise_logs.get(exercise=self.squat).set_logs.all()
+        self.assertEqual([(s.set_number, s.rpe) for s in squat_sets], [(1, 8), (2, 9)])
+        self.assertEqual(DailyExerciseSummary.objects.filter(user=self.user).count(), 3)
+
+    def test_set_numbers_are_checked_per_exercise(self):
+        path = self.write_file('history.csv', (
+            'date,exercise,reps,weight,set_number\n'
+            '2024-03-01,Back Squat,5,140,2\n'
+            '2024-03-01,Back Squat,5,140,\n'
+            '2024-03-01,Bench Press,8,90,1\n'
+        ))
+        call_command('import_history', path, user='lifter', stdout=StringIO())
+        self.assertEqual(
+            list(SetLog.objects.filter(exercise_log__exercise=self.squat).values_list('set_number', flat=True)), [2, 3]
+        )
+
+        path = self.write_file('history.csv', (
+            'date,exercise,reps,weight,set_number\n'
+            '2024-03-05,Back Squat,5,140,\n'
+            '2024-03-05,Back Squat,5,140,1\n'
+        ))
+        with self.assertRaisesMessage(CommandError, 'history.csv:3: set_number 1 is already used'):
+            call_command('import_history', path, user='lifter', stdout=StringIO())
+        self.assertEqual(WorkoutLog.objects.count(), 1)
+
+    def test_ndjson_import_with_new_exercise(self):
+        path = self.write_file('history.ndjson', '\n'.join(json.dumps(row) for row in [
+            {'date': '2024-03-01T18:00:00', 'exercise': 'Deadlift', 'category': 'deadlift',
+             'reps': 5, 'weight': 180},
+            {'date': '2024-03-01T18:00:00', 'exercise': 'Deadlift', 'reps': 5, 'weight': 190},
+        ]))
+
+        with self.assertRaises(CommandError):
+            call_command('import_history', path, user='lifter', stdout=StringIO())
+        call_command('import_history', path, user='lifter', create_exercises=True, stdout=StringIO())
+
+        self.assertEqual(Exercise.objects.get(name='Deadlift').category, 'deadlift')
+        self.assertEqual(SetLog.objects.count(), 2)
+
+    def test_new_exercises_need_a_known_category(self):
+        path = self.write_file('history.csv', (
+            'date,exercise,category,reps,weight\n'
+            '2024-03-01,Back Squat,squat,5,140\n'
+            '2024-03-01,Hip Thrust,glutes,8,100\n'
+        ))
+        with self.assertRaisesMessage(CommandError, "history.csv:3: invalid row (unknown category 'glutes'"):
+            call_command('import_history', path, user='lifter', create_exercises=True, stdout=StringIO())
+        self.assertFalse(Exercise.objects.filter(name='Hip Thrust').exists())
+
+
+class ExportHistoryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_log(self.user, self.squat, datetime(2025, 1, 6, 9, tzinfo=dt_timezone.utc),
+                      [(5, '100'), (3, '110.5')], name='Heavy')
+        self.make_log(self.user, self.bench, datetime(2025, 1, 8, 9, tzinfo=dt_timezone.utc), [(8, '80')])
+
+    def test_ndjson_export(self):
+        response = self.client.get(reverse('export-history', args=['ndjson']))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(r['exercise'], r['set_number'], r['weight']) for r in records],
+                         [('Back Squat', 1, '100.00'), ('Back Squat', 2, '110.50'), ('Bench Press', 1, '80.00')])
+        self.assertEqual(records[0]['workout_name'], 'Heavy')
+
+    def test_csv_export_round_trips_through_import(self):
+        response = self.client.get(reverse('export-history', args=['csv']))
+        content = b''.join(response.streaming_content).decode()
+        other = User.objects.create_user(username='copy', password='testpass123')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'export.csv'
+        path.write_text(content)
+
+        call_command('import_history', str(path), user='copy', stdout=StringIO())
+
+        self.assertEqual(
+            list(SetLog.objects.filter(exercise_log__workout_log__user=other)
+                 .values_list('reps', 'weight').order_by('id')),
+            [(5, Decimal('100')), (3, Decimal('110.5')), (8, Decimal('80'))],
+        )
+
+    def test_logs_without_sets_and_log_fields_round_trip(self):
+        template = WorkoutTemplate.objects.create(user=self.user, name='Day')
+        scheduled = ScheduledWorkout.objects.create(user=self.user, template=template, scheduled_date=date(2025, 1, 10))
+        WorkoutLog.objects.create(
+            user=self.user, workout_name='Rest day', date=datetime(2025, 1, 10, 9, tzinfo=dt_timezone.utc),
+            duration_minutes=20, notes='Mobility', scheduled_workout=scheduled,
+        )
+        squat_log = ExerciseLog.objects.get(exercise=self.squat)
+        squat_log.notes = 'Belt on top sets'
+        squat_log.save()
+        ExerciseLog.objects.create(workout_log=squat_log.workout_log, exercise=self.bench, order=1)
+
+        response = self.client.get(reverse('export-history', args=['ndjson']))
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(r['workout_name'], r['exercise'], r['set_number']) for r in records], [
+            ('Heavy', 'Back Squat', 1), ('Heavy', 'Back Squat', 2), ('Heavy', 'Bench Press', None),
+            ('Session', 'Bench Press', 1), ('Rest day', None, None),
+        ])
+        self.assertEqual(
+            (records[-1]['duration_minutes'], records[-1]['workout_notes'], records[-1]['scheduled_workout']),
+            (20, 'Mobility', scheduled.pk),
+        )
+
+        for export_format in ('csv', 'ndjson'):
+            with self.subTest(export_format):
+                response = self.client.get(reverse('export-history', args=[export_format]))
+                directory = tempfile.TemporaryDirectory()
+                self.addCleanup(directory.cleanup)
+                path = Path(directory.name) / f'export.{export_format}'
+                path.write_bytes(b''.join(response.streaming_content))
+                other = User.objects.create_user(username=f'copy-{export_format}', password='testpass123')
+                call_command('import_history', str(path), user=other.username, stdout=StringIO())
+
+                logs = WorkoutLog.objects.filter(user=other).order_by('date')
+                self.assertEqual(
+                    [(log.workout_name, log.duration_minutes, log.notes, log.scheduled_workout_id) for log in logs],
+                    [('Heavy', None, '', None), ('Session', None, '', None), ('Rest day', 20, 'Mobility', None)],
+                )
+                self.assertEqual(
+                    list(ExerciseLog.objects.filter(workout_log=logs[0]).values_list('exercise__name', 'notes')),
+                    [('Back Squat', 'Belt on top sets'), ('Bench Press', '')],
+                )
+                self.assertEqual(SetLog.objects.filter(exercise_log__workout_log__user=other).count(), 3)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('export-history', args=['xml'])).status_code, 400)
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        # Several logs share a timestamp to exercise the id tie-breaker
+        for index in range(25):
+            WorkoutLog.objects.create(
+                user=self.user, workout_name=f'Log {index}',
+                date=datetime(2025, 1, 1 + index // 3, tzinfo=dt_timezone.utc),
+            )
+
+    def walk(self, url, key):
+        names, queries = [], []
+        while url:
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            queries.append([q['sql'] for q in captured.captured_queries])
+            names.extend(item['workout_name'] for item in response.data['results'])
+            url = response.data[key]
+        return names, queries
+
+    def test_pages_cover_every_log_once_in_order(self):
+        names, queries = self.walk('/api/workout-logs/?page_size=4', 'next')
+
+        expected = list(WorkoutLog.objects.order_by('-date', '-id').values_list('workout_name', flat=True))
+        self.assertEqual(names, expected)
+        self.assertEqual(len({len(page) for page in queries}), 1)
+        self.assertFalse(any('COUNT' in sql or 'OFFSET' in sql for page in queries for sql in page))
+
+    def test_previous_links_walk_back(self):
+        response = self.client.get('/api/workout-logs/?page_size=4')
+        for _ in range(3):
+            response = self.client.get(response.data['next'])
+        last_page = [item['workout_name'] for item in response.data['results']]
+
+        previous = self.client.get(response.data['previous'])
+        names, _ = self.walk(previous.data['previous'], 'previous')
+
+        expected = list(WorkoutLog.objects.order_by('-date', '-id').values_list('workout_name', flat=True))
+        self.assertEqual(last_page, expected[12:16])
+        self.assertEqual([item['workout_name'] for item in previous.data['results']], expected[8:12])
+        self.assertEqual(sorted(names), sorted(expected[:8]))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/workout-logs/?cursor=bm9wZQ')
+        self.assertEqual(response.status_code, 404)
+
+    def test_scheduled_workouts_paginate_by_date(self):
+        template = WorkoutTemplate.objects.create(user=self.user, name='Day')
+        for day in range(1, 8):
+            ScheduledWorkout.objects.create(user=self.user, template=template,
+                                            scheduled_date=date(2025, 1, day))
+
+        first = self.client.get('/api/scheduled-workouts/?page_size=5')
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual([w['scheduled_date'] for w in first.data['results']][0], '2025-01-07')
+        self.assertEqual([w['scheduled_date'] for w in second.data['results']], ['2025-01-02', '2025-01-01'])
+        self.assertIsNone(second.data['next'])
+
+
+class QueryPlanTests(TestCase):
+    @skipUnless(connection.vendor == 'sqlite', 'plans are read from SQLite output')
+    def test_endpoint_queries_use_indexes(self):
+        for name, (plan, scans) in check_query_plans(user_id=1).items():
+            with self.subTest(name):
+                self.assertEqual(scans, [], '\n'.join(plan))
+
+    def test_other_backends_are_refused(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with self.assertRaisesMessage(CommandError, 'SQLite output only'):
+                call_command('explain_queries', stdout=StringIO())
+
+    def test_full_scan_detection(self):
+        self.assertEqual(full_scans(['2 0 0 SCAN workouts_setlog']), ['workouts_setlog'])
+        self.assertEqual(full_scans(['2 0 0 SCAN workouts_setlog USING COVERING INDEX idx']), [])
+        self.assertEqual(full_scans(['3 0 0 SEARCH workouts_setlog USING INDEX idx (id=?)']), [])
+
+
+class LeaderboardTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deadlift = Exercise.objects.create(name='Deadlift', category='deadlift')
+
+    def lifter(self, user, sex='male', bodyweight='90', weights=('200', '140', '240')):
+        if isinstance(user, str):
+            user = User.objects.create_user(username=user, password='testpass123')
+        with self.captureOnCommitCallbacks(execute=True):
+            TrainingProfile.objects.update_or_create(user=user, defaults={'sex': sex, 'leaderboard_visible': True})
+            BodyweightEntry.objects.create(user=user, date=date(2025, 1, 1), weight=Decimal(bodyweight))
+        for exercise, weight in zip([self.squat, self.bench, self.deadlift], weights):
+            self.make_log(user, exercise, datetime(2025, 1, 6, tzinfo=dt_timezone.utc), [(1, weight)])
+        return user
+
+    def test_scores(self):
+        self.assertEqual(scores(700, 100, 'male'), {'wilks': 426.01, 'dots': 430.86, 'ipf_gl': 88.43})
+        self.assertEqual(scores(400, 60, 'female'), {'wilks': 445.95, 'dots': 443.42, 'ipf_gl': 90.42})
+        # Outside the fitted range, the bodyweight is clamped
+        self.assertEqual(wilks(700, 250, 'male'), wilks(700, 201.9, 'male'))
+
+    def test_entry_follows_records_and_bodyweight(self):
+        response = self.client.get(reverse('leaderboard-rank'))
+        self.assertEqual(
+            response.data['missing'], ['leaderboard_visible', 'sex', 'bodyweight', 'squat', 'bench', 'deadlift']
+        )
+
+        self.lifter(self.user)
+        entry = LeaderboardEntry.objects.get()
+        best_squat = PersonalRecord.objects.get(exercise=self.squat, kind='e1rm').value
+        self.assertEqual(entry.squat, best_squat)
+        self.assertEqual(entry.total, entry.squat + entry.bench + entry.deadlift)
+        self.assertEqual(float(entry.dots), scores(entry.total, 90, 'male')['dots'])
+
+        self.make_log(self.user, self.squat, datetime(2025, 1, 8, tzinfo=dt_timezone.utc), [(1, '210')])
+        with self.captureOnCommitCallbacks(execute=True):
+            BodyweightEntry.objects.create(user=self.user, date=date(2025, 1, 8), weight=Decimal('88'))
+        entry.refresh_from_db()
+        self.assertGreater(entry.squat, best_squat)
+        self.assertEqual(entry.bodyweight, Decimal('88'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            WorkoutLog.objects.filter(exercise_logs__exercise=self.deadlift).delete()
+        self.assertFalse(LeaderboardEntry.objects.exists())
+        self.assertEqual(self.client.get(reverse('leaderboard-rank')).data['missing'], ['deadlift'])
+
+    def test_unrealistic_sets_cannot_break_the_board(self):
+        self.lifter(self.user)
+        self.make_log(self.user, self.squat, datetime(2025, 1, 8, tzinfo=dt_timezone.utc), [(3000, '200')])
+        # A 3000-rep set is no estimate of a 1RM
+        self.assertEqual(LeaderboardEntry.objects.get().squat, PersonalRecord.objects.get(
+            exercise=self.squat, kind='e1rm',
+        ).value)
+        self.assertLess(PersonalRecord.objects.get(exercise=self.squat, kind='e1rm').value, 300)
+
+        # Scores past what the fields hold are capped, not stored as unreadable rows
+        self.lifter('giant', bodyweight='40', weights=('9000', '9000', '9000'))
+        giant = LeaderboardEntry.objects.get(user__username='giant')
+        self.assertEqual(giant.dots, Decimal('9999.99'))
+        response = self.client.get(reverse('leaderboard'), {'formula': 'dots'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['username'] for row in response.data['results']], ['giant', self.user.username])
+
+    def test_pages_and_ranks(self):
+        self.lifter(self.user, bodyweight='100')
+        self.lifter('light', bodyweight='70', weights=('180', '120', '220'))
+        self.lifter('twin-a', sex='female', bodyweight='60', weights=('120', '70', '150'))
+        self.lifter('twin-b', sex='female', bodyweight='60', weights=('120', '70', '150'))
+        self.lifter('heavy', bodyweight='120', weights=('150', '100', '180'))
+
+        entries = sorted(LeaderboardEntry.objects.select_related('user'), key=lambda entry: (-entry.dots, -entry.pk))
+        expected = [
+            (1 + sum(other.dots > entry.dots for other in entries), entry.user.username) for entry in entries
+        ]
+        self.assertEqual(len({entry.dots for entry in entries}), 4)
+
+        pages, url = [], reverse('leaderboard')
+        params = {'page_size': 2}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.data['entrants'], 5)
+            pages.append([(row['rank'], row['username']) for row in response.data['results']])
+            url, params = response.data['next'], None
+        self.assertEqual(len(pages), 3)
+        self.assertEqual([row for page in pages for row in page], expected)
+
+        # Walking back gives the same ranks
+        previous = self.client.get(response.data['previous'])
+        self.assertEqual([(row['rank'], row['username']) for row in previous.data['results']], pages[1])
+
+        self.client.force_authenticate(User.objects.get(username='twin-b'))
+        ranks = self.client.get(reverse('leaderboard-rank')).data['ranks']
+        self.assertEqual(ranks['dots'], {'rank': dict((name, rank) for rank, name in expected)['twin-b'],
+                                         'entrants': 5})
+
+    def test_users_opt_in(self):
+        self.lifter(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('profile'), {'leaderboard_visible': False})
+        self.assertFalse(response.data['leaderboard_visible'])
+        self.assertFalse(LeaderboardEntry.objects.exists())
+        self.assertEqual(entrants('dots'), 0)
+        self.assertEqual(self.client.get(reverse('leaderboard')).data['results'], [])
+        self.assertEqual(self.client.get(reverse('leaderboard-rank')).data['missing'], ['leaderboard_visible'])
+
+        out = StringIO()
+        call_command('rebuild_leaderboard', stdout=out)
+        self.assertIn('0 leaderboard entries', out.getvalue())
+
+    def test_rank_lookup_does_not_scan_the_board(self):
+        self.lifter(self.user)
+        score = LeaderboardEntry.objects.get().wilks
+        # One query for the tree nodes, one for the entries within the score's slot
+        with self.assertNumQueries(2):
+            self.assertEqual(rank_of('wilks', score), 1)
+        self.assertEqual(rank_of('wilks', score - 1), 2)
+
+    def test_deleted_user_leaves_the_ranks(self):
+        self.lifter(self.user, bodyweight='100')
+        self.lifter('light', bodyweight='70', weights=('180', '120', '220'))
+        self.lifter('heavy', bodyweight='120', weights=('150', '100', '180'))
+        self.assertEqual(entrants('dots'), 3)
+        top = LeaderboardEntry.objects.order_by('-dots').first()
+
+        top.user.delete()
+
+        self.assertEqual(entrants('dots'), 2)
+        self.assertEqual(rank_of('dots', LeaderboardEntry.objects.order_by('-dots').first().dots), 1)
+        self.assertFalse(LeaderboardCounter.objects.filter(count__lt=0).exists())
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.lifter(self.user)
+        self.lifter('other', sex='female', bodyweight='63', weights=('130', '75', '160'))
+        entries = list(LeaderboardEntry.objects.order_by('user').values('user', 'total', 'wilks', 'dots', 'ipf_gl'))
+        counters = set(LeaderboardCounter.objects.exclude(count=0).values_list('formula', 'node', 'count'))
+
+        out = StringIO()
+        call_command('rebuild_leaderboard', stdout=out)
+        self.assertIn('2 leaderboard entries', out.getvalue())
+        self.assertEqual(
+            list(LeaderboardEntry.objects.order_by('user').values('user', 'total', 'wilks', 'dots', 'ipf_gl')), entries
+        )
+        self.assertEqual(set(LeaderboardCounter.objects.values_list('formula', 'node', 'count')), counters)
+
+    def test_formula_and_bodyweight_validation(self):
+        self.assertEqual(self.client.get(reverse('leaderboard'), {'formula': 'sinclair'}).status_code, 400)
+
+        url = reverse('bodyweight-list')
+        self.assertEqual(self.client.post(url, {'date': '2025-01-01', 'weight': '82.5'}).status_code, 201)
+        self.assertEqual(self.client.post(url, {'date': '2025-01-01', 'weight': '83'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'date': '2025-01-02', 'weight': '12'}).status_code, 400)
+        other = User.objects.create_user(username='other', password='testpass123')
+        BodyweightEntry.objects.create(user=other, date=date(2025, 1, 1), weight=Decimal('70'))
+        self.assertEqual([entry['weight'] for entry in self.client.get(url).data['results']], ['82.50'])
+
+
+class ConditionalGetTests(APITestCase):
+    def test_unchanged_exercises_return_304_without_querying_the_catalog(self):
+        first = self.client.get('/api/exercises/')
+        self.assertEqual(first.status_code, 200)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/exercises/', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+
+    def test_change_invalidates_etag(self):
+        first = self.client.get('/api/exercises/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Exercise.objects.create(name='Deadlift', category='deadlift')
+        response = self.client.get('/api/exercises/', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_nested_log_changes_invalidate_log_list(self):
+        workout_log = self.make_log(self.user, self.squat, datetime(2025, 1, 6, tzinfo=dt_timezone.utc),
+                                    [(5, '100')])
+        first = self.client.get('/api/workout-logs/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SetLog.objects.filter(exercise_log__workout_log=workout_log).get().delete()
+
+        response = self.client.get('/api/workout-logs/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_is_per_user_and_per_query(self):
+        first = self.client.get('/api/workout-logs/')
+        other = User.objects.create_user(username='other', password='testpass123')
+
+        self.assertEqual(
+            self.client.get('/api/workout-logs/?page_size=5', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200
+        )
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get('/api/workout-logs/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_no_last_modified(self):
+        # Whole-second HTTP dates would answer 304 for a second write within the same second
+        with self.captureOnCommitCallbacks(execute=True):
+            template = WorkoutTemplate.objects.create(user=self.user, name='Day')
+        first = self.client.get(reverse('calendar-workouts'), {'year': 2025, 'month': 1})
+        self.assertNotIn('Last-Modified', first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ScheduledWorkout.objects.create(user=self.user, template=template, scheduled_date=date(2025, 1, 6))
+        response = self.client.get(reverse('calendar-workouts'), {'year': 2025, 'month': 1},
+                                   HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+
+    def test_concurrent_first_bumps_of_a_global_stamp(self):
+        ResourceVersion.objects.filter(user__isnull=True).delete()
+        increment = versions._increment
+
+        def created_meanwhile(user_id, resource):
+            # Another process creates the stamp between this one's update and insert
+            if not ResourceVersion.objects.filter(user__isnull=True, resource=resource).exists():
+                ResourceVersion.objects.create(resource=resource, version=1)
+                return 0
+            return increment(user_id, resource)
+
+        with mock.patch.object(versions, '_increment', side_effect=created_meanwhile):
+            bump_versions({('exercises', self.user.pk)})
+        self.assertEqual(
+            list(ResourceVersion.objects.filter(resource='exercises').values_list('version', flat=True)), [2]
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ResourceVersion.objects.create(resource='exercises')
+
+
+class SyncTests(APITestCase):
+    def sync(self, token=None, **params):
+        if token is not None:
+            params['token'] = token
+        response = self.client.get(reverse('sync'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def create_log(self):
+        payload = {
+            'workout_name': 'Heavy',
+            'date': '2025-01-06T10:00:00Z',
+            'exercise_logs': [
+                {'exercise': self.squat.pk, 'set_logs': [
+                    {'set_number': 1, 'reps': 5, 'weight': '100.00'},
+                    {'set_number': 2, 'reps': 5, 'weight': '105.00'},
+                ]},
+            ],
+        }
+        response = self.client.post('/api/workout-logs/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        return WorkoutLog.objects.get(pk=response.data['id'])
+
+    def test_first_sync_returns_everything_including_bulk_created_rows(self):
+        template = WorkoutTemplate.objects.create(user=self.user, name='Day')
+        self.create_log()
+
+        data = self.sync()
+
+        self.assertFalse(data['has_more'])
+        self.assertEqual([row['id'] for row in data['changes']['workout_templates']['updated']], [template.pk])
+        self.assertEqual(len(data['changes']['workout_logs']['updated']), 1)
+        self.assertEqual(len(data['changes']['exercise_logs']['updated']), 1)
+        self.assertEqual(len(data['changes']['set_logs']['updated']), 2)
+        self.assertEqual(self.sync(data['token'])['changes']['set_logs'], {'updated': [], 'deleted': []})
+
+    def test_updates_and_cascading_deletes_since_token(self):
+        workout_log = self.create_log()
+        token = self.sync()['token']
+
+        set_log = SetLog.objects.get(exercise_log__workout_log=workout_log, set_number=1)
+        set_log.reps = 6
+        set_log.save()
+        set_log.save()
+        data = self.sync(token)
+
+        self.assertEqual([row['reps'] for row in data['changes']['set_logs']['updated']], [6])
+        self.assertEqual(data['changes']['workout_logs']['updated'], [])
+
+        workout_log_id = workout_log.pk
+        set_ids = set(SetLog.objects.filter(exercise_log__workout_log=workout_log).values_list('pk', flat=True))
+        workout_log.delete()
+        changes = self.sync(data['token'])['changes']
+
+        self.assertEqual(changes['workout_logs']['deleted'], [workout_log_id])
+        self.assertEqual(set(changes['set_logs']['deleted']), set_ids)
+        self.assertEqual(changes['set_logs']['updated'], [])
+
+    def test_pages_through_changes(self):
+        self.create_log()
+
+        first = self.sync(limit=3)
+        second = self.sync(first['token'], limit=3)
+
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        synced = sum(len(page['changes'][key]['updated']) for page in (first, second) for key in page['changes'])
+        self.assertEqual(synced, 4)
+
+    def test_cost_follows_changes_not_history(self):
+        for _ in range(5):
+            self.create_log()
+        token = self.sync()['token']
+        WorkoutTemplate.objects.create(user=self.user, name='New')
+
+        # Change log page plus the one model that changed
+        with self.assertNumQueries(2):
+            data = self.sync(token)
+        self.assertEqual(len(data['changes']['workout_templates']['updated']), 1)
+
+    def test_other_users_changes_are_not_synced(self):
+        other = User.objects.create_user(username='other', password='testpass123')
+        WorkoutTemplate.objects.create(user=other, name='Theirs')
+
+        self.assertEqual(self.sync()['changes']['workout_templates']['updated'], [])
+
+    def test_invalid_token_or_limit(self):
+        for params in ({'token': 'abc'}, {'token': '-1'}, {'limit': 0}, {'limit': 'x'}):
+            self.assertEqual(self.client.get(reverse('sync'), params).status_code, 400)
+
+    def test_deleting_a_user_drops_their_change_log(self):
+        self.create_log()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        self.assertFalse(ChangeLog.objects.exists())
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        token_cache.reset_stats()
+        self.user = User.objects.create_user(username='lifter', password='testpass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_known_token_skips_the_database(self):
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+
+        # Only the profile's own training preferences query
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profile'))
+
+        self.assertEqual(response.data['username'], 'lifter')
+        self.assertEqual((token_cache.hits, token_cache.misses), (1, 1))
+
+    def test_logout_invalidates_token(self):
+        self.client.get(reverse('profile'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 403)
+
+    def test_deactivation_invalidates_token(self):
+        self.client.get(reverse('profile'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 403)
+
+    def test_invalid_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-token')
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 403)
+
+    def test_stats_are_admin_only(self):
+        self.assertEqual(self.client.get(reverse('auth-cache-stats')).status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = True
+            self.user.save()
+        response = self.client.get(reverse('auth-cache-stats'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_rate', response.data)
+
+    def test_lru_eviction_and_expiry(self):
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        with mock.patch('workouts.authentication.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(cache.get('c'))
+
+    def test_shared_cache_serves_other_processes(self):
+        writer = TokenCache(max_size=2, ttl=60, cache_alias='default')
+        reader = TokenCache(max_size=2, ttl=60, cache_alias='default')
+        writer.set('key', 'credentials')
+
+        self.assertEqual(reader.get('key'), 'credentials')
+        self.assertEqual(reader.shared_hits, 1)
+        # Nothing kept locally, so the reader sees the writer's invalidation at once
+        writer.invalidate('key')
+        self.assertIsNone(reader.get('key'))
+
+    def test_missing_credentials_are_forbidden(self):
+        self.client.credentials()
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('WWW-Authenticate', response)
+
+
+class EstimatorTests(TestCase):
+    def test_formulas(self):
+        weights, reps = [100, 100], [1, 10]
+        self.assertEqual(estimate(weights, reps, formula='epley').tolist(), [103.33, 133.33])
+        self.assertEqual(estimate(weights, reps, formula='brzycki').tolist(), [100.0, 133.33])
+        self.assertEqual(estimate(weights, reps, formula='lombardi').tolist(), [100.0, 125.89])
+
+    def test_rpe_uses_reps_in_reserve_and_falls_back_to_epley(self):
+        estimates = estimate([100, 100, 100], [5, 1, 5], [8, 10, None], formula='rpe').tolist()
+        # 5 reps at RPE 8 is 7 reps to failure: 81.1% of 1RM
+        self.assertEqual(estimates, [123.3, 100.0, 116.67])
+
+    def test_zero_reps(self):
+        self.assertEqual(estimate([100], [0], formula='brzycki').tolist(), [0.0])
+
+
+class StoredE1RMTests(APITestCase):
+    when = datetime(2025, 1, 6, tzinfo=dt_timezone.utc)
+
+    def test_saved_sets_store_the_owners_formula(self):
+        TrainingProfile.objects.create(user=self.user, e1rm_formula='brzycki')
+        self.make_log(self.user, self.squat, self.when, [(10, '100')])
+
+        self.client.post('/api/workout-logs/', {
+            'workout_name': 'Nested', 'date': '2025-01-07T10:00:00Z',
+            'exercise_logs': [{'exercise': self.squat.pk, 'set_logs': [
+                {'set_number': 1, 'reps': 10, 'weight': '100'},
+            ]}],
+        }, format='json')
+
+        self.assertEqual(list(SetLog.objects.values_list('e1rm', flat=True)), [133.33, 133.33])
+        self.assertEqual(SetLog.objects.order_by('-e1rm').first().estimated_1rm, 133.33)
+
+    def test_changing_formula_recomputes_sets_and_summaries(self):
+        self.make_log(self.user, self.squat, self.when, [(10, '100')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('profile'), {'e1rm_formula': 'lombardi'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['e1rm_formula'], 'lombardi')
+        self.assertEqual(SetLog.objects.get().e1rm, 125.89)
+        self.assertEqual(DailyExerciseSummary.objects.get().best_e1rm, 125.89)
+
+    def test_recomputed_estimates_reach_delta_sync(self):
+        self.make_log(self.user, self.squat, self.when, [(10, '100')])
+        token = self.client.get(reverse('sync')).data['token']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('profile'), {'e1rm_formula': 'lombardi'}, format='json')
+        changes = self.client.get(reverse('sync'), {'token': token}).data['changes']
+
+        self.assertEqual([row['e1rm'] for row in changes['set_logs']['updated']], [125.89])
+
+    def test_unknown_formula_is_rejected(self):
+        response = self.client.patch(reverse('profile'), {'e1rm_formula': 'guess'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_backfill_command_fills_missing_estimates(self):
+        self.make_log(self.user, self.squat, self.when, [(5, '100'), (3, '110')])
+        SetLog.objects.update(e1rm=None)
+        etag = self.client.get('/api/workout-logs/')['ETag']
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('backfill_e1rm', '--missing', '--batch-size', '1', stdout=out)
+
+        self.assertEqual(sorted(SetLog.objects.values_list('e1rm', flat=True)), [116.67, 121.0])
+        self.assertIn('Stored 2 estimates', out.getvalue())
+        # Cached log lists showing the old estimates go stale
+        self.assertEqual(self.client.get('/api/workout-logs/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class PersonalRecordTests(APITestCase):
+    def log(self, day, sets, exercise=None):
+        payload = {
+            'workout_name': 'Session',
+            'date': f'2025-01-{day:02d}T10:00:00Z',
+            'exercise_logs': [{'exercise': (exercise or self.squat).pk, 'set_logs': [
+                {'set_number': number, 'reps': reps, 'weight': weight}
+                for number, (reps, weight) in enumerate(sets, start=1)
+            ]}],
+        }
+        response = self.client.post('/api/workout-logs/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def board(self):
+        return {entry['exercise_name']: entry for entry in self.client.get(reverse('personal-records')).data['exercises']}
+
+    def test_create_response_lists_new_records(self):
+        first = self.log(6, [(5, '100'), (3, '110')])
+        second = self.log(7, [(5, '105'), (3, '100')])
+
+        self.assertEqual(
+            {(r['kind'], r['reps']) for r in first.data['new_records']},
+            {('rep_max', 5), ('rep_max', 3), ('e1rm', 0), ('tonnage', 0)},
+        )
+        self.assertEqual(
+            {(r['kind'], r['reps'], r['value']) for r in second.data['new_records']},
+            {('rep_max', 5, '105.00'), ('e1rm', 0, '122.50')},
+        )
+        self.assertEqual(second.data['new_records'][0]['exercise_name'], 'Back Squat')
+
+    def test_board_is_one_query(self):
+        self.log(6, [(5, '100'), (1, '140')])
+        self.log(6, [(8, '60')], exercise=self.bench)
+
+        with self.assertNumQueries(1):
+            board = self.board()
+
+        squat = board['Back Squat']
+        self.assertEqual(set(squat['rep_maxes']), {'1', '5'})
+        self.assertEqual(squat['rep_maxes']['1']['value'], Decimal('140.00'))
+        self.assertEqual(squat['tonnage']['value'], Decimal('640.00'))
+        self.assertEqual(board['Bench Press']['e1rm']['value'], Decimal('76.00'))
+
+    def test_deleting_the_record_set_recomputes(self):
+        self.log(6, [(5, '100')])
+        best = self.log(7, [(5, '120')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SetLog.objects.get(pk=best.data['exercise_logs'][0]['set_logs'][0]['id']).delete()
+
+        record = PersonalRecord.objects.get(kind='rep_max', reps=5)
+        self.assertEqual(record.value, Decimal('100.00'))
+        self.assertEqual(record.achieved_at.day, 6)
+
+    def test_completing_a_scheduled_workout_reports_records(self):
+        template = WorkoutTemplate.objects.create(user=self.user, name='Day')
+        scheduled = ScheduledWorkout.objects.create(user=self.user, template=template, scheduled_date=date(2025, 1, 6))
+
+        response = self.client.post(reverse('complete-workout', args=[scheduled.pk]), {'workout_log': {
+            'exercise_logs': [{'exercise': self.squat.pk, 'set_logs': [{'set_number': 1, 'reps': 1, 'weight': '150'}]}],
+        }}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(('rep_max', 1), {(r['kind'], r['reps']) for r in response.data['new_records']})
+
+    def test_rebuild_matches_incremental_records(self):
+        self.log(6, [(5, '100'), (3, '110')])
+        self.log(7, [(5, '105'), (12, '60')])
+        self.log(8, [(8, '70')], exercise=self.bench)
+        incremental = set(PersonalRecord.objects.values_list('exercise', 'kind', 'reps', 'value', 'workout_log'))
+
+        call_command('rebuild_records', stdout=StringIO())
+
+        rebuilt = set(PersonalRecord.objects.values_list('exercise', 'kind', 'reps', 'value', 'workout_log'))
+        self.assertEqual(rebuilt, incremental)
+
+
+class TrainingLoadTests(APITestCase):
+    url = reverse('analytics-training-load')
+
+    def test_rolling_mean_counts_missing_history_as_zero(self):
+        self.assertEqual(rolling_mean(np.array([7.0, 0, 7, 0]), 2).tolist(), [3.5, 3.5, 3.5, 3.5])
+
+    def test_report(self):
+        self.make_log(self.user, self.squat, datetime(2025, 1, 6, 9, tzinfo=dt_timezone.utc), [(5, '100'), (5, '80')])
+        self.make_log(self.user, self.bench, datetime(2025, 1, 8, 9, tzinfo=dt_timezone.utc), [(5, '50')])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'start_date': '2025-01-06', 'end_date': '2025-01-12'})
+
+        self.assertEqual(response.status_code, 200)
+        daily = response.data['daily']
+        self.assertEqual([day['load'] for day in daily], [900.0, 0.0, 250.0, 0.0, 0.0, 0.0, 0.0])
+        self.assertEqual(daily[-1]['acute'], round(1150 / 7, 2))
+        self.assertEqual(daily[-1]['chronic'], round(1150 / 28, 2))
+        self.assertEqual(daily[-1]['acwr'], 4.0)
+
+        week = response.data['weekly'][0]
+        self.assertEqual(week['week_start'], date(2025, 1, 6))
+        self.assertEqual(week['tonnage'], {'squat': 900.0, 'bench': 250.0, 'deadlift': 0.0, 'accessory': 0.0, 'total': 1150.0})
+        loads = np.array([900, 0, 250, 0, 0, 0, 0])
+        self.assertEqual(week['monotony'], round(loads.mean() / loads.std(), 2))
+
+        # 100 and 50 are ~86% of their e1RMs, 80 is ~69%
+        self.assertEqual(response.data['intensity']['sets'], [0, 1, 0, 2, 0])
+
+    def test_unknown_categories_are_skipped(self):
+        self.make_log(self.user, self.squat, datetime(2025, 1, 6, 9, tzinfo=dt_timezone.utc), [(5, '100')])
+        odd = Exercise.objects.create(name='Sled Push', category='conditioning')
+        self.make_log(self.user, odd, datetime(2025, 1, 7, 9, tzinfo=dt_timezone.utc), [(5, '100')])
+
+        response = self.client.get(self.url, {'start_date': '2025-01-06', 'end_date': '2025-01-12'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['weekly'][0]['tonnage']['total'], 500.0)
+
+    def test_rest_weeks_have_no_monotony(self):
+        response = self.client.get(self.url, {'start_date': '2025-01-06', 'end_date': '2025-01-19'})
+        self.assertEqual([week['monotony'] for week in response.data['weekly']], [None, None])
+        self.assertIsNone(response.data['daily'][0]['acwr'])
+
+    def test_invalid_range(self):
+        response = self.client.get(self.url, {'start_date': '2025-02-01', 'end_date': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_training_load', '--years', '1', '--repeat', '1', stdout=out)
+        self.assertIn('365 days', out.getvalue())
+
+
+class SparseFieldsetTests(APITestCase):
+    """?fields= and ?expand= narrow nested reads and the queries behind them"""
+
+    def setUp(self):
+        super().setUp()
+        self.log = self.make_log(self.user, self.squat, datetime(2025, 1, 6, 9, tzinfo=dt_timezone.utc),
+                                 [(5, '100'), (3, '110')], name='Heavy')
+        self.make_log(self.user, self.bench, datetime(2025, 1, 8, 9, tzinfo=dt_timezone.utc), [(8, '80')])
+        with self.captureOnCommitCallbacks(execute=True):
+            template = WorkoutTemplate.objects.create(user=self.user, name='Heavy')
+            TemplateExercise.objects.create(template=template, exercise=self.squat,
+                                            target_sets=5, target_reps=5, order=0)
+            for day in (6, 8, 10):
+                ScheduledWorkout.objects.create(user=self.user, template=template,
+                                                scheduled_date=date(2025, 1, day))
+
+    def test_nested_paths(self):
+        url = reverse('workout-logs-detail', args=[self.log.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                url, {'fields': 'date,exercise_logs.set_logs.reps,exercise_logs.set_logs.weight'}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'date': '2025-01-06T09:00:00Z',
+            'exercise_logs': [{'set_logs': [{'reps': 5, 'weight': '100.00'}, {'reps': 3, 'weight': '110.00'}]}],
+        })
+        reads = [query['sql'] for query in queries.captured_queries if 'workout_log' in query['sql']]
+        self.assertFalse(any('auth_user' in sql or 'workout_name' in sql or 'e1rm' in sql for sql in reads))
+
+    def test_unrequested_levels_are_not_queried(self):
+        full = self.client.get(reverse('workout-logs-list'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('workout-logs-list'), {'fields': 'id,workout_name'})
+
+        self.assertEqual([log['workout_name'] for log in response.json()['results']], ['Session', 'Heavy'])
+        self.assertEqual(list(response.json()['results'][0]), ['id', 'workout_name'])
+        self.assertFalse(any('setlog' in query['sql'] or 'exerciselog' in query['sql']
+                             for query in queries.captured_queries))
+        # Pagination still orders and pages on the date the response leaves out
+        self.assertEqual(response.json()['next'] is None, full.json()['next'] is None)
+
+    def test_expand(self):
+        response = self.client.get(reverse('workout-logs-detail', args=[self.log.pk]),
+                                   {'fields': 'id,exercise_logs.order', 'expand': 'exercise_logs.set_logs'})
+        exercise_log = response.json()['exercise_logs'][0]
+        self.assertEqual(list(exercise_log), ['set_logs', 'order'])
+        self.assertEqual(len(exercise_log['set_logs'][0]), len(SetLogSerializer().fields))
+
+        full = self.client.get(reverse('workout-logs-detail', args=[self.log.pk]), {'fields': 'exercise_logs'})
+        self.assertEqual(full.json()['exercise_logs'], self.client.get(
+            reverse('workout-logs-detail', args=[self.log.pk])).json()['exercise_logs'])
+
+    def test_unknown_fields(self):
+        for fields in ['date,nope', 'date.year', 'exercise_logs.set_logs.nope']:
+            response = self.client.get(reverse('workout-logs-list'), {'fields': fields})
+            self.assertEqual(response.status_code, 400, fields)
+            self.assertIn('error', response.json())
+
+    def test_scheduled_template_details(self):
+        response = self.client.get(reverse('scheduled-workouts-list'),
+                                   {'fields': 'scheduled_date,template_details.name', 'page_size': 2})
+        self.assertEqual(response.json()['results'], [
+            {'scheduled_date': '2025-01-10', 'template_details': {'name': 'Heavy'}},
+            {'scheduled_date': '2025-01-08', 'template_details': {'name': 'Heavy'}},
+        ])
+        following = self.client.get(response.json()['next'])
+        self.assertEqual(following.json()['results'],
+                         [{'scheduled_date': '2025-01-06', 'template_details': {'name': 'Heavy'}}])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('scheduled-workouts-list'), {'fields': 'scheduled_date'})
+        self.assertFalse(any('workouttemplate' in query['sql'] or 'templateexercise' in query['sql']
+                             for query in queries.captured_queries))
+
+    def test_async_views_match(self):
+        token = Token.objects.create(user=self.user)
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        for url, params in [
+            (reverse('workout-logs-list'), {'fields': 'date,exercise_logs.set_logs.reps'}),
+            (reverse('workout-logs-detail', args=[self.log.pk]), {'fields': 'id', 'expand': 'exercise_logs'}),
+            (reverse('workout-logs-list'), {'fields': 'nope'}),
+        ]:
+            sync_response = self.client.get(url, params)
+            with self.settings(ROOT_URLCONF='django_project.asgi_urls'):
+                async_response = self.client.get(url, params)
+            self.assertEqual(async_response.status_code, sync_response.status_code)
+            self.assertEqual(async_response.content, sync_response.content)
+
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        for week in range(10):
+            self.make_log(self.user, self.squat, datetime(2025, 1, 6 + week, 9, tzinfo=dt_timezone.utc),
+                          [(5, '100')] * 5)
+        self.url = reverse('workout-logs-list')
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip, deflate, br;q=1.0'), {'gzip', 'deflate', 'br'})
+        self.assertEqual(accepted_encodings('br;q=0, GZIP;q=0.5'), {'gzip'})
+        self.assertEqual(accepted_encodings(''), set())
+
+    def test_gzip(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=1.0, br;q=0')
+
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertIn('compress;dur=', response['Server-Timing'])
+
+    @mock.patch('workouts.compression.brotli', None)
+    def test_gzip_without_brotli(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    @skipUnless(brotli, 'brotli is not installed')
+    def test_brotli(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_small_responses_are_sent_as_is(self):
+        response = self.client.get(reverse('workout-logs-list'), {'fields': 'id', 'page_size': 1},
+                                   HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertNotIn('Content-Encoding', response)
+
+        with self.settings(RESPONSE_COMPRESSION={'MIN_SIZE': 10 ** 6}):
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_compressed_and_not_modified_responses_share_the_etag(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], plain['ETag'])
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        revalidated = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+
+
+class RequestTimingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        request_stats.reset()
+        day = datetime(2025, 1, 6, 9, tzinfo=dt_timezone.utc)
+        for week in range(3):
+            self.make_log(self.user, self.squat, day.replace(day=6 + week * 7), [(5, '100'), (5, '105')])
+
+    def server_timing(self, response):
+        metrics = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, *params = metric.split(';')
+            metrics[name] = dict(param.split('=', 1) for param in params)
+        return metrics
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('workout-logs-list'))
+
+        metrics = self.server_timing(response)
+        self.assertEqual(list(metrics), ['db', 'serialize', 'render', 'compress', 'app', 'total'])
+        self.assertEqual(metrics['db']['desc'], f'"{len(queries)} queries"')
+        self.assertGreater(float(metrics['serialize']['dur']), 0)
+        self.assertGreater(float(metrics['render']['dur']), 0)
+        self.assertGreaterEqual(
+            float(metrics['total']['dur']),
+            sum(float(metrics[name]['dur']) for name in ['db', 'serialize', 'render']),
+        )
+
+    def test_header_can_be_turned_off(self):
+        with self.settings(REQUEST_TIMING={'SERVER_TIMING_HEADER': False}):
+            response = self.client.get(reverse('workout-logs-list'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_async_views_are_timed_under_the_same_endpoint(self):
+        with self.settings(ROOT_URLCONF='django_project.asgi_urls'):
+            response = self.client.get(reverse('workout-logs-list'))
+        self.assertGreater(float(self.server_timing(response)['render']['dur']), 0)
+        self.assertIn('GET workout-logs-list', request_stats.snapshot()['endpoints'])
+
+    def test_slow_requests_are_logged_with_repeated_statements(self):
+        with self.settings(REQUEST_TIMING={'SLOW_REQUEST_MS': 0}):
+            with self.assertLogs('workouts.instrumentation', 'WARNING') as logs:
+                self.client.get(reverse('workout-logs-list'))
+        self.assertIn('GET workout-logs-list', logs.output[0])
+        self.assertIn('1x', logs.output[0])
+
+        timings = RequestTimings()
+        for sql in ['SELECT a', 'SELECT b', 'SELECT b']:
+            timings.add_query(sql, 0.001)
+        self.assertEqual([sql for _, _, sql in timings.top_statements(1)], ['SELECT b'])
+
+    def test_only_the_apps_serializers_are_timed(self):
+        self.assertFalse(hasattr(drf_serializers.Serializer.data.fget, 'timed'))
+        self.assertIsInstance(WorkoutLogSerializer(many=True), TimedListSerializer)
+        self.assertNotIsInstance(drf_serializers.ListSerializer(child=drf_serializers.IntegerField()),
+                                 TimedListSerializer)
+
+        timings = RequestTimings()
+        with mock.patch('workouts.instrumentation._current') as current:
+            current.get.return_value = timings
+            WorkoutLogSerializer(WorkoutLog.objects.all(), many=True).data
+        self.assertGreater(timings.seconds['serialize'], 0)
+
+    def test_endpoint_histograms(self):
+        for _ in range(3):
+            self.client.get(reverse('workout-logs-list'))
+        self.client.get(reverse('calendar-workouts'))
+
+        stats = self.client.get(reverse('request-stats'))
+        self.assertEqual(stats.status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        endpoints = self.client.get(reverse('request-stats')).data['endpoints']
+        logs = endpoints['GET workout-logs-list']
+        self.assertEqual(logs['count'], 3)
+        self.assertEqual(sum(logs['buckets']), 3)
+        self.assertGreater(logs['queries'], 0)
+        self.assertLessEqual(logs['p50_ms'], logs['max_ms'])
+        self.assertEqual(endpoints['GET calendar-workouts']['count'], 1)
+        self.assertEqual(endpoints['GET request-stats']['count'], 1)
+
+    def test_histogram_percentile(self):
+        buckets = [0] * (len(BUCKETS_MS) + 1)
+        buckets[0], buckets[3], buckets[-1] = 90, 9, 1
+        self.assertEqual(histogram_percentile(buckets, 0.5, 8000), BUCKETS_MS[0])
+        self.assertEqual(histogram_percentile(buckets, 0.95, 8000), BUCKETS_MS[3])
+        self.assertEqual(histogram_percentile(buckets, 1.0, 8000), 8000)
+
+
+class BenchmarkTests(TestCase):
+    def test_regressions(self):
+        def run(p95, queries, size):
+            return {'endpoints': {'calendar': {'p95_ms': p95, 'queries': queries, 'bytes': size, 'errors': 0}}}
+
+        self.assertEqual(regressions(run(20, 3, 1000), run(24, 3, 1100)), [])
+        self.assertEqual(regressions(run(20, 3, 1000), run(40, 4, 2000)), [
+            'calendar: p95 20 -> 40 ms', 'calendar: queries 3 -> 4', 'calendar: payload 1000 -> 2000 bytes',
+        ])
+        # Sub-millisecond endpoints double on noise alone
+        self.assertEqual(regressions(run(1, 3, 1000), run(3, 3, 1000)), [])
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    """benchmark_api against a configured file database, in a subprocess like the SQLite profile tests"""
+
+    def manage(self, *args):
+        env = {**os.environ, 'REPCURVE_DB_PATH': self.path}
+        return subprocess.run(
+            [sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, timeout=120,
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.path = str(self.directory / 'db.sqlite3')
+
+    def shell(self, code):
+        result = self.manage('shell', '-c', f'from django.contrib.auth.models import User; {code}')
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout
+
+    def test_benchmark_api_writes_results_without_touching_the_database(self):
+        self.assertEqual(self.manage('migrate', '-v0').returncode, 0)
+        self.shell('User.objects.create(username="bench-presser")')
+
+        output = self.directory / 'results.json'
+        result = self.manage(
+            'benchmark_api', '--users', '1', '--years', '0.1', '--requests', '3', '--concurrency', '1',
+            '--endpoint', 'health', '--endpoint', 'calendar', '--endpoint', 'workout-log', '--output', str(output),
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        results = json.loads(output.read_text())
+
+        # Seeded in a temporary database, removed afterwards
+        self.assertIn("['bench-presser']", self.shell('print(list(User.objects.values_list("username", flat=True)))'))
+        self.assertEqual(sorted(path.name for path in self.directory.iterdir()), ['db.sqlite3', 'results.json'])
+        self.assertEqual(results['meta']['users'], 1)
+        endpoints = results['endpoints']
+        self.assertEqual(set(endpoints), {
+            'health', 'calendar', 'calendar-compact', 'calendar-quarter', 'workout-log-list',
+            'workout-log-detail', 'workout-log-create', 'workout-log-batch',
+        })
+        for name, result in endpoints.items():
+            self.assertEqual(result['errors'], 0, (name, result['statuses']))
+            self.assertEqual(result['requests'], 3)
+        self.assertEqual(endpoints['health']['queries'], 0)
+        self.assertGreater(endpoints['workout-log-list']['bytes'], endpoints['health']['bytes'])
+
+
+class SQLiteProductionProfileTests(SimpleTestCase):
+    """Parallel writers and readers on a file database in the production profile.
+
+    Runs in a subprocess: the test database is in memory and settings are
+    read once per process.
+    """
+
+    def manage(self, *args, profile='production', shared_cache='redis://127.0.0.1:6379/0'):
+        # The shared cache is only configured: these commands never authenticate a token
+        env = {**os.environ, 'REPCURVE_DB_PROFILE': profile, 'REPCURVE_DB_PATH': self.path,
+               'REPCURVE_SHARED_CACHE': shared_cache or ''}
+        return subprocess.run(
+            [sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, timeout=120,
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = str(Path(directory.name) / 'db.sqlite3')
+
+    def test_parallel_writers_and_readers(self):
+        self.assertEqual(self.manage('migrate', '-v0').returncode, 0)
+
+        result = self.manage('stress_sqlite', '--writers', '4', '--readers', '4', '--seconds', '2')
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('journal_mode=wal', result.stdout)
+        self.assertIn(' 0 lock errors', result.stdout)
+
+    def test_production_needs_a_shared_token_cache(self):
+        result = self.manage('check', shared_cache=None)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('REPCURVE_SHARED_CACHE', result.stderr)
@@ -0,0 +1,209 @@
+"""Training-load metrics over dense per-day NumPy arrays.
+
+A user's sets are read once into a TrainingHistory: a (category, day)
+tonnage matrix plus flat per-set arrays. Every metric is then a handful of
+vectorized operations over those arrays, whatever the length of the history.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import F
+from django.db.models.functions import TruncDate
+from .models import Exercise, SetLog
+
+
+CATEGORIES = [value for value, _ in Exercise._meta.get_field('category').choices]
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+
+# Lower bounds of the intensity zones, as a share of the running best e1RM
+INTENSITY_BOUNDS = np.array([0.0, 0.6, 0.7, 0.8, 0.9])
+INTENSITY_ZONES = ['<60%', '60-70%', '70-80%', '80-90%', '90%+']
+
+
+class TrainingHistory:
+    """A user's sets as arrays indexed by day offset from first_day"""
+
+    def __init__(self, first_day, days, set_days, set_categories, set_exercises, reps, weights, e1rms):
+        self.first_day = first_day
+        self.days = days
+        self.set_days = set_days
+        self.set_categories = set_categories
+        self.set_exercises = set_exercises
+        self.reps = reps
+        self.weights = weights
+        self.e1rms = e1rms
+
+        # Tonnage per category and day, with rest days as zeros
+        self.tonnage = np.zeros((len(CATEGORIES), days))
+        np.add.at(self.tonnage, (set_categories, set_days), reps * weights)
+
+    @staticmethod
+    def _rows(user_id, end_date):
+        return (
+            SetLog.objects.filter(exercise_log__workout_log__user_id=user_id)
+            .annotate(day=TruncDate('exercise_log__workout_log__date'))
+            .filter(day__lte=end_date)
+            .values_list('day', F('exercise_log__exercise__category'), 'exercise_log__exercise_id',
+                         'reps', 'weight', 'e1rm')
+        )
+
+    @classmethod
+    def from_database(cls, user_id, start_date, end_date):
+        """Load every set up to end_date with one values() query.
+
+        Earlier sets are included too: rolling windows and running bests need
+        the history before start_date.
+        """
+        return cls.from_rows(list(cls._rows(user_id, end_date)), start_date, end_date)
+
+    @classmethod
+    async def afrom_database(cls, user_id, start_date, end_date):
+        return cls.from_rows([row async for row in cls._rows(user_id, end_date)], start_date, end_date)
+
+    @classmethod
+    def from_rows(cls, rows, start_date, end_date):
+        category_index = {category: index for index, category in enumerate(CATEGORIES)}
+        # Sets of exercises saved with a category outside the choices have no tonnage row
+        rows = [row for row in rows if row[1] in category_index]
+        days, categories, exercises, reps, weights, e1rms = zip(*rows) if rows else ([],) * 6
+        first_day = min(start_date, min(days)) if days else start_date
+        offsets = np.array([(day - first_day).days for day in days], dtype=np.int64)
+        return cls(
+            first_day,
+            (end_date - first_day).days + 1,
+            offsets,
+            np.array([category_index[category] for category in categories], dtype=np.int64),
+            np.array(exercises, dtype=np.int64),
+            np.array(reps, dtype=np.float64),
+            np.array(weights, dtype=np.float64),
+            # Sets not backfilled yet have no stored estimate; they count as unknown intensity
+            np.array(e1rms, dtype=np.float64),
+        )
+
+    def day_offset(self, day):
+        return (day - self.first_day).days
+
+
+def rolling_mean(values, window):
+    """Trailing mean over window days, counting days before the history as zero"""
+    totals = np.cumsum(np.concatenate([[0.0], values]))
+    starts = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+    return (totals[1:] - totals[starts]) / window
+
+
+def acute_chronic(load):
+    """(acute, chronic, ratio) arrays from a daily load series; ratio is NaN with no chronic load"""
+    acute = rolling_mean(load, ACUTE_DAYS)
+    chronic = rolling_mean(load, CHRONIC_DAYS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(chronic > 0, acute / chronic, np.nan)
+    return acute, chronic, ratio
+
+
+def weekly_blocks(daily, first, stop):
+    """Daily values (last axis) on day offsets [first, stop) as (..., weeks, 7).
+
+    first is the offset of a Monday. Days before the history and after stop
+    (the rest of a partial last week) count as zero.
+    """
+    block = daily[..., max(first, 0):stop]
+    padding = [(0, 0)] * (daily.ndim - 1) + [(max(-first, 0), -(stop - first) % 7)]
+    padded = np.pad(block, padding)
+    return padded.reshape(*daily.shape[:-1], -1, 7)
+
+
+def monotony_strain(weeks):
+    """Foster monotony (mean / SD of daily load) and strain (weekly load x monotony).
+
+    NaN for weeks whose daily loads do not vary, where monotony is undefined.
+    """
+    mean = weeks.mean(axis=-1)
+    deviation = weeks.std(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        monotony = np.where(deviation > 0, mean / deviation, np.nan)
+    return monotony, weeks.sum(axis=-1) * monotony
+
+
+def running_best(exercises, values):
+    """Best value so far per exercise, for sets already ordered by day"""
+    order = np.lexsort((np.arange(len(exercises)), exercises))
+    sorted_values = np.nan_to_num(values[order], nan=0.0)
+    # Offset each exercise above the previous so one accumulate never crosses groups
+    groups = np.cumsum(np.concatenate([[0], np.diff(exercises[order]) != 0]))
+    offset = groups * (sorted_values.max(initial=0) + 1)
+    best = np.empty_like(sorted_values)
+    best[order] = np.maximum.accumulate(sorted_values + offset) - offset
+    return best
+
+
+def intensity_distribution(history, start, stop):
+    """Sets and reps per intensity zone for sets on day offsets [start, stop)"""
+    by_day = np.argsort(history.set_days, kind='stable')
+    best = np.empty_like(history.e1rms)
+    best[by_day] = running_best(history.set_exercises[by_day], history.e1rms[by_day])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        intensity = history.weights / best
+    in_window = (history.set_days >= start) & (history.set_days < stop) & (best > 0)
+    zones = np.searchsorted(INTENSITY_BOUNDS, intensity[in_window], side='right') - 1
+    zone_count = len(INTENSITY_ZONES)
+    return {
+        'zones': INTENSITY_ZONES,
+        'sets': np.bincount(zones, minlength=zone_count).tolist(),
+        'reps': np.bincount(zones, weights=history.reps[in_window], minlength=zone_count).astype(int).tolist(),
+    }
+
+
+def _rounded(values):
+    """Array as a list rounded to 2 decimals, with NaN as None"""
+    return [None if value != value else value for value in np.round(values, 2).tolist()]
+
+
+def training_load_report(history, start_date, end_date):
+    """ACWR per day, tonnage, monotony and strain per week and the intensity
+    distribution between two dates (inclusive), from one loaded history.
+
+    Daily load is total tonnage across categories; windows reach back before
+    start_date, so the first days are not biased towards zero.
+    """
+    load = history.tonnage.sum(axis=0)
+    acute, chronic, ratio = acute_chronic(load)
+
+    start = history.day_offset(start_date)
+    stop = history.day_offset(end_date) + 1
+
+    # Whole weeks, starting on the Monday on or before start_date
+    monday = start_date - timedelta(days=start_date.weekday())
+    weeks = weekly_blocks(history.tonnage, history.day_offset(monday), stop)
+    category_weeks = weeks.sum(axis=-1)
+    monotony, strain = monotony_strain(weeks.sum(axis=0))
+
+    window = slice(start, stop)
+    daily = [
+        {'date': start_date + timedelta(days=index), 'load': day_load, 'acute': day_acute,
+         'chronic': day_chronic, 'acwr': day_ratio}
+        for index, (day_load, day_acute, day_chronic, day_ratio) in enumerate(zip(
+            _rounded(load[window]), _rounded(acute[window]), _rounded(chronic[window]), _rounded(ratio[window])
+        ))
+    ]
+
+    tonnage = dict(zip(CATEGORIES, (_rounded(row) for row in category_weeks)))
+    tonnage['total'] = _rounded(category_weeks.sum(axis=0))
+    weekly = [
+        {
+            'week_start': monday + timedelta(weeks=week),
+            'tonnage': {category: values[week] for category, values in tonnage.items()},
+            'monotony': week_monotony,
+            'strain': week_strain,
+        }
+        for week, (week_monotony, week_strain) in enumerate(zip(_rounded(monotony), _rounded(strain)))
+    ]
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'daily': daily,
+        'weekly': weekly,
+        'intensity': intensity_distribution(history, start, stop),
+    }
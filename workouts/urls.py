@@ -8,6 +8,7 @@ router.register(r'exercises', views.ExerciseViewSet)
 router.register(r'workout-templates', views.WorkoutTemplateViewSet, basename='workout-templates')
 router.register(r'scheduled-workouts', views.ScheduledWorkoutViewSet, basename='scheduled-workouts')
 router.register(r'workout-logs', views.WorkoutLogViewSet, basename='workout-logs')
+router.register(r'bodyweight', views.BodyweightEntryViewSet, basename='bodyweight')
 
 urlpatterns = [
     # API Documentation
@@ -24,6 +25,8 @@ urlpatterns = [
     path('auth/login/', views.login, name='login'),
     path('auth/logout/', views.logout, name='logout'),
     path('auth/profile/', views.profile, name='profile'),
+    path('auth/cache-stats/', views.auth_cache_stats, name='auth-cache-stats'),
+    path('stats/requests/', views.request_timing_stats, name='request-stats'),
     
     # Calendar view
     path('calendar/', views.calendar_workouts, name='calendar-workouts'),
@@ -31,6 +34,19 @@ urlpatterns = [
     # Complete workout
     path('scheduled-workouts/<int:pk>/complete/', views.complete_scheduled_workout, name='complete-workout'),
     
+    # Analytics
+    path('analytics/e1rm/', views.e1rm_progress_view, name='analytics-e1rm'),
+    path('analytics/training-load/', views.training_load_view, name='analytics-training-load'),
+    path('records/', views.personal_records, name='personal-records'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
+    path('leaderboard/me/', views.leaderboard_rank, name='leaderboard-rank'),
+    
+    # Export
+    path('export/<str:export_format>/', views.export_history, name='export-history'),
+    
+    # Delta sync
+    path('sync/', views.sync_changes, name='sync'),
+    
     # Include router URLs
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,85 @@
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .deferred import OnCommitBatch
+from .models import ResourceVersion
+
+
+# Resources whose stamp is shared by every user (user is null)
+GLOBAL_RESOURCES = {'exercises'}
+
+
+def bump_versions(changes):
+    """Increment the stamps for a set of (resource, user_id) pairs"""
+    for resource, user_id in changes:
+        user_id = None if resource in GLOBAL_RESOURCES else user_id
+        if _increment(user_id, resource):
+            continue
+        try:
+            with transaction.atomic():
+                ResourceVersion.objects.create(user_id=user_id, resource=resource, version=1)
+        except IntegrityError:
+            # A concurrent first write created the stamp; count this change on top of it
+            _increment(user_id, resource)
+
+
+def _increment(user_id, resource):
+    return ResourceVersion.objects.filter(user_id=user_id, resource=resource).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+
+
+# Stamps are bumped after commit, so a validator never runs ahead of the data it covers
+pending_versions = OnCommitBatch(bump_versions)
+mark_changed = pending_versions.add
+
+
+def _versions_query(user_id, resources):
+    return ResourceVersion.objects.filter(
+        Q(user_id=user_id) | Q(user__isnull=True), resource__in=resources
+    ).values_list('resource', 'user_id', 'version', 'updated_at')
+
+
+def _own_versions(rows):
+    return {
+        resource: (version, updated_at)
+        for resource, owner, version, updated_at in rows
+        if (owner is None) == (resource in GLOBAL_RESOURCES)
+    }
+
+
+def current_versions(user_id, resources):
+    """{resource: (version, updated_at)} for the stamps covering a response"""
+    return _own_versions(_versions_query(user_id, resources))
+
+
+async def acurrent_versions(user_id, resources):
+    return _own_versions([row async for row in _versions_query(user_id, resources)])
+
+
+def _etag(request, resources, versions):
+    parts = [str(request.user.pk), request.get_full_path()]
+    parts += [f'{resource}:{versions.get(resource, (0, None))[0]}' for resource in sorted(resources)]
+    # Weak: the tag names the data, not the bytes, so plain and compressed
+    # 200s and the 304 all carry the same validator
+    return 'W/"%s"' % hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def resource_etag(request, resources, versions=None):
+    """ETag for a GET that depends on the given resources.
+
+    The tag covers the user, the full path with its query string and every
+    stamp, so a new page, filter or change yields a new tag without any of
+    the response being built. Pass versions when they were already read.
+    """
+    if versions is None:
+        versions = current_versions(request.user.pk, resources)
+    return _etag(request, resources, versions)
+
+
+async def aresource_etag(request, resources, versions=None):
+    if versions is None:
+        versions = await acurrent_versions(request.user.pk, resources)
+    return _etag(request, resources, versions)
@@ -1,20 +1,41 @@
 from rest_framework import generics, status, viewsets
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import date, timedelta
 from .models import (
     Exercise, WorkoutTemplate, TemplateExercise, 
-    ScheduledWorkout, WorkoutLog, ExerciseLog, SetLog
+    ScheduledWorkout, WorkoutLog, ExerciseLog, SetLog, TrainingProfile, PersonalRecord,
+    BodyweightEntry, LeaderboardEntry
 )
 from .serializers import (
-    UserRegistrationSerializer, UserSerializer, LoginSerializer,
+    UserRegistrationSerializer, UserSerializer, LoginSerializer, TrainingProfileSerializer,
     ExerciseSerializer, WorkoutTemplateSerializer, ScheduledWorkoutSerializer,
-    WorkoutLogSerializer, WorkoutLogCreateSerializer
+    WorkoutLogSerializer, WorkoutLogCreateSerializer, PersonalRecordSerializer, SYNC_SERIALIZERS,
+    ProgramSerializer, ShiftBlockSerializer, BodyweightEntrySerializer, LeaderboardEntrySerializer
 )
+from .analytics import PERIOD_TRUNCATORS, e1rm_progress
+from .authentication import token_cache
+from .calendar_cache import CALENDAR_RESOURCES, MAX_RANGE_DAYS, calendar_range, next_month
+from .exports import CONTENT_TYPES, STREAMERS
+from .fast_serializers import Fieldset, ScheduledWorkoutReader, TemplateReader, WorkoutLogReader
+from .instrumentation import request_stats
+from .pagination import LeaderboardPagination, ScheduledWorkoutPagination, WorkoutLogPagination
+from .programs import ScheduleConflict, schedule_program, shift_block
+from .jobs import enqueue
+from .leaderboard import entrants, missing_requirements, page_ranks, rank_of
+from .records import board_records, record_board
+from .scoring import SCORE_FORMULAS
+from .sync import DEFAULT_LIMIT, MAX_LIMIT, SYNCED_MODELS, changes_since, parse_token
+from .training_load import TrainingHistory, training_load_report
+from .versions import current_versions, resource_etag
 
 
 # Health and Info endpoints
@@ -77,36 +98,156 @@ def logout(request):
         return Response({'error': 'Error logging out'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['GET'])
+@api_view(['GET', 'PATCH'])
 @permission_classes([IsAuthenticated])
 def profile(request):
-    serializer = UserSerializer(request.user)
-    return Response(serializer.data)
+    training_profile = TrainingProfile.objects.filter(user=request.user).first()
+    if request.method == 'PATCH':
+        training_profile = training_profile or TrainingProfile(user=request.user)
+        previous_formula = training_profile.e1rm_formula
+        serializer = TrainingProfileSerializer(training_profile, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            training_profile = serializer.save()
+            if training_profile.e1rm_formula != previous_formula:
+                # Stored estimates and the summaries built on them follow the new formula
+                user_id = request.user.pk
+                transaction.on_commit(lambda: enqueue('formula', user_id))
+
+    data = UserSerializer(request.user).data
+    data.update(TrainingProfileSerializer(training_profile or TrainingProfile()).data)
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def auth_cache_stats(request):
+    """Hit and miss counters of this process's token cache"""
+    return Response(token_cache.stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def request_timing_stats(request):
+    """Latency histograms and SQL/serialize/render times per endpoint of this process"""
+    return Response(request_stats.snapshot())
+
+
+def conditional_response(request, resources, build_response, versions=None):
+    """Return 304 if the client's ETag is current, else build the response.
+
+    The ETag comes from the resource version stamps, so an unchanged
+    resource is answered without touching the queryset or the serializer.
+    No Last-Modified is sent: HTTP dates have whole-second precision, so a
+    second write within the same second would still match If-Modified-Since.
+    """
+    etag = resource_etag(request, resources, versions)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build_response()
+    return add_validators(response, etag)
+
+
+def add_validators(response, etag):
+    """Attach the ETag to a 200 or 304 and keep shared caches out"""
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+    return response
+
 
+class ConditionalGetMixin:
+    """Conditional GET for list and retrieve, validated by `etag_resources` stamps"""
+    etag_resources = ()
 
-class ExerciseViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request, self.etag_resources, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(
+            request, self.etag_resources,
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+
+class ValuesReadMixin:
+    """list and retrieve built from .values() rows instead of the ModelSerializer.
+
+    `reader_class` (see fast_serializers) selects the columns and builds the
+    serializer's data, narrowed by ?fields= and ?expand=. Writes keep the
+    serializer.
+    """
+    reader_class = None
+
+    def get_reader(self):
+        ordering = getattr(self.paginator, 'ordering', None)
+        # Keyset pages continue from the ordering column and id of the last row
+        columns = (ordering.lstrip('-'), 'id') if isinstance(ordering, str) else ()
+        return self.reader_class(Fieldset.from_params(self.request.query_params), columns)
+
+    def read_rows(self, reader):
+        return self.filter_queryset(self.get_queryset()).values(*reader.lookups)
+
+    def list(self, request, *args, **kwargs):
+        try:
+            reader = self.get_reader()
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = self.read_rows(reader)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.data(page))
+        return Response(reader.data(list(rows)))
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            reader = self.get_reader()
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = generics.get_object_or_404(self.read_rows(reader), **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(reader.data([row])[0])
+
+
+class ExerciseViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Exercise.objects.all()
     serializer_class = ExerciseSerializer
     permission_classes = [IsAuthenticated]
+    etag_resources = ('exercises',)
 
 
-class WorkoutTemplateViewSet(viewsets.ModelViewSet):
+class WorkoutTemplateViewSet(ConditionalGetMixin, ValuesReadMixin, viewsets.ModelViewSet):
     serializer_class = WorkoutTemplateSerializer
     permission_classes = [IsAuthenticated]
+    etag_resources = ('templates', 'exercises')
+    reader_class = TemplateReader
 
     def get_queryset(self):
-        return WorkoutTemplate.objects.filter(user=self.request.user)
+        queryset = WorkoutTemplate.objects.filter(user=self.request.user)
+        if self.action in ('list', 'retrieve'):
+            return queryset
+        return WorkoutTemplateSerializer.setup_eager_loading(queryset)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class ScheduledWorkoutViewSet(viewsets.ModelViewSet):
+class ScheduledWorkoutViewSet(ConditionalGetMixin, ValuesReadMixin, viewsets.ModelViewSet):
     serializer_class = ScheduledWorkoutSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ScheduledWorkoutPagination
+    etag_resources = ('scheduled', 'templates', 'exercises')
+    reader_class = ScheduledWorkoutReader
 
     def get_queryset(self):
         queryset = ScheduledWorkout.objects.filter(user=self.request.user)
+        if self.action not in ('list', 'retrieve'):
+            queryset = ScheduledWorkoutSerializer.setup_eager_loading(queryset)
         
         # Filter by date range if provided
         start_date = self.request.query_params.get('start_date', None)
@@ -122,50 +263,132 @@ class ScheduledWorkoutViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=['post'])
+    def program(self, request):
+        """Schedule a multi-week program in one insert, skipping days already scheduled"""
+        serializer = ProgramSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        created_ids, skipped = schedule_program(request.user, **serializer.validated_data)
+
+        created = ScheduledWorkoutSerializer.setup_eager_loading(
+            ScheduledWorkout.objects.filter(pk__in=created_ids)
+        ).order_by('scheduled_date')
+        return Response({
+            'created': len(created_ids),
+            'skipped': skipped,
+            'scheduled_workouts': ScheduledWorkoutSerializer(created, many=True).data,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def shift(self, request):
+        """Move the incomplete workouts in a date range by a number of days"""
+        serializer = ShiftBlockSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        try:
+            moved = shift_block(request.user, **serializer.validated_data)
+        except ScheduleConflict as exc:
+            return Response({'error': 'Days already scheduled with the same template', 'conflicts': exc.dates},
+                            status=status.HTTP_409_CONFLICT)
+        return Response({'moved': moved})
+
+
+def calendar_bounds(query_params):
+    """(first_day, last_day) from start_date/end_date or year/month, raising ValueError"""
+    try:
+        first_day = parse_date_param(query_params, 'start_date')
+        last_day = parse_date_param(query_params, 'end_date')
+    except ValueError:
+        raise ValueError('Invalid start_date or end_date')
+
+    if first_day or last_day:
+        if not (first_day and last_day) or first_day > last_day:
+            raise ValueError('Pass both start_date and end_date, in order')
+        if (last_day - first_day).days >= MAX_RANGE_DAYS:
+            raise ValueError(f'Ranges are limited to {MAX_RANGE_DAYS} days')
+        return first_day, last_day
+
+    year = query_params.get('year', timezone.now().year)
+    month = query_params.get('month', timezone.now().month)
+    try:
+        first_day = date(int(year), int(month), 1)
+    except ValueError:
+        raise ValueError('Invalid year or month')
+    return first_day, next_month(first_day) - timedelta(days=1)
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def calendar_workouts(request):
-    """Get workouts for calendar view - current month by default"""
-    year = request.query_params.get('year', timezone.now().year)
-    month = request.query_params.get('month', timezone.now().month)
-    
+    """Get workouts for calendar view - current month by default.
+
+    Pass ?start_date=&end_date= instead of year/month for any range up to a
+    year, e.g. to prefetch a quarter or fetch one week. Pass ?compact=1 to get
+    {'workouts': [...], 'templates': {id: ...}} with each referenced template
+    sent once instead of embedded in every day. Months are served from the
+    calendar cache.
+    """
     try:
-        year = int(year)
-        month = int(month)
-    except ValueError:
-        return Response({'error': 'Invalid year or month'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    # Get first and last day of the month
-    first_day = date(year, month, 1)
-    if month == 12:
-        last_day = date(year + 1, 1, 1) - timedelta(days=1)
-    else:
-        last_day = date(year, month + 1, 1) - timedelta(days=1)
-    
-    scheduled_workouts = ScheduledWorkout.objects.filter(
-        user=request.user,
-        scheduled_date__gte=first_day,
-        scheduled_date__lte=last_day
-    )
-    
-    serializer = ScheduledWorkoutSerializer(scheduled_workouts, many=True)
-    return Response(serializer.data)
+        first_day, last_day = calendar_bounds(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Compact mode sends each template once instead of embedding it per day
+    compact = request.query_params.get('compact') in ('1', 'true')
+
+    # Read once for the validators and the cached months
+    versions = current_versions(request.user.pk, CALENDAR_RESOURCES)
+
+    def build_response():
+        return Response(calendar_range(request.user.pk, first_day, last_day, compact, versions))
 
+    return conditional_response(request, CALENDAR_RESOURCES, build_response, versions)
 
-class WorkoutLogViewSet(viewsets.ModelViewSet):
+
+class WorkoutLogViewSet(ConditionalGetMixin, ValuesReadMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = WorkoutLogPagination
+    etag_resources = ('logs', 'exercises')
+    batch_limit = 100
+    reader_class = WorkoutLogReader
 
     def get_queryset(self):
         return WorkoutLog.objects.filter(user=self.request.user)
 
     def get_serializer_class(self):
-        if self.action == 'create':
+        if self.action in ('create', 'batch'):
             return WorkoutLogCreateSerializer
         return WorkoutLogSerializer
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        workout_log = serializer.save(user=self.request.user)
+        # Re-read the created tree with a fixed number of queries for the response
+        serializer.instance = WorkoutLogSerializer.setup_eager_loading(
+            WorkoutLog.objects.filter(pk=workout_log.pk)
+        ).get()
+        serializer.instance.new_records = workout_log.new_records
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Create many workout logs in one request, all or nothing"""
+        if not isinstance(request.data, list):
+            return Response({'error': 'Expected a list of workout logs'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.batch_limit:
+            return Response({'error': f'At most {self.batch_limit} workout logs per batch'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            workout_logs = serializer.save(user=request.user)
+
+        created = WorkoutLogSerializer.setup_eager_loading(
+            WorkoutLog.objects.filter(pk__in=[workout_log.pk for workout_log in workout_logs])
+        )
+        new_records = {workout_log.pk: workout_log.new_records for workout_log in workout_logs}
+        data = WorkoutLogSerializer(created, many=True).data
+        for item in data:
+            item['new_records'] = PersonalRecordSerializer(new_records[item['id']], many=True).data
+        return Response(data, status=status.HTTP_201_CREATED)
 
 
 @api_view(['POST'])
@@ -190,11 +413,180 @@ def complete_scheduled_workout(request, pk):
         serializer = WorkoutLogCreateSerializer(data=workout_log_data)
         if serializer.is_valid():
             workout_log = serializer.save(user=request.user)
+            new_records = workout_log.new_records
+            workout_log = WorkoutLogSerializer.setup_eager_loading(
+                WorkoutLog.objects.filter(pk=workout_log.pk)
+            ).get()
             return Response({
                 'scheduled_workout': ScheduledWorkoutSerializer(scheduled_workout).data,
-                'workout_log': WorkoutLogSerializer(workout_log).data
+                'workout_log': WorkoutLogSerializer(workout_log).data,
+                'new_records': PersonalRecordSerializer(new_records, many=True).data,
             })
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     return Response(ScheduledWorkoutSerializer(scheduled_workout).data)
+
+
+def parse_date_param(query_params, name):
+    """Parse an optional YYYY-MM-DD query parameter, raising ValueError if malformed"""
+    value = query_params.get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f'Invalid {name}')
+    return parsed
+
+
+def progress_params(query_params):
+    """(period, start_date, end_date, exercise_ids) of an e1RM progress request, raising ValueError"""
+    period = query_params.get('period', 'day')
+    if period not in PERIOD_TRUNCATORS:
+        raise ValueError('Invalid period')
+    try:
+        start_date = parse_date_param(query_params, 'start_date')
+        end_date = parse_date_param(query_params, 'end_date')
+        exercise_ids = [int(pk) for pk in query_params.getlist('exercise')]
+    except ValueError:
+        raise ValueError('Invalid date or exercise')
+    return period, start_date, end_date, exercise_ids
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def e1rm_progress_view(request):
+    """Daily or weekly max estimated 1RM per exercise over a date range"""
+    try:
+        period, start_date, end_date, exercise_ids = progress_params(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'period': period,
+        'start_date': start_date,
+        'end_date': end_date,
+        'exercises': e1rm_progress(request.user, start_date, end_date, exercise_ids, period),
+    })
+
+
+def training_load_bounds(query_params):
+    """(start_date, end_date), the last 52 weeks by default, raising ValueError"""
+    try:
+        end_date = parse_date_param(query_params, 'end_date') or date.today()
+        start_date = parse_date_param(query_params, 'start_date') or end_date - timedelta(weeks=52) + timedelta(days=1)
+    except ValueError:
+        raise ValueError('Invalid date')
+    if start_date > end_date:
+        raise ValueError('start_date must not be after end_date')
+    return start_date, end_date
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def training_load_view(request):
+    """ACWR, weekly tonnage per category, monotony/strain and intensity zones"""
+    try:
+        start_date, end_date = training_load_bounds(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    history = TrainingHistory.from_database(request.user.pk, start_date, end_date)
+    return Response(training_load_report(history, start_date, end_date))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def personal_records(request):
+    """The user's PR board: rep maxes, best e1RM and best session tonnage per exercise"""
+    return Response(record_board(board_records(request.user)))
+
+
+class BodyweightEntryViewSet(viewsets.ModelViewSet):
+    serializer_class = BodyweightEntrySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return BodyweightEntry.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def leaderboard(request):
+    """Users ranked by Wilks, DOTS or IPF GL (?formula=, default dots), highest first"""
+    formula = request.query_params.get('formula', 'dots')
+    if formula not in SCORE_FORMULAS:
+        return Response({'error': f'formula must be one of {", ".join(SCORE_FORMULAS)}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = LeaderboardPagination()
+    paginator.ordering = f'-{formula}'
+    page = paginator.paginate_queryset(LeaderboardEntry.objects.select_related('user'), request)
+    results = [
+        {'rank': rank, **data}
+        for rank, data in zip(page_ranks(formula, page), LeaderboardEntrySerializer(page, many=True).data)
+    ]
+    response = paginator.get_paginated_response(results)
+    response.data = {'formula': formula, 'entrants': entrants(formula), **response.data}
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def leaderboard_rank(request):
+    """The user's entry and rank per formula, or what keeps them off the leaderboard"""
+    entry = LeaderboardEntry.objects.filter(user=request.user).select_related('user').first()
+    if entry is None:
+        return Response({'entry': None, 'ranks': None, 'missing': missing_requirements(request.user.pk)})
+    return Response({
+        'entry': LeaderboardEntrySerializer(entry).data,
+        'ranks': {
+            formula: {'rank': rank_of(formula, getattr(entry, formula)), 'entrants': entrants(formula)}
+            for formula in SCORE_FORMULAS
+        },
+        'missing': [],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_history(request, export_format):
+    """Stream every logged set of the user as CSV or NDJSON"""
+    if export_format not in STREAMERS:
+        return Response({'error': 'Format must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(
+        STREAMERS[export_format](request.user), content_type=CONTENT_TYPES[export_format]
+    )
+    filename = f'repcurve-{request.user.username}-{timezone.now():%Y%m%d}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes(request):
+    """Templates, schedule and logs created, updated or deleted since a sync token"""
+    try:
+        position = parse_token(request.query_params.get('token'))
+        limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        return Response({'error': 'Invalid token or limit'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= MAX_LIMIT:
+        return Response({'error': f'Limit must be between 1 and {MAX_LIMIT}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    changes, next_position, has_more = changes_since(request.user.pk, position, limit)
+    return Response({
+        'token': str(next_position),
+        'has_more': has_more,
+        'changes': {
+            key: {
+                'updated': SYNC_SERIALIZERS[SYNCED_MODELS[key]](changed['updated'], many=True).data,
+                'deleted': changed['deleted'],
+            }
+            for key, changed in changes.items()
+        },
+    })